@@ -0,0 +1,158 @@
+import os
+import sys
+import json
+import time
+import resource
+import argparse
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use('Agg')
+
+import instrument
+import prelim_get_fdata as fdata
+import prelim_plot_fdata as fplot
+from optimize_formants import optimize_subject
+from synth_session import make_session
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / 1024**2 if sys.platform == 'darwin' else peak / 1024
+
+class StageTimer:
+    """Accumulates wall time, item counts and peak RSS per named stage."""
+
+    def __init__(self):
+        self.stages = {}
+
+    def run(self, name, n_items, fn, *args, **kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.add(name, n_items, time.perf_counter() - start)
+        return result
+
+    def add(self, name, n_items, seconds):
+        stage = self.stages.setdefault(name, {'seconds': 0.0, 'items': 0})
+        stage['seconds'] += seconds
+        stage['items'] += n_items
+        stage['peak_rss_mb'] = peak_rss_mb()
+
+    def run_split(self, name, part_name, part_stage, n_items, fn, *args, **kwargs):
+        """Run fn, booking the time it spends in instrument stage part_stage as part_name and the rest as name."""
+        part_start, start = instrument.wall(part_stage), time.perf_counter()
+        result = fn(*args, **kwargs)
+        elapsed, part = time.perf_counter() - start, instrument.wall(part_stage) - part_start
+        self.add(name, n_items, elapsed - part)
+        self.add(part_name, n_items, part)
+        return result
+
+    def report(self):
+        for stage in self.stages.values():
+            stage['items_per_second'] = stage['items'] / stage['seconds'] if stage['seconds'] > 0 else np.nan
+        return self.stages
+
+def benchmark_subject(timer, base_dir, subj_id, truth, output='both', formant_engine='praat'):
+    """Run every analysis stage for one subject and return per-trial accuracy rows."""
+    subj_dir = os.path.join(base_dir, subj_id)
+    gender, exptOrder = fdata.load_experiment_data(subj_dir)
+    subj_truth = truth[truth['Subject ID'] == subj_id].set_index(['Experiment', 'Trial'])
+
+    ceiling, _ = timer.run('optimize', 1, optimize_subject, subj_id, base_dir,
+                           engine=formant_engine)
+
+    trials = {}
+    for (i, trial_num) in subj_truth.index:
+        trials[(i, trial_num)] = fdata.LazyTrial(os.path.join(subj_dir, f"trial_{i}_{trial_num}.mat"))
+    for trial in trials.values():
+        timer.run('load', 1, trial.load)
+
+    (f1_data, f0_data), accuracy = fdata.new_tracks(), []
+    for (i, trial_num), trial in trials.items():
+        row = subj_truth.loc[(i, trial_num)]
+        # Onset detection reads the trial's pitch track, so check_trial computes both; its Praat
+        # to_pitch call is booked as 'pitch' and intensity, onset and usability as 'onset'
+        analysis, onset_time, onset_idx, reason = timer.run_split('onset', 'pitch', 'to_pitch', 1,
+                                                                  fdata.check_trial, trial, gender)
+        result = {'Subject ID': subj_id, 'Experiment': i, 'Trial': trial_num, 'Type': row['Type'],
+                  'Usable': reason is None, 'Onset error (ms)': 1000 * (onset_time - row['Onset'])}
+        if reason is None and row['Type'] == 'F1':
+            signal, srate = trial.load()
+            t, values = timer.run('formant', 1, fdata.extract_formant_tracks, signal[onset_idx:], srate, ceiling,
+                                     formant_engine)
+            fdata.add_track(f1_data, f0_data, 'F1', row['Word'], row['Condition'],
+                            {'time': t, 'F1': values[0], 'F2': values[1]})
+            result['F1 error (%)'] = 100 * (np.nanmedian(values[0][:fdata.max_samples]) / row['F1'] - 1)
+            result['F2 error (%)'] = 100 * (np.nanmedian(values[1][:fdata.max_samples]) / row['F2'] - 1)
+        elif reason is None and row['Type'] == 'F0':
+            t, pitch = timer.run('pitch', 0, analysis.pitch_contour, onset_time)
+            fdata.add_track(f1_data, f0_data, 'F0', row['Word'], row['Condition'], {'time': t, 'pitch': pitch})
+            voiced = pitch[:fdata.max_samples]
+            result['F0 error (%)'] = 100 * (np.median(voiced[voiced > 0]) / row['F0'] - 1)
+        accuracy.append(result)
+
+    n_trials = sum(len(tracks) for data in (f1_data, f0_data) for cond_dict in data.values() for tracks in cond_dict.values())
+    f1_stats, f0_stats = timer.run('stats', n_trials, lambda: (fdata.compute_stats_f1(f1_data, fdata.max_samples),
+                                                              fdata.compute_stats_f0(f0_data, fdata.max_samples)))
+    f1_diff, f0_diff = timer.run('stats', 0, lambda: (fdata.compute_diff_f1(f1_stats), fdata.compute_diff_f0(f0_stats)))
+    timer.run('save', n_trials, fdata.save_results, base_dir, subj_id, f1_data, f0_data,
+              f1_stats, f0_stats, f1_diff, f0_diff, output)
+    timer.run('plot', 1, fplot.plot_subject, subj_id, base_dir)
+    return accuracy
+
+def summarize_accuracy(accuracy):
+    """Mean absolute error and fraction of usable trials within tolerance per measure."""
+    df = pd.DataFrame(accuracy)
+    usable = df[df['Usable']]
+    summary = {'trials': len(df), 'usable': int(df['Usable'].sum())}
+    for column, tolerance in [('Onset error (ms)', 20.0), ('F0 error (%)', 2.0),
+                              ('F1 error (%)', 5.0), ('F2 error (%)', 5.0)]:
+        if column in usable:
+            errors = usable[column].dropna().abs()
+            summary[column] = {'mean_abs': float(errors.mean()), 'within_tolerance': float((errors <= tolerance).mean()),
+                               'tolerance': tolerance}
+    return summary
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the F0vsF1 analysis stages on a synthetic session.")
+    parser.add_argument('base_dir', help="Directory for the synthetic session (created if missing).")
+    parser.add_argument('--subjects', type=int, default=2)
+    parser.add_argument('--blocks', type=int, default=2)
+    parser.add_argument('--trials', type=int, default=30, help="Trials per block.")
+    parser.add_argument('--srate', type=int, default=16000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', choices=['mat', 'npy', 'both'], default='both')
+    parser.add_argument('--formant-engine', choices=['praat', 'numpy'], default='praat')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    truth_file = os.path.join(args.base_dir, 'synth_truth.csv')
+    if os.path.exists(truth_file):
+        truth = pd.read_csv(truth_file, dtype={'Subject ID': str})
+    else:
+        print(f"Generating synthetic session in {args.base_dir}...")
+        truth = make_session(args.base_dir, args.subjects, args.blocks, args.trials, args.srate, args.seed)
+
+    timer = StageTimer()
+    accuracy = []
+    for subj_id in sorted(truth['Subject ID'].unique()):
+        accuracy += benchmark_subject(timer, args.base_dir, subj_id, truth, args.output, args.formant_engine)
+
+    report = {'stages': timer.report(), 'accuracy': summarize_accuracy(accuracy), 'peak_rss_mb': peak_rss_mb()}
+    print(f"{'Stage':<14}{'Seconds':>10}{'Items':>8}{'Items/s':>10}{'Peak RSS (MB)':>15}")
+    for name, stage in report['stages'].items():
+        print(f"{name:<14}{stage['seconds']:>10.2f}{stage['items']:>8}{stage['items_per_second']:>10.1f}{stage['peak_rss_mb']:>15.1f}")
+    for measure, values in report['accuracy'].items():
+        if isinstance(values, dict):
+            print(f"{measure}: mean |error| {values['mean_abs']:.2f}, "
+                  f"{values['within_tolerance']:.0%} within {values['tolerance']}")
+    print(f"Usable trials: {report['accuracy']['usable']}/{report['accuracy']['trials']}")
+
+    report_file = os.path.join(args.base_dir, 'benchmark_report.json')
+    with open(report_file, 'w') as f:
+        json.dump(report, f, indent=2)
+    pd.DataFrame(accuracy).to_csv(os.path.join(args.base_dir, 'benchmark_accuracy.csv'), index=False)
+    print(f"Saved benchmark report to {report_file}")
@@ -0,0 +1,263 @@
+import os
+import glob
+import argparse
+from math import gcd
+import numpy as np
+import scipy.fft as sp_fft
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Praat's Sound: To Formant (burg) internals
+anti_turn_around = 1000  # zero padding (samples) around the anti-aliasing FFT
+safety_margin = 50.0  # Hz; roots closer than this to 0 Hz or Nyquist are not formants
+
+
+def prepare_signal(signal, srate):
+    """Forward spectrum of a zero-padded trial, shared by every ceiling's resampling.
+
+    The FFT length is a multiple of srate / gcd(srate, 2), so that resampling
+    to 2 x any integer ceiling maps onto an integer-length inverse FFT.
+    """
+    signal = np.asarray(signal, dtype=float)
+    srate = int(round(srate))
+    n = len(signal)
+    step = srate // gcd(srate, 2)
+    n_fft = -(-(n + 2 * anti_turn_around) // step) * step
+    padded = np.zeros(n_fft)
+    padded[anti_turn_around:anti_turn_around + n] = signal
+    return {'spectrum': sp_fft.rfft(padded), 'n_fft': n_fft, 'n': n, 'srate': srate}
+
+def resample(prepared, new_rate):
+    """Band-limited resampling of a prepared trial to new_rate, on the sample grid Praat's Sound: Resample uses.
+
+    Frequencies above the new Nyquist are removed and the remaining spectrum is
+    evaluated at the new sample times by a shifted, shorter inverse FFT.
+    Returns the samples and the time of the first one.
+    """
+    n, srate, n_fft = prepared['n'], prepared['srate'], prepared['n_fft']
+    n_new = int(round(n * new_rate / srate))
+    n_out = int(round(n_fft * new_rate / srate))
+
+    # First new sample, in samples of the original signal (0-based), as in Praat
+    x1 = 0.5 * (n / srate - (n_new - 1) / new_rate)
+    offset = anti_turn_around + (x1 - 0.5 / srate) * srate
+
+    if abs(n_out * srate - n_fft * new_rate) > 1e-6 * n_fft * new_rate:
+        raise ValueError(f"Cannot resample {srate} Hz to {new_rate} Hz on an integer FFT grid")
+
+    keep = min(n_out // 2, n_fft // 2)
+    k = np.arange(keep)
+    spectrum = np.zeros(keep + 1, dtype=complex)
+    spectrum[:keep] = prepared['spectrum'][:keep] * np.exp(2j * np.pi * k * offset / n_fft)
+    # Samples spaced ratio apart starting at offset; keep the ones inside the sound
+    samples = sp_fft.irfft(spectrum, n_out) * (n_out / n_fft)
+    return samples[:n_new], x1
+
+def gaussian_window(n_window):
+    """Praat's Gaussian analysis window for formant tracking."""
+    imid = 0.5 * (n_window + 1)
+    edge = np.exp(-12.0)
+    i = np.arange(1, n_window + 1)
+    return (np.exp(-48.0 * (i - imid)**2 / (n_window + 1)**2) - edge) / (1.0 - edge)
+
+def frame_signal(samples, x1, rate, duration, time_step, window_length):
+    """Pre-emphasized samples cut into Praat's formant analysis frames (frames x window samples).
+
+    Returns the frame times, the windowed frames and a mask of frames that
+    are not entirely silent.
+    """
+    dx = 1.0 / rate
+    dt_window = 2.0 * window_length
+    n_window = int(np.floor(dt_window / dx))
+    half = n_window // 2
+    n_frames = int(np.floor((len(samples) * dx - dt_window) / time_step)) + 1
+    if n_frames < 1:
+        return np.empty(0), np.empty((0, n_window)), np.empty(0, dtype=bool)
+    first = 0.5 * duration - 0.5 * n_frames * time_step + 0.5 * time_step
+    times = first + time_step * np.arange(n_frames)
+
+    left = np.floor((times - x1) / dx).astype(int)
+    start = left + 1 - half
+    # Samples outside the sound read as zero
+    padded = np.concatenate([np.zeros(n_window), samples, np.zeros(n_window)])
+    frames = sliding_window_view(padded, n_window)[start + n_window]
+
+    # Praat skips frames whose (central) samples are all zero
+    audible = np.any(frames[:, :2 * half] != 0, axis=1)
+    return times, frames * gaussian_window(n_window), audible
+
+def burg(frames, order):
+    """Burg LPC coefficients for every row of frames at once (Praat's NUMburg).
+
+    Returns (frames x order) coefficients a such that
+    x[t] ~ a[0] x[t-1] + ... + a[order-1] x[t-order], and a mask of frames
+    for which the recursion was well conditioned. The reflection
+    denominator is updated with Andersen's recursion instead of being summed
+    again at every order.
+    """
+    n_frames, n = frames.shape
+    a = np.zeros((n_frames, order))
+    aa = np.zeros((n_frames, order))
+    # Forward (b1) and backward (b2) prediction errors
+    b1 = frames[:, :n - 1].copy()
+    b2 = frames[:, 1:].copy()
+    denum = np.einsum('ij,ij->i', b1, b1) + np.einsum('ij,ij->i', b2, b2)
+    valid = np.ones(n_frames, dtype=bool)
+
+    for i in range(1, order + 1):
+        length = n - i
+        f, b = b1[:, :length], b2[:, :length]
+        num = np.einsum('ij,ij->i', f, b)
+        valid &= denum > 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            a_i = np.where(denum > 0, 2.0 * num / denum, 0.0)
+        a[:, i - 1] = a_i
+        if i > 1:
+            a[:, :i - 1] = aa[:, :i - 1] - a_i[:, None] * aa[:, i - 2::-1]
+        if i < order:
+            aa[:, :i] = a[:, :i]
+            k = a_i[:, None]
+            denum = ((1.0 - a_i**2) * denum - (f[:, -1] - a_i * b[:, -1])**2 - (b[:, 0] - a_i * f[:, 0])**2)
+            new_b = k * f[:, 1:]
+            np.subtract(b[:, 1:], new_b, out=new_b)
+            f[:, :-1] -= k * b[:, :-1]
+            b[:, :-1] = new_b
+    return a, valid
+
+def lpc_formants(a, valid, rate, n_formants):
+    """Formant frequencies (frames x n_formants, NaN where missing) from LPC coefficients.
+
+    Roots of z^p - a1 z^(p-1) - ... - ap come from the eigenvalues of the
+    batched companion matrices; roots outside the unit circle are reflected
+    inside, and upper half-plane roots between the safety margins are the
+    formants, in ascending frequency.
+    """
+    n_frames, order = a.shape
+    # rate may also be one value per frame, when frames of several ceilings are solved together
+    rate = np.reshape(rate, (-1, 1)) if np.ndim(rate) else rate
+    companion = np.zeros((n_frames, order, order))
+    companion[:, 0, :] = a
+    companion[:, np.arange(1, order), np.arange(order - 1)] = 1.0
+    companion[~valid] = 0.0
+    roots = np.linalg.eigvals(companion)
+
+    outside = np.abs(roots) > 1.0
+    roots[outside] = 1.0 / np.conj(roots[outside])
+    nyquist = 0.5 * rate
+    freqs = np.abs(np.arctan2(roots.imag, roots.real)) * nyquist / np.pi
+    is_formant = (roots.imag >= 0) & (freqs >= safety_margin) & (freqs <= nyquist - safety_margin) & valid[:, None]
+    freqs = np.sort(np.where(is_formant, freqs, np.inf), axis=1)[:, :n_formants]
+    if freqs.shape[1] < n_formants:
+        freqs = np.pad(freqs, ((0, 0), (0, n_formants - freqs.shape[1])), constant_values=np.inf)
+    freqs[np.isinf(freqs)] = np.nan
+    return freqs
+
+def formant_tracks(prepared, ceiling, time_step, n_formants=4, window_length=0.025, pre_emphasis_from=50.0):
+    """F1..Fn tracks of several prepared trials for one ceiling, like Sound.to_formant_burg.
+
+    All trials' frames go through one Burg recursion and one batched
+    eigenvalue call. Returns a list of (frame times, n_formants x frames) per
+    trial, NaN where a formant is undefined, matching formant_frames().
+    """
+    return formant_tracks_for_ceilings(prepared, [ceiling], time_step, n_formants, window_length, pre_emphasis_from)[ceiling]
+
+def formant_tracks_for_ceilings(prepared, ceilings, time_step, n_formants=4, window_length=0.025, pre_emphasis_from=50.0):
+    """{ceiling: formant_tracks(prepared, ceiling)} of several ceilings.
+
+    Every ceiling resamples from the trials' shared forward spectra. The
+    analysis window spans a different number of samples at each ceiling's
+    rate, so each runs its own Burg recursion over all trials' frames. The
+    LPC orders are equal, though, so the roots of every ceiling are solved
+    in a single batched eigenvalue call.
+    """
+    lpcs = []
+    for ceiling in ceilings:
+        rate = 2.0 * ceiling
+        per_trial = []
+        for trial in prepared:
+            samples, x1 = resample(trial, rate)
+            # Pre-emphasis: x[i] -= exp(-2 pi F dt) x[i-1]
+            samples[1:] -= np.exp(-2.0 * np.pi * pre_emphasis_from / rate) * samples[:-1]
+            per_trial.append(frame_signal(samples, x1, rate, trial['n'] / trial['srate'], time_step, window_length))
+
+        frames = np.concatenate([f for _, f, _ in per_trial])
+        audible = np.concatenate([m for _, _, m in per_trial])
+        if len(frames) > 0:
+            a, valid = burg(frames, 2 * n_formants)
+        else:
+            a, valid = np.empty((0, 2 * n_formants)), np.empty(0, dtype=bool)
+        lpcs.append((per_trial, a, valid & audible, np.full(len(a), rate)))
+
+    a = np.concatenate([lpc[1] for lpc in lpcs])
+    if len(a) > 0:
+        values = lpc_formants(a, np.concatenate([lpc[2] for lpc in lpcs]), np.concatenate([lpc[3] for lpc in lpcs]),
+                              n_formants)
+    else:
+        values = np.empty((0, n_formants))
+
+    results = {}
+    first = 0
+    for ceiling, (per_trial, _, _, _) in zip(ceilings, lpcs):
+        results[ceiling] = []
+        for times, _, _ in per_trial:
+            results[ceiling].append((times, values[first:first + len(times)].T))
+            first += len(times)
+    return results
+
+def compare_with_praat(signal, srate, ceiling, time_step, n_formants=4, window_length=0.025):
+    """(frame times, numpy values, Praat values) of one trial for one ceiling."""
+    import parselmouth
+    from frame_tracks import formant_frames
+
+    formant = parselmouth.Sound(signal, srate).to_formant_burg(
+        time_step=time_step, max_number_of_formants=n_formants, window_length=window_length,
+        pre_emphasis_from=50, maximum_formant=ceiling)
+    praat_times, praat_values = formant_frames(formant, n_formants)
+    times, values = formant_tracks([prepare_signal(signal, srate)], ceiling, time_step, n_formants, window_length)[0]
+    if len(times) != len(praat_times) or not np.allclose(times, praat_times):
+        raise ValueError(f"Frame grids differ from Praat ({len(times)} vs {len(praat_times)} frames)")
+    return times, values, praat_values
+
+
+if __name__ == '__main__':
+    import pandas as pd
+    from signal_store import load_signal
+
+    parser = argparse.ArgumentParser(description="Compare the NumPy Burg formant engine against Praat on trial files.")
+    parser.add_argument('base_dir')
+    parser.add_argument('--subjects', nargs='+', required=True)
+    parser.add_argument('--ceilings', type=int, nargs='+', default=[4000, 5000, 6000])
+    parser.add_argument('--time-step', type=float, default=0.002)
+    parser.add_argument('--max-trials', type=int, default=20, help="Trials compared per subject.")
+    parser.add_argument('--tol', type=float, default=0.02,
+                        help="Relative difference under which a frame's formant counts as agreeing.")
+    parser.add_argument('--min-agreement', type=float, default=0.95,
+                        help="Fail (exit status 1) if fewer frames than this agree for F1 or F2.")
+    args = parser.parse_args()
+
+    rows = []
+    for subj_id in args.subjects:
+        trial_files = sorted(glob.glob(os.path.join(args.base_dir, subj_id, "trial_*_*.mat")))[:args.max_trials]
+        for trial_file in trial_files:
+            signal, srate, _ = load_signal(trial_file)
+            for ceiling in args.ceilings:
+                _, values, praat_values = compare_with_praat(signal, srate, ceiling, args.time_step)
+                for k in range(values.shape[0]):
+                    both = ~np.isnan(values[k]) & ~np.isnan(praat_values[k])
+                    rel = np.abs(values[k][both] - praat_values[k][both]) / praat_values[k][both]
+                    rows.append({'Subject ID': subj_id, 'Trial': os.path.basename(trial_file), 'Ceiling': ceiling,
+                                 'Formant': f"F{k + 1}", 'Frames': len(values[k]),
+                                 'Defined mismatch': int(np.sum(np.isnan(values[k]) != np.isnan(praat_values[k]))),
+                                 'Compared': int(np.sum(both)),
+                                 'Median rel diff': float(np.median(rel)) if len(rel) else np.nan,
+                                 'Agreeing': int(np.sum(rel <= args.tol))})
+
+    df = pd.DataFrame(rows)
+    summary = df.groupby('Formant')[['Frames', 'Defined mismatch', 'Compared', 'Agreeing']].sum()
+    summary['Agreement'] = summary['Agreeing'] / summary['Compared']
+    summary['Median rel diff'] = df.groupby('Formant')['Median rel diff'].median()
+    print(summary.to_string())
+    out_file = os.path.join(args.base_dir, 'formant_engine_comparison.csv')
+    df.to_csv(out_file, index=False)
+    print(f"Saving formant engine comparison to {out_file}")
+    if (summary.loc[['F1', 'F2'], 'Agreement'] < args.min_agreement).any():
+        raise SystemExit(f"NumPy formant engine disagrees with Praat beyond tolerance {args.tol}")
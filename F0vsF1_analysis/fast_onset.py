@@ -0,0 +1,166 @@
+import numpy as np
+import scipy.fft as sp_fft
+from scipy.signal import fftconvolve, resample_poly
+
+# Praat defaults used by Sound.to_intensity() and Sound.to_pitch() (ac method)
+intensity_min_pitch = 100.0
+voicing_threshold = 0.45
+silence_threshold = 0.03
+octave_cost = 0.01
+# Lowest rate the voicing detector decimates to; lower rates blunt the autocorrelation peaks
+voicing_min_rate = 16000.0
+
+
+def frame_grid(n_samples, srate, window, step):
+    """Frame centre times of Praat's short-term analysis: centred in the sound, window fully inside."""
+    duration = n_samples / srate
+    n_frames = int(np.floor((duration - window) / step + 1e-9)) + 1
+    if n_frames < 1:
+        return np.empty(0)
+    first = 0.5 * duration - 0.5 * n_frames * step + 0.5 * step
+    return first + step * np.arange(n_frames)
+
+def pad_signals(signals):
+    """Stack signals of different lengths into a zero-padded (trials x samples) float64 array."""
+    batch = np.zeros((len(signals), max(len(s) for s in signals)))
+    for row, signal in enumerate(signals):
+        batch[row, :len(signal)] = signal
+    return batch
+
+def intensity_tracks(signals, srate, min_pitch=intensity_min_pitch):
+    """Intensity contours (dB) like Sound.to_intensity(), for a batch of signals at one sampling rate.
+
+    Windowed energy with the frame mean subtracted is computed for every
+    sample position of every trial at once with three FFT convolutions and
+    then read out at each trial's own frame grid. Returns lists of frame times
+    and dB values.
+    """
+    window, step = 6.4 / min_pitch, 0.8 / min_pitch
+    n_window = int(round(window * srate))
+    w = np.kaiser(n_window, 20.0)[None, :]
+    batch = pad_signals(signals)
+
+    # sum w (x - m)^2 = sum w x^2 - 2 m sum w x + m^2 sum w, with m the plain frame mean
+    sum_wx2 = fftconvolve(batch**2, w[:, ::-1], mode='valid', axes=1)
+    sum_wx = fftconvolve(batch, w[:, ::-1], mode='valid', axes=1)
+    cumsum = np.concatenate([np.zeros((len(signals), 1)), np.cumsum(batch, axis=1)], axis=1)
+    mean = (cumsum[:, n_window:] - cumsum[:, :-n_window]) / n_window
+    energy = (sum_wx2 - 2 * mean * sum_wx + mean**2 * w.sum()) / w.sum()
+
+    times, values = [], []
+    for row, signal in enumerate(signals):
+        t = frame_grid(len(signal), srate, window, step)
+        start = np.clip(np.round((t - 0.5 * window) * srate).astype(int), 0, energy.shape[1] - 1)
+        e = np.maximum(energy[row, start], 0.0)
+        with np.errstate(divide='ignore'):
+            values.append(np.where(e > 1e-30, 10 * np.log10(e / 4e-10), -300.0))
+        times.append(t)
+    return times, values
+
+def _frame_voicing(x, starts, n_window, rate, lags, hann, n_fft, window_ac, global_peak, pitch_ceiling):
+    """F0 (0 for unvoiced) of the frames of x beginning at the given sample indices."""
+    frames = x[starts[:, None] + np.arange(n_window)]
+    frames = frames - frames.mean(axis=1, keepdims=True)
+    local_peak = np.max(np.abs(frames), axis=1)
+
+    spectrum = sp_fft.rfft(frames * hann, n_fft, axis=1)
+    ac = sp_fft.irfft(np.abs(spectrum)**2, n_fft, axis=1)[:, :lags[-1] + 2]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r = ac / ac[:, :1] / window_ac
+
+    # Parabolic interpolation of the normalized autocorrelation around every candidate lag
+    left, mid, right = r[:, lags - 1], r[:, lags], r[:, lags + 1]
+    denom = left - 2 * mid + right
+    with np.errstate(invalid='ignore', divide='ignore'):
+        shift = np.where(denom < 0, 0.5 * (left - right) / denom, 0.0)
+        peak_r = mid - 0.25 * (left - right) * shift
+        freq = rate / (lags + shift)
+        is_peak = (mid >= left) & (mid >= right)
+        strength = np.where(is_peak, peak_r - octave_cost * np.log2(pitch_ceiling / freq), -np.inf)
+        strength[~np.isfinite(strength)] = -np.inf
+
+        rows = np.arange(len(starts))
+        best = np.argmax(strength, axis=1)
+        unvoiced = voicing_threshold + np.maximum(
+            0.0, 2 - (local_peak / global_peak) / (silence_threshold / (1 + voicing_threshold)))
+    voiced = strength[rows, best] > unvoiced
+    return np.where(voiced, freq[rows, best], 0.0)
+
+def voicing_tracks(signals, srate, pitch_floor, pitch_ceiling, time_step, not_before=None, horizon=None,
+                   batch_size=16, block=64):
+    """Frame-wise F0 (0 for unvoiced) from a batched normalized autocorrelation.
+
+    A lightweight version of Praat's ac pitch method: 3-period Hanning
+    windows on Praat's frame grid, autocorrelation corrected for the window,
+    the best lag picked with Praat's octave cost and the frame voiced when
+    that peak beats Praat's unvoiced strength (voicing and silence
+    thresholds). There is no path finding across frames. Signals recorded
+    above voicing_min_rate are decimated by an integer factor first, and
+    signals are processed batch_size trials at a time.
+
+    With horizon, only the frames an onset search needs are evaluated: from
+    the last frame before not_before[trial] (the intensity onset) up to
+    horizon seconds after the first voiced frame, block frames at a time.
+    Frames that were never evaluated are NaN.
+    """
+    q = max(1, int(srate // voicing_min_rate))
+    rate = srate / q
+    window = 3.0 / pitch_floor
+    n_window = int(round(window * rate))
+    min_lag = max(2, int(np.floor(rate / pitch_ceiling)))
+    max_lag = min(n_window - 2, int(np.ceil(rate / pitch_floor)))
+    lags = np.arange(min_lag, max_lag + 1)
+
+    hann = np.hanning(n_window)
+    n_fft = sp_fft.next_fast_len(n_window + max_lag + 2, real=True)
+    window_ac = sp_fft.irfft(np.abs(sp_fft.rfft(hann, n_fft))**2, n_fft)[:max_lag + 2]
+    window_ac /= window_ac[0]
+
+    times, f0s = [], []
+    for first in range(0, len(signals), batch_size):
+        chunk = signals[first:first + batch_size]
+        batch = pad_signals(chunk)
+        if q > 1:
+            batch = resample_poly(batch, 1, q, axis=1)
+        for row, signal in enumerate(chunk):
+            t = frame_grid(len(signal), srate, window, time_step)
+            x = batch[row, :int(np.ceil(len(signal) / q))]
+            times.append(t)
+            if len(t) == 0 or len(x) < n_window:
+                f0s.append(np.zeros(len(t)))
+                continue
+            starts = np.clip(np.round((t - 0.5 * window) * rate).astype(int), 0, len(x) - n_window)
+            args = (x, n_window, rate, lags, hann, n_fft, window_ac, np.max(np.abs(x - x.mean())), pitch_ceiling)
+            if horizon is None:
+                f0s.append(_frame_voicing(args[0], starts, *args[1:]))
+                continue
+
+            f0 = np.full(len(t), np.nan)
+            lo = max(0, int(np.searchsorted(t, not_before[first + row])) - 1)
+            end = len(t)
+            while lo < end:
+                hi = min(lo + block, end)
+                f0[lo:hi] = _frame_voicing(args[0], starts[lo:hi], *args[1:])
+                voiced = np.flatnonzero(f0[:hi] > 0)
+                if len(voiced) > 0:
+                    onset = max(t[voiced[0]], not_before[first + row])
+                    end = min(end, int(np.searchsorted(t, onset + horizon)) + 1)
+                lo = hi
+            f0s.append(f0)
+    return times, f0s
+
+def onset_tracks(signals, srate, pitch_floor, pitch_ceiling, time_step, horizon=None):
+    """Intensity and voicing tracks for a batch of trials recorded at one sampling rate.
+
+    Returns one dict per trial with the TrialAnalysis track fields. With
+    horizon, voicing is only evaluated around the onset and horizon seconds
+    past it (see voicing_tracks).
+    """
+    intensity_times, intensity_values = intensity_tracks(signals, srate)
+    # Intensity onset: first frame above (max - 10 dB), as in TrialAnalysis.onset_time
+    not_before = [it[np.argmax(iv > np.max(iv) - 10)] if len(it) else 0.0
+                  for it, iv in zip(intensity_times, intensity_values)]
+    pitch_times, pitch_values = voicing_tracks(signals, srate, pitch_floor, pitch_ceiling, time_step,
+                                               not_before, horizon)
+    return [{'intensity_times': it, 'intensity_values': iv, 'pitch_times': pt, 'pitch_values': pv}
+            for it, iv, pt, pv in zip(intensity_times, intensity_values, pitch_times, pitch_values)]
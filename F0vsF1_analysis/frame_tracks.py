@@ -0,0 +1,78 @@
+import numpy as np
+from parselmouth.praat import call
+import instrument
+
+
+def intensity_frames(intensity_obj):
+    """Return the frame times and dB values of an Intensity object as arrays."""
+    times = intensity_obj.xs()
+    values = intensity_obj.values[0]
+    return times, values
+
+
+def formant_frames(formant, n_formants=4):
+    """Return the frame times and an (n_formants x frames) matrix of formant frequencies.
+
+    Each formant row is pulled with a single Praat "To Matrix" call. Praat stores
+    missing formants as 0 Hz in that matrix; they are returned as NaN, matching
+    the undefined values of "Get value at time".
+    """
+    with instrument.stage('frame_extraction'):
+        times = formant.xs()
+        values = np.vstack([call(formant, "To Matrix", k).values[0] for k in range(1, n_formants + 1)])
+        values[values <= 0] = np.nan
+    instrument.count('praat_calls', n_formants)
+    return times, values
+
+
+def sample_at_times(frame_times, values, times, xmin, xmax):
+    """Linearly interpolate frame values at arbitrary times, the way Praat's Sampled objects do.
+
+    Mirrors "Get value at time ... Linear": the nearest frame must be defined,
+    an undefined or out-of-range neighbour falls back to the nearest frame and
+    times outside [xmin, xmax] are undefined.
+    """
+    values = np.atleast_2d(values)
+    times = np.asarray(times, dtype=float)
+    n_frames = values.shape[1]
+    if n_frames == 0 or len(times) == 0:
+        return np.full((values.shape[0], len(times)), np.nan)
+
+    dx = frame_times[1] - frame_times[0] if n_frames > 1 else 1.0
+    index = (times - frame_times[0]) / dx
+    ileft = np.floor(index).astype(int)
+    phase = index - ileft
+
+    upper = phase >= 0.5
+    inear = np.where(upper, ileft + 1, ileft)
+    ifar = np.where(upper, ileft, ileft + 1)
+    phase = np.where(upper, 1.0 - phase, phase)
+
+    near_ok = (inear >= 0) & (inear < n_frames) & (times >= xmin) & (times <= xmax)
+    far_ok = (ifar >= 0) & (ifar < n_frames)
+    fnear = values[:, np.clip(inear, 0, n_frames - 1)]
+    ffar = values[:, np.clip(ifar, 0, n_frames - 1)]
+
+    result = np.where(far_ok & ~np.isnan(ffar), fnear + phase * (ffar - fnear), fnear)
+    result[:, ~near_ok] = np.nan
+    return result
+
+
+def formant_matrix(formant, times=None, n_formants=4):
+    """Formant frequencies (n_formants x len(times)) at the given times, or at every frame if times is None."""
+    frame_times, values = formant_frames(formant, n_formants)
+    if times is None:
+        return values
+    return sample_at_times(frame_times, values, times, formant.xmin, formant.xmax)
+
+
+def relative_deviations(values):
+    """Per-row std/mean over the non-NaN entries; NaN where a row has fewer than two values."""
+    values = np.atleast_2d(values)
+    valid = ~np.isnan(values)
+    deviations = np.full(values.shape[0], np.nan)
+    for k in range(values.shape[0]):
+        row = values[k, valid[k]]
+        if len(row) > 1:
+            deviations[k] = np.std(row) / np.mean(row)
+    return deviations
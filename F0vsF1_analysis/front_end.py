@@ -0,0 +1,35 @@
+import parselmouth
+import instrument
+from fast_formants import prepare_signal, resample
+
+# Intensity and pitch (ceiling at most 400 Hz) need nothing above this rate
+pitch_rate = 16000
+
+
+def pitch_signal(signal, srate):
+    """signal decimated to pitch_rate with Praat's resampler; unchanged if it is not above that rate."""
+    if srate <= pitch_rate:
+        return signal, srate
+    with instrument.stage('resample'):
+        snd = parselmouth.Sound(signal, srate).resample(pitch_rate, 50)
+    instrument.count('resampled_signals')
+    return snd.values[0], pitch_rate
+
+def formant_spectrum(signal, srate):
+    """Forward spectrum of a trial, computed once and shared by the Burg passes of every ceiling."""
+    with instrument.stage('resample'):
+        prepared = prepare_signal(signal, srate)
+    instrument.count('resampled_signals')
+    return prepared
+
+def formant_sound(prepared, ceiling):
+    """Sound at exactly 2 x ceiling cut from a shared spectrum.
+
+    to_formant_burg resamples to twice the ceiling itself unless the Sound is
+    already at that rate, so a Sound from here skips Praat's (much slower)
+    sinc resampling.
+    """
+    rate = 2 * ceiling
+    with instrument.stage('resample'):
+        samples, x1 = resample(prepared, rate)
+    return parselmouth.Sound(samples, rate, start_time=x1 - 0.5 / rate)
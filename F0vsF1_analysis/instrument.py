@@ -0,0 +1,136 @@
+import os
+import json
+import time
+import cProfile
+import pstats
+from contextlib import contextmanager
+import pandas as pd
+
+# Process-wide instrumentation state. Worker processes collect into their own
+# copy; snapshot()/merge() carry it back to the parent.
+_stages = {}
+_counters = {}
+_trials = []
+
+
+@contextmanager
+def stage(name):
+    """Accumulate wall and CPU time of the enclosed block under a stage name."""
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        entry = _stages.setdefault(name, {'calls': 0, 'wall': 0.0, 'cpu': 0.0})
+        entry['calls'] += 1
+        entry['wall'] += time.perf_counter() - wall
+        entry['cpu'] += time.process_time() - cpu
+
+def count(name, n=1):
+    """Add n to a named counter (e.g. Praat invocations, frames processed)."""
+    _counters[name] = _counters.get(name, 0) + n
+
+def counter(name):
+    """Current value of a named counter."""
+    return _counters.get(name, 0)
+
+def wall(name):
+    """Wall time accumulated so far under a stage name."""
+    return _stages.get(name, {}).get('wall', 0.0)
+
+def record_trial(**fields):
+    """Append one per-trial timing record."""
+    _trials.append(fields)
+
+def reset():
+    _stages.clear()
+    _counters.clear()
+    _trials.clear()
+
+def snapshot():
+    """Copy of the collected stages, counters and trial records."""
+    return {'stages': {name: dict(entry) for name, entry in _stages.items()},
+            'counters': dict(_counters), 'trials': list(_trials)}
+
+def merge(snap):
+    """Fold a snapshot taken in another process into this one."""
+    for name, entry in snap['stages'].items():
+        total = _stages.setdefault(name, {'calls': 0, 'wall': 0.0, 'cpu': 0.0})
+        for key in total:
+            total[key] += entry[key]
+    for name, n in snap['counters'].items():
+        count(name, n)
+    _trials.extend(snap['trials'])
+
+def collect(fn, *args):
+    """Run fn in a worker with fresh instrumentation; return (result, snapshot)."""
+    reset()
+    result = fn(*args)
+    return result, snapshot()
+
+def merged(item):
+    """Merge the snapshot of a collect() result and return the result itself."""
+    result, snap = item
+    merge(snap)
+    return result
+
+def write_report(out_dir, script_name, extra=None):
+    """Write <script>_profile_<timestamp>.json (stages, counters) and a per-trial CSV next to it."""
+    stamp = time.strftime('%Y%m%d-%H%M%S')
+    report = snapshot()
+    trials = report.pop('trials')
+    report['script'] = script_name
+    report['created'] = stamp
+    if extra:
+        report.update(extra)
+
+    json_file = os.path.join(out_dir, f"{script_name}_profile_{stamp}.json")
+    with open(json_file, 'w') as f:
+        json.dump(report, f, indent=2, default=str)
+    if trials:
+        pd.DataFrame(trials).to_csv(os.path.join(out_dir, f"{script_name}_trials_{stamp}.csv"), index=False)
+
+    print(f"{'Stage':<22}{'Calls':>8}{'Wall (s)':>10}{'CPU (s)':>10}")
+    for name, entry in sorted(report['stages'].items(), key=lambda item: -item[1]['wall']):
+        print(f"{name:<22}{entry['calls']:>8}{entry['wall']:>10.2f}{entry['cpu']:>10.2f}")
+    for name, n in sorted(report['counters'].items()):
+        print(f"{name}: {n}")
+    print(f"Saving instrumentation report to {json_file}")
+    return json_file
+
+@contextmanager
+def profiling(kind, out_dir, script_name):
+    """Optionally run the enclosed block under cProfile or pyinstrument and save the profile."""
+    if kind is None:
+        yield
+        return
+
+    stamp = time.strftime('%Y%m%d-%H%M%S')
+    if kind == 'cprofile':
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            out_file = os.path.join(out_dir, f"{script_name}_cprofile_{stamp}.prof")
+            profiler.dump_stats(out_file)
+            pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
+            print(f"Saving cProfile output to {out_file}")
+    elif kind == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            raise SystemExit("pyinstrument is not installed; use --profile cprofile or pip install pyinstrument")
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            out_file = os.path.join(out_dir, f"{script_name}_pyinstrument_{stamp}.html")
+            with open(out_file, 'w') as f:
+                f.write(profiler.output_html())
+            print(profiler.output_text(unicode=True, color=False))
+            print(f"Saving pyinstrument output to {out_file}")
+    else:
+        raise ValueError(f"Unknown profiler: {kind}")
@@ -0,0 +1,264 @@
+import os
+import re
+import json
+import glob
+import sqlite3
+import argparse
+import pandas as pd
+from scipy.io import loadmat
+from signal_store import load_signal
+
+db_name = 'manifest.sqlite'
+trial_pattern = re.compile(r'trial_(\d+)_(\d+)\.mat$')
+
+schema = """
+CREATE TABLE IF NOT EXISTS subjects (
+    subject TEXT PRIMARY KEY, gender TEXT, expt_order TEXT, mtime_ns INTEGER);
+CREATE TABLE IF NOT EXISTS experiments (
+    subject TEXT, expt INTEGER, type TEXT, words TEXT, conds TEXT, mtime_ns INTEGER,
+    PRIMARY KEY (subject, expt));
+CREATE TABLE IF NOT EXISTS trials (
+    subject TEXT, expt INTEGER, trial INTEGER, type TEXT, word TEXT, cond TEXT,
+    path TEXT, size INTEGER, mtime_ns INTEGER, srate REAL, n_samples INTEGER, duration REAL,
+    PRIMARY KEY (subject, expt, trial));
+CREATE INDEX IF NOT EXISTS trials_by_condition ON trials (type, cond, word);
+"""
+
+# Base directory whose manifest the discovery helpers below consult (None: use the filesystem)
+_active = None
+# Open manifests by (database, process); sqlite connections must not cross a fork
+_open = {}
+
+
+def read_experiment_data(subj_dir):
+    """Gender and exptOrder from a subject's expt.mat."""
+    expt_path = os.path.join(subj_dir, 'expt.mat')
+    expt_data = loadmat(expt_path, squeeze_me=True, struct_as_record=False)['expt']
+    gender = expt_data.gender
+    exptOrder = expt_data.exptOrder
+    if isinstance(exptOrder, str):
+        exptOrder = [exptOrder]
+    return gender, exptOrder
+
+def read_experiment_trials(subj_dir, i, expt_type):
+    """listWords and listConds from expt_{i}_{type}.mat, or (None, None) if it does not exist."""
+    expt_file = os.path.join(subj_dir, f"expt_{i}_{expt_type}.mat")
+    if not os.path.exists(expt_file):
+        return None, None
+    curr_expt = loadmat(expt_file, squeeze_me=True, struct_as_record=False)['currExpt']
+    listWords = curr_expt.listWords
+    listConds = curr_expt.listConds
+    if isinstance(listWords, str):
+        listWords = [listWords]
+    if isinstance(listConds, str):
+        listConds = [listConds]
+    return listWords, listConds
+
+
+class Manifest:
+    """SQLite index of a study's subjects, experiments and trial files.
+
+    scan() walks base_dir and records each subject's gender and exptOrder,
+    every experiment's word and condition lists, and every trial file's path,
+    size, mtime, sampling rate and duration. Rescans only re-read files
+    whose mtime (or size) changed and drop rows for files that disappeared.
+    Queries never touch the trial files.
+    """
+
+    def __init__(self, base_dir):
+        self.base_dir = os.path.abspath(base_dir)
+        self.db_path = os.path.join(self.base_dir, db_name)
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.executescript(schema)
+        self._trial_names = {}
+
+    def scan(self):
+        """Bring the manifest up to date with base_dir; returns counts of re-read and removed entries."""
+        counts = {'subjects': 0, 'experiments': 0, 'trials': 0, 'removed': 0}
+        found = []
+        with self.conn:
+            for entry in sorted(os.scandir(self.base_dir), key=lambda e: e.name):
+                expt_path = os.path.join(entry.path, 'expt.mat')
+                if entry.is_dir() and os.path.exists(expt_path):
+                    found.append(entry.name)
+                    self._scan_subject(entry.name, entry.path, counts)
+            for (subj_id,) in self.conn.execute("SELECT subject FROM subjects").fetchall():
+                if subj_id not in found:
+                    for table in ('subjects', 'experiments', 'trials'):
+                        self.conn.execute(f"DELETE FROM {table} WHERE subject = ?", (subj_id,))
+                    counts['removed'] += 1
+        self._trial_names.clear()
+        return counts
+
+    def _scan_subject(self, subj_id, subj_dir, counts):
+        mtime = os.stat(os.path.join(subj_dir, 'expt.mat')).st_mtime_ns
+        row = self.conn.execute("SELECT mtime_ns FROM subjects WHERE subject = ?", (subj_id,)).fetchone()
+        if row is None or row[0] != mtime:
+            gender, exptOrder = read_experiment_data(subj_dir)
+            self.conn.execute("INSERT OR REPLACE INTO subjects VALUES (?, ?, ?, ?)",
+                              (subj_id, str(gender), json.dumps([str(t) for t in exptOrder]), mtime))
+            counts['subjects'] += 1
+        exptOrder = json.loads(self.conn.execute("SELECT expt_order FROM subjects WHERE subject = ?",
+                                                 (subj_id,)).fetchone()[0])
+
+        # Experiment lists, re-read when their file changed
+        labels = {}
+        self.conn.execute("DELETE FROM experiments WHERE subject = ? AND expt > ?", (subj_id, len(exptOrder)))
+        for i, expt_type in enumerate(exptOrder, start=1):
+            expt_file = os.path.join(subj_dir, f"expt_{i}_{expt_type}.mat")
+            if not os.path.exists(expt_file):
+                self.conn.execute("DELETE FROM experiments WHERE subject = ? AND expt = ?", (subj_id, i))
+                continue
+            mtime = os.stat(expt_file).st_mtime_ns
+            row = self.conn.execute("SELECT type, mtime_ns FROM experiments WHERE subject = ? AND expt = ?",
+                                    (subj_id, i)).fetchone()
+            if row is None or tuple(row) != (expt_type, mtime):
+                listWords, listConds = read_experiment_trials(subj_dir, i, expt_type)
+                self.conn.execute("INSERT OR REPLACE INTO experiments VALUES (?, ?, ?, ?, ?, ?)",
+                                  (subj_id, i, expt_type, json.dumps([str(w) for w in listWords]),
+                                   json.dumps([str(c) for c in listConds]), mtime))
+                counts['experiments'] += 1
+            words, conds = self.conn.execute("SELECT words, conds FROM experiments WHERE subject = ? AND expt = ?",
+                                             (subj_id, i)).fetchone()
+            for trial_num, (word, cond) in enumerate(zip(json.loads(words), json.loads(conds)), start=1):
+                labels[(i, trial_num)] = (expt_type, word, cond)
+
+        # Trial files: one directory listing; only new or changed files are opened
+        known = {(e, t): (size, mtime) for e, t, size, mtime in
+                 self.conn.execute("SELECT expt, trial, size, mtime_ns FROM trials WHERE subject = ?", (subj_id,))}
+        present = set()
+        for entry in os.scandir(subj_dir):
+            match = trial_pattern.fullmatch(entry.name)
+            if match is None:
+                continue
+            key = tuple(map(int, match.groups()))
+            present.add(key)
+            stat = entry.stat()
+            expt_type, word, cond = labels.get(key, (None, None, None))
+            if known.get(key) == (stat.st_size, stat.st_mtime_ns):
+                self.conn.execute("UPDATE trials SET type = ?, word = ?, cond = ? WHERE subject = ? AND expt = ? AND trial = ?",
+                                  (expt_type, word, cond, subj_id) + key)
+                continue
+            signal, srate, _ = load_signal(entry.path)
+            self.conn.execute("INSERT OR REPLACE INTO trials VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                              (subj_id,) + key + (expt_type, word, cond, entry.name, stat.st_size, stat.st_mtime_ns,
+                                                  float(srate), len(signal), len(signal) / srate))
+            counts['trials'] += 1
+        for key in set(known) - present:
+            self.conn.execute("DELETE FROM trials WHERE subject = ? AND expt = ? AND trial = ?", (subj_id,) + key)
+            counts['removed'] += 1
+
+    def subjects(self):
+        return [row[0] for row in self.conn.execute("SELECT subject FROM subjects ORDER BY subject")]
+
+    def subject(self, subj_id):
+        """(gender, exptOrder) of a subject, or None if it is not in the manifest."""
+        row = self.conn.execute("SELECT gender, expt_order FROM subjects WHERE subject = ?", (subj_id,)).fetchone()
+        return None if row is None else (row[0], json.loads(row[1]))
+
+    def experiment(self, subj_id, i):
+        """(listWords, listConds) of one experiment, or (None, None) if its file is missing."""
+        row = self.conn.execute("SELECT words, conds FROM experiments WHERE subject = ? AND expt = ?",
+                                (subj_id, i)).fetchone()
+        return (None, None) if row is None else (json.loads(row[0]), json.loads(row[1]))
+
+    def trial_names(self, subj_id):
+        """File names of a subject's trials."""
+        if subj_id not in self._trial_names:
+            self._trial_names[subj_id] = {row[0] for row in
+                                          self.conn.execute("SELECT path FROM trials WHERE subject = ?", (subj_id,))}
+        return self._trial_names[subj_id]
+
+    def trials(self, subjects=None, expt=None, expt_type=None, word=None, cond=None):
+        """DataFrame of the trials matching every given filter, with their full paths."""
+        clauses, values = [], []
+        if subjects is not None:
+            clauses.append(f"subject IN ({', '.join('?' * len(subjects))})")
+            values += list(subjects)
+        for column, value in (('expt', expt), ('type', expt_type), ('word', word), ('cond', cond)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                values.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        df = pd.read_sql_query(f"SELECT * FROM trials {where} ORDER BY subject, expt, trial", self.conn, params=values)
+        df['path'] = [os.path.join(self.base_dir, s, p) for s, p in zip(df['subject'], df['path'])]
+        return df
+
+def activate(base_dir):
+    """Make the discovery helpers below answer from base_dir's manifest, brought up to date first.
+
+    The scan is incremental (only new or changed expt and trial files are
+    opened), so trials and subjects recorded since the last run are picked up.
+    """
+    global _active
+    counts = Manifest(base_dir).scan()
+    if any(counts.values()):
+        print(f"Manifest {os.path.join(base_dir, db_name)}: re-read {counts['subjects']} subjects, "
+              f"{counts['trials']} trials; removed {counts['removed']} entries")
+    _active = os.path.abspath(base_dir)
+    _open.clear()
+
+def active_manifest(base_dir):
+    """The active manifest if it indexes base_dir, opened once per process; otherwise None."""
+    if _active is None or os.path.abspath(base_dir) != _active:
+        return None
+    key = (_active, os.getpid())
+    if key not in _open:
+        _open[key] = Manifest(_active)
+    return _open[key]
+
+def list_subjects(base_dir):
+    """Subject IDs under base_dir: every directory with an expt.mat."""
+    manifest = active_manifest(base_dir)
+    if manifest is not None:
+        return manifest.subjects()
+    return [d for d in os.listdir(base_dir) if os.path.exists(os.path.join(base_dir, d, 'expt.mat'))]
+
+def experiment_data(subj_dir):
+    manifest = active_manifest(os.path.dirname(subj_dir))
+    entry = None if manifest is None else manifest.subject(os.path.basename(subj_dir))
+    return read_experiment_data(subj_dir) if entry is None else entry
+
+def experiment_trials(subj_dir, i, expt_type):
+    manifest = active_manifest(os.path.dirname(subj_dir))
+    if manifest is None:
+        return read_experiment_trials(subj_dir, i, expt_type)
+    return manifest.experiment(os.path.basename(subj_dir), i)
+
+def trial_exists(trial_file):
+    subj_dir = os.path.dirname(trial_file)
+    manifest = active_manifest(os.path.dirname(subj_dir))
+    if manifest is None:
+        return os.path.exists(trial_file)
+    return os.path.basename(trial_file) in manifest.trial_names(os.path.basename(subj_dir))
+
+def trial_files(subj_dir):
+    """Sorted paths of a subject's trial_*_*.mat files."""
+    manifest = active_manifest(os.path.dirname(subj_dir))
+    if manifest is None:
+        return sorted(glob.glob(os.path.join(subj_dir, "trial_*_*.mat")))
+    return sorted(os.path.join(subj_dir, name) for name in manifest.trial_names(os.path.basename(subj_dir)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Scan a study directory into its SQLite manifest and query trial sets.")
+    parser.add_argument('base_dir')
+    parser.add_argument('--subjects', nargs='+', default=None)
+    parser.add_argument('--expt', type=int, default=None)
+    parser.add_argument('--type', choices=['F0', 'F1'], default=None)
+    parser.add_argument('--word', default=None)
+    parser.add_argument('--cond', default=None)
+    parser.add_argument('--no-scan', action='store_true', help="Query the manifest as it is, without rescanning.")
+    parser.add_argument('--output', default=None, help="Save the matching trials to this CSV.")
+    args = parser.parse_args()
+
+    manifest = Manifest(args.base_dir)
+    if not args.no_scan:
+        counts = manifest.scan()
+        print(f"Scanned {args.base_dir}: re-read {counts['subjects']} subjects, {counts['experiments']} experiments, "
+              f"{counts['trials']} trials; removed {counts['removed']} entries")
+    df = manifest.trials(args.subjects, args.expt, args.type, args.word, args.cond)
+    print(f"{len(df)} matching trials from {df['subject'].nunique()} subjects, {df['duration'].sum():.1f} s of audio")
+    if args.output:
+        df.to_csv(args.output, index=False)
+        print(f"Saving trial list to {args.output}")
@@ -1,111 +1,321 @@
 import os
-import glob
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import pandas as pd
 import parselmouth
-from parselmouth.praat import call
-from scipy.io import loadmat
+import instrument
+from frame_tracks import intensity_frames, formant_matrix, relative_deviations, sample_at_times
+from fast_formants import prepare_signal, formant_tracks_for_ceilings
+from front_end import formant_spectrum, formant_sound
+from signal_store import load_signal
+from manifest import activate, list_subjects, trial_files
+from shared_buffers import share_signals, signal_at, release
 
 base_dir = "/Users/minkyu/experiments/F0vsF1"
-subject_ids = [d for d in os.listdir(base_dir) if os.path.isdir(os.path.join(base_dir, d))]
 subject_ids = ["101", "103", "104", "105", "108", "109", "111", "112", "117", "118", "122", "123"]
 subject_ids = ["113", "116", "121"]
 
 ceilings = list(range(4000, 6201, 200))  # [4800, 5000, 5200, 5400, 5600, 5800, 6000]
 intensity_threshold = 60.0
 
-rows = []
-optimal_rows = []
+# Trial states a worker rebuilt from the shared signals of the subject it is scoring
+_worker_states = {}
 
-for subject_id in sorted(subject_ids):
+
+def load_trial_state(mat_file, resample=False):
+    """Decode a trial once and cache its Sound (or spectrum) and the above-threshold frame times."""
+    # A slice of the subject's signal store, or only signalIn and params.sRate decoded from the file
+    signal, srate, bytes_read = load_signal(mat_file)
+    state = trial_state_from_signal(signal, srate, formant_spectrum(signal, srate) if resample else None)
+    state['bytes_read'] = bytes_read
+    return state
+
+
+def trial_state_from_signal(signal, srate, prepared=None):
+    """Sound and above-threshold intensity frame times for an already decoded signal.
+
+    The signal itself is kept for the NumPy formant engine, which prepares its
+    spectrum on first use and shares it across ceilings. Given a prepared
+    spectrum (front_end), both engines work from it alone: Praat passes
+    analyse a Sound cut from it at twice each ceiling instead of resampling
+    the trial themselves, and neither the Sound nor the signal is kept.
+    """
+    # Create a Sound object from the signal
+    snd = parselmouth.Sound(signal, sampling_frequency=srate)
+
+    # Compute intensity
+    with instrument.stage('to_intensity'):
+        intensity_obj = snd.to_intensity(time_step=0.025)
+        times, intensities = intensity_frames(intensity_obj)
+    instrument.count('praat_calls')
+    instrument.count('intensity_frames', len(times))
+
+    # Only frames above intensity threshold are considered for every ceiling
+    voiced_times = times[intensities > intensity_threshold]
+    state = {'times': voiced_times, 'duration': len(signal) / srate, 'burg_passes': 0, 'burg_wall': 0.0}
+    if prepared is not None:
+        state['prepared'] = prepared
+    else:
+        state.update(sound=snd, signal=signal, srate=srate)
+    return state
+
+
+def numpy_trial_deviations(trial_states, ceilings):
+    """{ceiling: F1-F4 deviations of every trial} from one batched NumPy Burg pass over all ceilings (fast_formants)."""
+    start = time.perf_counter()
+    with instrument.stage('numpy_burg'):
+        for state in trial_states:
+            if 'prepared' not in state:
+                state['prepared'] = prepare_signal(state['signal'], state['srate'])
+        tracks = formant_tracks_for_ceilings([state['prepared'] for state in trial_states], ceilings,
+                                             time_step=0.025, n_formants=4)
+    elapsed = (time.perf_counter() - start) / max(len(trial_states) * len(ceilings), 1)
+
+    results = {}
+    for ceiling in ceilings:
+        results[ceiling] = []
+        for state, (frame_times, values) in zip(trial_states, tracks[ceiling]):
+            instrument.count('formant_frames', len(frame_times))
+            state['burg_passes'] += 1
+            state['burg_wall'] += elapsed
+            results[ceiling].append(relative_deviations(sample_at_times(frame_times, values, state['times'], 0.0,
+                                                                        state['duration'])))
+    return results
+
+def praat_trial_deviations(state, ceiling):
+    """F1-F4 deviations of one trial from a Praat Burg pass."""
+    # Track formants
+    start = time.perf_counter()
+    snd = state['sound'] if 'sound' in state else formant_sound(state['prepared'], ceiling)
+    with instrument.stage('to_formant_burg'):
+        formant = snd.to_formant_burg(
+            time_step=0.025,
+            max_number_of_formants=4,
+            window_length=0.025,
+            pre_emphasis_from=50,
+            maximum_formant=ceiling
+        )
+    instrument.count('praat_calls')
+    instrument.count('formant_frames', formant.n_frames)
+    state['burg_passes'] += 1
+    state['burg_wall'] += time.perf_counter() - start
+
+    # Extract F1-F4 at the above-threshold intensity frame times in one pass;
+    # undefined values (no formant found) come back as NaN and are ignored
+    values = formant_matrix(formant, state['times'], n_formants=4)
+    return relative_deviations(values)
+
+def trial_deviations(trial_states, ceiling, engine='praat'):
+    """F1-F4 deviations (std/mean) of each trial for a single ceiling."""
+    if engine == 'numpy':
+        return numpy_trial_deviations(trial_states, [ceiling])[ceiling]
+    return [praat_trial_deviations(state, ceiling) for state in trial_states]
+
+def summarize_deviations(trial_devs):
+    """Mean F1-F4 deviations across trials (NaNs ignored) and their sum."""
+    # Average deviations across all trials for this ceiling
+    # If no values, set to NaN
+    mean_devs = []
+    for k in range(4):
+        devs = np.array([d[k] for d in trial_devs])
+        devs = devs[~np.isnan(devs)]
+        mean_devs.append(np.mean(devs) if len(devs) > 0 else np.nan)
+    mean_f1_dev, mean_f2_dev, mean_f3_dev, mean_f4_dev = mean_devs
+
+    sum_dev = np.nansum([mean_f1_dev, mean_f2_dev, mean_f3_dev, mean_f4_dev])
+    return mean_f1_dev, mean_f2_dev, mean_f3_dev, mean_f4_dev, sum_dev
+
+def evaluate_ceiling(trial_states, ceiling, engine='praat'):
+    """Mean F1-F4 deviations (std/mean) across cached trials for a single ceiling.
+
+    engine 'numpy' tracks formants with the batched NumPy Burg engine instead
+    of Praat.
+    """
+    return summarize_deviations(trial_deviations(trial_states, ceiling, engine))
+
+def valid_sum(values):
+    """Deviation sum of an evaluation, or NaN when no formant was measured at that ceiling.
+
+    The sum itself is a nansum, so it reads 0 when all four means are NaN.
+    """
+    return np.nan if np.all(np.isnan(values[:4])) or np.isnan(values[4]) else values[4]
+
+
+class SharedTrials:
+    """A subject's decoded trials packed into one shared buffer (shared_buffers) and scored in worker processes.
+
+    Tasks carry only the buffer reference, the trial spans and one ceiling;
+    each worker rebuilds the trial states from the shared signals once and
+    returns the deviations plus per-trial Burg timings, which are added to
+    the parent's trial states.
+    """
+
+    def __init__(self, signals, executor, resample=False):
+        self.ref, self.spans = share_signals([signal for signal, _ in signals])
+        self.srates = [srate for _, srate in signals]
+        self.executor = executor
+        self.resample = resample
+
+    def evaluate(self, trial_states, ceilings, engine='praat'):
+        """{ceiling: per-trial deviations} of trial_states."""
+        rows = [state['row'] for state in trial_states]
+        tasks = [(self.ref, self.spans, self.srates, rows, c, engine, self.resample) for c in ceilings]
+        results = {}
+        for c, (values, walls) in zip(ceilings, map(instrument.merged, self.executor.map(_collect_evaluate_shared, tasks))):
+            results[c] = values
+            for state, wall in zip(trial_states, walls):
+                state['burg_passes'] += 1
+                state['burg_wall'] += wall
+        return results
+
+    def close(self):
+        release(self.ref)
+
+def _evaluate_shared(args):
+    ref, spans, srates, rows, ceiling, engine, resample = args
+    if ref[0] not in _worker_states:
+        _worker_states.clear()
+        signals = [(signal_at(ref, span), srate) for span, srate in zip(spans, srates)]
+        _worker_states[ref[0]] = [trial_state_from_signal(signal, srate, formant_spectrum(signal, srate) if resample else None)
+                                  for signal, srate in signals]
+    states = [_worker_states[ref[0]][row] for row in rows]
+    before = [state['burg_wall'] for state in states]
+    values = trial_deviations(states, ceiling, engine)
+    return values, [state['burg_wall'] - wall for state, wall in zip(states, before)]
+
+def _collect_evaluate_shared(args):
+    return instrument.collect(_evaluate_shared, args)
+
+def evaluate_trials(trial_states, ceilings, engine='praat', shared=None):
+    """{ceiling: per-trial deviations} of several ceilings; with SharedTrials they are scored in parallel.
+
+    Without workers, the 'numpy' engine evaluates all the ceilings in one batch.
+    """
+    if shared is None and engine == 'numpy':
+        return numpy_trial_deviations(trial_states, list(ceilings))
+    if shared is None:
+        return {ceiling: trial_deviations(trial_states, ceiling, engine) for ceiling in ceilings}
+    return shared.evaluate(trial_states, ceilings, engine)
+
+def evaluate_ceilings(trial_states, ceilings, engine='praat', shared=None):
+    """evaluate_ceiling() of several ceilings; with SharedTrials they are scored in parallel."""
+    return {ceiling: summarize_deviations(devs)
+            for ceiling, devs in evaluate_trials(trial_states, ceilings, engine, shared).items()}
+
+def grid_search(trial_states, ceilings, engine='praat', shared=None):
+    """Evaluate every ceiling of a fixed grid on all trials."""
+    return evaluate_ceilings(trial_states, ceilings, engine, shared), len(ceilings) * len(trial_states)
+
+def refine_search(trial_states, coarse_step=400, fine_steps=(200, 100, 50), subsample=2, tol=1e-3, engine='praat',
+                  shared=None):
+    """Coarse-to-fine ceiling search.
+
+    A coarse grid over the ceiling range is evaluated on every subsample-th
+    trial; the best coarse ceiling is then hill-climbed on all trials at each
+    finer step. Climbing at a step stops early once neither neighbour lowers
+    the deviation sum by more than tol (relative). Per-trial deviations are
+    kept, so a ceiling of the coarse grid evaluated on all trials later only
+    runs the trials the coarse pass left out. Ceilings where no formant was
+    measured (valid_sum NaN) never win. Returns the full-trial evaluations
+    and the number of Burg passes performed.
+    """
+    lo, hi = min(ceilings), max(ceilings)
+    per_trial = {}
+    n_passes = 0
+
+    def evaluate(indices, cs):
+        """Summaries of ceilings cs over trial_states[indices], running only trials not yet seen at each ceiling."""
+        nonlocal n_passes
+        groups = {}
+        for c in cs:
+            missing = tuple(k for k in indices if k not in per_trial.setdefault(c, {}))
+            if missing:
+                groups.setdefault(missing, []).append(c)
+        for missing, group in groups.items():
+            results = evaluate_trials([trial_states[k] for k in missing], group, engine, shared)
+            for c, devs in results.items():
+                per_trial[c].update(zip(missing, devs))
+            n_passes += len(missing) * len(group)
+        return {c: summarize_deviations([per_trial[c][k] for k in indices]) for c in cs}
+
+    def score(values):
+        total = valid_sum(values)
+        return np.inf if np.isnan(total) else total
+
+    coarse_indices = list(range(0, len(trial_states), subsample))
+    coarse = evaluate(coarse_indices, list(range(lo, hi + 1, coarse_step)))
+    for c, vals in coarse.items():
+        print(f"    Coarse {c} Hz ({len(coarse_indices)} trials) - Sum={vals[4]:.2f}")
+
+    all_indices = list(range(len(trial_states)))
+    evaluated = {}
+    def deviation_sums(cs):
+        evaluated.update(evaluate(all_indices, [c for c in cs if c not in evaluated]))
+        return {c: score(evaluated[c]) for c in cs}
+
+    best = min(coarse, key=lambda c: (score(coarse[c]), c))
+    for step in fine_steps:
+        while True:
+            neighbours = [c for c in (best - step, best + step) if lo <= c <= hi]
+            if not neighbours:
+                break
+            sums = deviation_sums(neighbours + [best])
+            candidate = min(neighbours, key=lambda c: (sums[c], c))
+            if sums[candidate] >= sums[best] * (1 - tol):
+                break
+            best = candidate
+    return evaluated, n_passes
+
+def optimize_subject(subject_id, base_dir, search='grid', search_opts=None, engine='praat', resample=False, executor=None):
+    """Find the ceiling minimizing the summed F1-F4 deviation for one subject.
+
+    Returns the optimal ceiling and the per-ceiling deviation rows, or
+    (None, []) if the subject has no trial files. engine selects Praat or the
+    NumPy Burg formant tracker; with resample, every trial is transformed once
+    and each ceiling's Burg input is cut from that spectrum (front_end). With
+    an executor, ceilings are scored in worker processes that read the
+    trials from shared memory (SharedTrials).
+    """
     print(f"Analyzing {subject_id}...")
     subject_path = os.path.join(base_dir, subject_id)
-    mat_files = sorted(glob.glob(os.path.join(subject_path, "trial_*_*.mat")))
+    mat_files = trial_files(subject_path)
 
     # If no mat files found, skip this subject
     if not mat_files:
-        continue
+        return None, []
+
+    # Decode each trial and compute its intensity mask once for the whole sweep
+    mat_files = mat_files[:60]
+    trial_states = []
+    load_wall = []
+    signals = []
+    for mat_file in mat_files:
+        start = time.perf_counter()
+        if executor is None:
+            trial_states.append(load_trial_state(mat_file, resample))
+        else:
+            # Workers build the states themselves; the parent only packs the signals for them
+            signal, srate, bytes_read = load_signal(mat_file)
+            signals.append((signal, srate))
+            trial_states.append({'row': len(trial_states), 'bytes_read': bytes_read, 'burg_passes': 0, 'burg_wall': 0.0})
+        load_wall.append(time.perf_counter() - start)
+    shared = SharedTrials(signals, executor, resample) if executor is not None else None
 
     # For each ceiling, we will accumulate formant deviations across trials
-    ceiling_deviations = {}
-    for ceiling in ceilings:
-        f1_devs = []
-        f2_devs = []
-        f3_devs = []
-        f4_devs = []
-
-        for mat_file in mat_files[:60]:
-            mat_data = loadmat(mat_file, squeeze_me=True, struct_as_record=False)
-            data = mat_data['data']
-
-            # Extract signal and sampling rate
-            signal = data.signalIn
-            srate = data.params.sRate
-
-            # Create a Sound object from the signal
-            snd = parselmouth.Sound(signal, sampling_frequency=srate)
-
-            # Compute intensity
-            intensity_obj = snd.to_intensity(time_step=0.025)
-            num_frames = call(intensity_obj, "Get number of frames")
-            times = [call(intensity_obj, "Get time from frame number", i+1) for i in range(num_frames)]
-            intensities = np.array([call(intensity_obj, "Get value in frame", i+1) for i in range(num_frames)])
-            
-            # Track formants
-            formant = snd.to_formant_burg(
-                time_step=0.025,
-                max_number_of_formants=4,
-                window_length=0.025,
-                pre_emphasis_from=50,
-                maximum_formant=ceiling
-            )
-
-            # Extract formants at the same times as intensity frames
-            f1_vals = []
-            f2_vals = []
-            f3_vals = []
-            f4_vals = []
-
-            for t_idx, t in enumerate(times):
-                # Only consider frames above intensity threshold
-                if intensities[t_idx] > intensity_threshold:
-                    # Retrieve formant frequency values
-                    # Note: Formant numbering starts at 1 in Praat
-                    f1 = call(formant, "Get value at time", 1, t, 'Hertz', 'Linear')
-                    f2 = call(formant, "Get value at time", 2, t, 'Hertz', 'Linear')
-                    f3 = call(formant, "Get value at time", 3, t, 'Hertz', 'Linear')
-                    f4 = call(formant, "Get value at time", 4, t, 'Hertz', 'Linear')
-
-                    # Sometimes Praat returns undefined values (NaN) if no formant is found
-                    # Filter them out
-                    if not np.isnan(f1):
-                        f1_vals.append(f1)
-                    if not np.isnan(f2):
-                        f2_vals.append(f2)
-                    if not np.isnan(f3):
-                        f3_vals.append(f3)
-                    if not np.isnan(f4):
-                        f4_vals.append(f4)
-
-            # Compute deviations (standard deviations) for each formant if we have data
-            if len(f1_vals) > 1:
-                f1_devs.append(np.std(f1_vals)/np.mean(f1_vals))
-            if len(f2_vals) > 1:
-                f2_devs.append(np.std(f2_vals)/np.mean(f2_vals))
-            if len(f3_vals) > 1:
-                f3_devs.append(np.std(f3_vals)/np.mean(f3_vals))
-            if len(f4_vals) > 1:
-                f4_devs.append(np.std(f4_vals)/np.mean(f4_vals))
-
-        # Average deviations across all trials for this ceiling
-        # If no values, set to NaN or 0
-        mean_f1_dev = np.mean(f1_devs) if len(f1_devs) > 0 else np.nan
-        mean_f2_dev = np.mean(f2_devs) if len(f2_devs) > 0 else np.nan
-        mean_f3_dev = np.mean(f3_devs) if len(f3_devs) > 0 else np.nan
-        mean_f4_dev = np.mean(f4_devs) if len(f4_devs) > 0 else np.nan
-        
-        sum_dev = np.nansum([mean_f1_dev, mean_f2_dev, mean_f3_dev, mean_f4_dev])
-        ceiling_deviations[ceiling] = (mean_f1_dev, mean_f2_dev, mean_f3_dev, mean_f4_dev, sum_dev)
+    try:
+        if search == 'refine':
+            ceiling_deviations, n_passes = refine_search(trial_states, engine=engine, shared=shared, **(search_opts or {}))
+        else:
+            ceiling_deviations, n_passes = grid_search(trial_states, ceilings, engine, shared)
+    finally:
+        if shared is not None:
+            shared.close()
+
+    rows = []
+    for ceiling in sorted(ceiling_deviations):
+        mean_f1_dev, mean_f2_dev, mean_f3_dev, mean_f4_dev, sum_dev = ceiling_deviations[ceiling]
 
         print(f"    Ceiling {ceiling} Hz - Mean Deviations: F1={mean_f1_dev:.2f}, F2={mean_f2_dev:.2f}, F3={mean_f3_dev:.2f}, F4={mean_f4_dev:.2f}, Sum={sum_dev:.2f}")
 
@@ -119,10 +329,15 @@ for subject_id in sorted(subject_ids):
             "F4 deviation": mean_f4_dev,
             "Sum of deviation": sum_dev
         })
-
+    print(f"  {len(ceiling_deviations)} ceilings evaluated on all trials, {n_passes} Burg passes in total "
+          f"(the full grid takes {len(ceilings) * len(trial_states)}).")
+    for mat_file, state, wall in zip(mat_files, trial_states, load_wall):
+        instrument.record_trial(subject=subject_id, file=os.path.basename(mat_file), load_wall=wall,
+                                bytes_read=state['bytes_read'], burg_passes=state['burg_passes'],
+                                burg_wall=state['burg_wall'])
 
     # Determine optimal ceiling for this subject based on minimal sum of deviations
-    valid_ceilings = [(c, vals[4]) for c, vals in ceiling_deviations.items() if not np.isnan(vals[4])]
+    valid_ceilings = [(c, valid_sum(vals)) for c, vals in ceiling_deviations.items() if not np.isnan(valid_sum(vals))]
     if valid_ceilings:
         optimal_ceiling = min(valid_ceilings, key=lambda x: x[1])[0]
         print(f"  Optimal Ceiling for {subject_id}: {optimal_ceiling} Hz\n")
@@ -130,19 +345,78 @@ for subject_id in sorted(subject_ids):
         optimal_ceiling = np.nan
         print(f"  [Warning] No valid ceilings found for {subject_id}. Optimal Ceiling set to NaN.\n")
 
-    optimal_rows.append({
-        "Subject ID": subject_id,
-        "Optimal Ceiling": optimal_ceiling
-    })
+    return optimal_ceiling, rows
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Find the per-subject formant ceiling that minimizes F1-F4 deviation.")
+    parser.add_argument('--base-dir', default=base_dir)
+    parser.add_argument('--subjects', nargs='+', default=subject_ids,
+                        help="Subject IDs to process, or 'all' for every subject directory.")
+    parser.add_argument('--search', choices=['grid', 'refine'], default='grid',
+                        help="Fixed 200 Hz grid, or coarse-to-fine refinement.")
+    parser.add_argument('--coarse-step', type=int, default=400)
+    parser.add_argument('--fine-steps', type=int, nargs='+', default=[200, 100, 50])
+    parser.add_argument('--subsample', type=int, default=2,
+                        help="Use every n-th trial for the coarse grid.")
+    parser.add_argument('--tol', type=float, default=1e-3,
+                        help="Minimum relative improvement of the deviation sum to move to a neighbouring ceiling.")
+    parser.add_argument('--formant-engine', choices=['praat', 'numpy'], default='praat',
+                        help="Track formants with Praat, or with the batched NumPy Burg engine (fast_formants).")
+    parser.add_argument('--resample', action='store_true',
+                        help="Transform each trial once and feed every ceiling's Burg pass from it instead of letting Praat resample per ceiling.")
+    parser.add_argument('--jobs', type=int, default=1,
+                        help="Number of worker processes scoring ceilings in parallel from shared memory (1 runs serially).")
+    parser.add_argument('--manifest', action='store_true',
+                        help="Look up subjects, experiment lists and trial files in <base-dir>/manifest.sqlite (built on first use; rescan with manifest.py).")
+    parser.add_argument('--report', action='store_true',
+                        help="Write per-stage timings, counters and per-trial timings to <base-dir>/optimize_formants_profile_*.json/_trials_*.csv.")
+    parser.add_argument('--profile', choices=['cprofile', 'pyinstrument'], default=None,
+                        help="Also run under a profiler and save its output to <base-dir>.")
+    return parser.parse_args()
+
+def run(args):
+    """Run the ceiling search for the parsed command-line arguments."""
+    if args.manifest:
+        activate(args.base_dir)
+    if args.subjects == ['all']:
+        args.subjects = list_subjects(args.base_dir)
+    search_opts = {'coarse_step': args.coarse_step, 'fine_steps': args.fine_steps,
+                   'subsample': args.subsample, 'tol': args.tol}
+
+    rows = []
+    optimal_rows = []
+    executor = ProcessPoolExecutor(max_workers=args.jobs) if args.jobs > 1 else None
+    try:
+        for subject_id in sorted(args.subjects):
+            optimal_ceiling, subject_rows = optimize_subject(subject_id, args.base_dir, args.search, search_opts,
+                                                             args.formant_engine, args.resample, executor)
+            if optimal_ceiling is None:
+                continue
+            rows.extend(subject_rows)
+            optimal_rows.append({
+                "Subject ID": subject_id,
+                "Optimal Ceiling": optimal_ceiling
+            })
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    # Save the CSV files
+    output_deviation_csv = os.path.join(args.base_dir, "formant_deviations.csv")
+    output_optimal_csv = os.path.join(args.base_dir, "optimal_ceilings.csv")
 
-# Save the CSV files
-output_deviation_csv = os.path.join(base_dir, "formant_deviations.csv")
-output_optimal_csv = os.path.join(base_dir, "optimal_ceilings.csv")
+    print(f"Saving formant deviations to {output_deviation_csv}")
+    df = pd.DataFrame(rows)
+    df.to_csv(output_deviation_csv, index=False)
 
-print(f"Saving formant deviations to {output_deviation_csv}")
-df = pd.DataFrame(rows)
-df.to_csv(output_deviation_csv, index=False)
+    print(f"Saving optimal ceilings to {output_optimal_csv}")
+    opt_df = pd.DataFrame(optimal_rows)
+    opt_df.to_csv(output_optimal_csv, index=False)
 
-print(f"Saving optimal ceilings to {output_optimal_csv}")
-opt_df = pd.DataFrame(optimal_rows)
-opt_df.to_csv(output_optimal_csv, index=False)
\ No newline at end of file
+if __name__ == '__main__':
+    args = parse_args()
+    with instrument.profiling(args.profile, args.base_dir, 'optimize_formants'):
+        with instrument.stage('total'):
+            run(args)
+    if args.report:
+        instrument.write_report(args.base_dir, 'optimize_formants', {'args': vars(args)})
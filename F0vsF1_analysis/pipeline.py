@@ -0,0 +1,224 @@
+import os
+import re
+import json
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import instrument
+import optimize_formants
+import prelim_get_fdata
+from manifest import activate, list_subjects, trial_files
+
+stages = ['optimize', 'extract', 'plot']
+state_dir_name = '.pipeline'
+expt_pattern = re.compile(r'expt(_\d+_F[01])?\.mat$')
+
+
+def file_identity(paths):
+    """(name, size, mtime) of every existing path, the way TrackCache identifies trial files."""
+    identity = []
+    for path in sorted(paths):
+        if os.path.isdir(path):
+            identity.extend(file_identity(os.path.join(path, name) for name in os.listdir(path)))
+        elif os.path.exists(path):
+            stat = os.stat(path)
+            identity.append([os.path.basename(path), stat.st_size, stat.st_mtime_ns])
+    return identity
+
+def fingerprint(*parts):
+    return hashlib.sha1(json.dumps(parts, default=float).encode()).hexdigest()
+
+def result_files(base_dir, subj_id):
+    """Everything prelim_get_fdata can write for a subject (the inputs of its plots)."""
+    names = [f"{subj_id}_{prefix}_{kind}.mat" for prefix in ('f1', 'f0') for kind in ('data', 'stats', 'diff')]
+    return [os.path.join(base_dir, name) for name in names] + [os.path.join(base_dir, f"{subj_id}_tracks"),
+                                                               os.path.join(base_dir, f"{subj_id}_adaptive_ceilings.csv")]
+
+def plot_files(base_dir, subj_id):
+    return [os.path.join(base_dir, f"plot_{kind}_{subj_id}.png") for kind in ('avg', 'diff', 'all')]
+
+
+class SubjectState:
+    """Fingerprints of the inputs each stage last ran on for one subject, and the outputs it wrote.
+
+    Kept in <base_dir>/.pipeline/<subj_id>.json. A stage is stale when its
+    input fingerprint changed or one of its recorded outputs is gone.
+    """
+
+    def __init__(self, base_dir, subj_id):
+        self.path = os.path.join(base_dir, state_dir_name, f"{subj_id}.json")
+        self.stages = {}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.stages = json.load(f)
+
+    def stale(self, stage, key):
+        entry = self.stages.get(stage)
+        return entry is None or entry['key'] != key or not all(os.path.exists(p) for p in entry['outputs'])
+
+    def done(self, stage, key, outputs, **extra):
+        self.stages[stage] = dict(extra, key=key, outputs=[p for p in outputs if os.path.exists(p)])
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + '.tmp', 'w') as f:
+            json.dump(self.stages, f, indent=1, default=int)
+        os.replace(self.path + '.tmp', self.path)
+
+
+def optimize_key(base_dir, subj_id, opts):
+    """Inputs of the ceiling search: the (at most 60) trials it reads and its options."""
+    files = trial_files(os.path.join(base_dir, subj_id))[:60]
+    return fingerprint('optimize', file_identity(files), opts)
+
+def run_optimize(base_dir, subj_id, opts):
+    """Ceiling search of one subject; its deviation rows are kept in .pipeline/<subj_id>_deviations.csv."""
+    state = SubjectState(base_dir, subj_id)
+    key = optimize_key(base_dir, subj_id, opts)
+    rows_file = os.path.join(base_dir, state_dir_name, f"{subj_id}_deviations.csv")
+    if not state.stale('optimize', key):
+        return subj_id, state.stages['optimize']['ceiling'], False
+    search_opts = {name: opts[name] for name in ('coarse_step', 'fine_steps', 'subsample', 'tol')}
+    ceiling, rows = optimize_formants.optimize_subject(subj_id, base_dir, opts['search'], search_opts,
+                                                       opts['formant_engine'], opts['resample'])
+    os.makedirs(os.path.dirname(rows_file), exist_ok=True)
+    pd.DataFrame(rows).to_csv(rows_file, index=False)
+    state.done('optimize', key, [rows_file], ceiling=ceiling)
+    return subj_id, ceiling, True
+
+def extract_key(base_dir, subj_id, ceiling, opts):
+    """Inputs of the extraction: every trial and expt file of the subject, its ceiling row and the options."""
+    subj_dir = os.path.join(base_dir, subj_id)
+    expt_files = [os.path.join(subj_dir, name) for name in os.listdir(subj_dir) if expt_pattern.fullmatch(name)]
+    return fingerprint('extract', file_identity(trial_files(subj_dir) + expt_files), ceiling, opts)
+
+def run_extract(base_dir, subj_id, ceiling, opts):
+    state = SubjectState(base_dir, subj_id)
+    key = extract_key(base_dir, subj_id, ceiling, opts)
+    if not state.stale('extract', key):
+        return subj_id, False
+    optimal_ceiling = {} if ceiling is None else {subj_id: ceiling}
+    prelim_get_fdata.process_subject(subj_id, base_dir, optimal_ceiling, output=opts['output'],
+                                     ceiling_mode=opts['ceiling_mode'], ceiling_candidates=opts['ceiling_candidates'],
+                                     onset_engine=opts['onset_engine'], formant_engine=opts['formant_engine'],
+                                     resample=opts['resample'], data_layout=opts['data_layout'])
+    state.done('extract', key, result_files(base_dir, subj_id))
+    return subj_id, True
+
+def init_worker():
+    """Render the plots of worker processes with Agg (see prelim_plot_fdata.use_agg)."""
+    import prelim_plot_fdata
+    prelim_plot_fdata.use_agg()
+
+def run_plot(base_dir, subj_id, render='standard'):
+    import prelim_plot_fdata
+    state = SubjectState(base_dir, subj_id)
+    key = fingerprint('plot', file_identity(result_files(base_dir, subj_id)), render)
+    if not state.stale('plot', key):
+        return subj_id, False
+    prelim_plot_fdata.plot_subject(subj_id, base_dir, render)
+    state.done('plot', key, plot_files(base_dir, subj_id))
+    return subj_id, True
+
+def run_chain(base_dir, subj_id, ceiling, selected, opts, render='standard'):
+    """The extract and plot stages of one subject, in order; returns the stages that ran."""
+    ran = []
+    if 'extract' in selected and run_extract(base_dir, subj_id, ceiling, opts)[1]:
+        ran.append('extract')
+    if 'plot' in selected and run_plot(base_dir, subj_id, render)[1]:
+        ran.append('plot')
+    return subj_id, ran
+
+def merge_ceilings(base_dir, subject_ceilings):
+    """Rewrite optimal_ceilings.csv and formant_deviations.csv with the given subjects' rows replaced."""
+    ceiling_file = os.path.join(base_dir, 'optimal_ceilings.csv')
+    deviation_file = os.path.join(base_dir, 'formant_deviations.csv')
+    subjects = [subj_id for subj_id, ceiling in subject_ceilings.items() if ceiling is not None]
+
+    optimal = pd.read_csv(ceiling_file, dtype={'Subject ID': str}) if os.path.exists(ceiling_file) else \
+        pd.DataFrame(columns=['Subject ID', 'Optimal Ceiling'])
+    optimal = optimal[~optimal['Subject ID'].isin(subjects)]
+    new_rows = pd.DataFrame([{'Subject ID': subj_id, 'Optimal Ceiling': subject_ceilings[subj_id]} for subj_id in subjects],
+                            columns=['Subject ID', 'Optimal Ceiling'])
+    pd.concat([optimal, new_rows]).sort_values('Subject ID').to_csv(ceiling_file, index=False)
+
+    deviations = pd.read_csv(deviation_file, dtype={'Subject ID': str}, float_precision='round_trip') if os.path.exists(deviation_file) else None
+    if deviations is not None:
+        deviations = deviations[~deviations['Subject ID'].isin(subjects)]
+    frames = [deviations] + [pd.read_csv(os.path.join(base_dir, state_dir_name, f"{subj_id}_deviations.csv"),
+                                         dtype={'Subject ID': str}, float_precision='round_trip')
+              for subj_id in subjects]
+    pd.concat([frame for frame in frames if frame is not None]).sort_values(['Subject ID', 'Ceiling']).to_csv(
+        deviation_file, index=False)
+
+def run(args):
+    """Bring every selected stage of every subject up to date, running only the stale ones."""
+    if args.manifest:
+        activate(args.base_dir)
+    if args.subjects == ['all']:
+        args.subjects = list_subjects(args.base_dir)
+    subjects = sorted(args.subjects)
+    opts = {'search': args.search, 'coarse_step': args.coarse_step, 'fine_steps': args.fine_steps,
+            'subsample': args.subsample, 'tol': args.tol, 'formant_engine': args.formant_engine,
+            'resample': args.resample}
+    extract_opts = {'output': args.output, 'ceiling_mode': args.ceiling_mode,
+                    'ceiling_candidates': args.ceiling_candidates, 'onset_engine': args.onset_engine,
+                    'formant_engine': args.formant_engine, 'resample': args.resample, 'data_layout': args.data_layout,
+                    'time_step': prelim_get_fdata.time_step, 'max_samples': prelim_get_fdata.max_samples}
+
+    initializer = init_worker if 'plot' in args.stages else None
+    executor = ProcessPoolExecutor(max_workers=args.jobs, initializer=initializer) if args.jobs > 1 else None
+    run_map = map if executor is None else executor.map
+    try:
+        # optimal_ceilings.csv is shared by every subject, so all ceiling searches finish before extraction
+        if 'optimize' in args.stages:
+            results = list(run_map(run_optimize, [args.base_dir] * len(subjects), subjects, [opts] * len(subjects)))
+            rerun = {subj_id: ceiling for subj_id, ceiling, ran in results if ran}
+            if rerun:
+                merge_ceilings(args.base_dir, rerun)
+            print(f"optimize: {len(rerun)} of {len(subjects)} subjects rerun")
+
+        ceiling_file = os.path.join(args.base_dir, 'optimal_ceilings.csv')
+        ceilings = prelim_get_fdata.load_optimal_ceilings(args.base_dir) if os.path.exists(ceiling_file) else {}
+        chain_args = [[args.base_dir] * len(subjects), subjects, [ceilings.get(subj_id) for subj_id in subjects],
+                      [args.stages] * len(subjects), [extract_opts] * len(subjects), [args.render] * len(subjects)]
+        ran = dict(run_map(run_chain, *chain_args))
+        for stage in ('extract', 'plot'):
+            if stage in args.stages:
+                print(f"{stage}: {sum(stage in stages_run for stages_run in ran.values())} of {len(subjects)} subjects rerun")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run optimize -> extract -> plot for every subject, redoing only stale stages.")
+    parser.add_argument('--base-dir', default=prelim_get_fdata.base_dir)
+    parser.add_argument('--subjects', nargs='+', default=['all'],
+                        help="Subject IDs to bring up to date, or 'all' (default) for every subject directory.")
+    parser.add_argument('--stages', nargs='+', choices=stages, default=stages)
+    parser.add_argument('--jobs', type=int, default=1,
+                        help="Number of subjects processed in parallel.")
+    parser.add_argument('--manifest', action='store_true',
+                        help="Look up subjects and trial files in <base-dir>/manifest.sqlite.")
+    parser.add_argument('--search', choices=['grid', 'refine'], default='grid')
+    parser.add_argument('--coarse-step', type=int, default=400)
+    parser.add_argument('--fine-steps', type=int, nargs='+', default=[200, 100, 50])
+    parser.add_argument('--subsample', type=int, default=2)
+    parser.add_argument('--tol', type=float, default=1e-3)
+    parser.add_argument('--output', choices=['mat', 'npy', 'both'], default='both')
+    parser.add_argument('--data-layout', choices=['trials', 'compact'], default='trials')
+    parser.add_argument('--ceiling-mode', choices=['subject', 'word', 'trial'], default='subject')
+    parser.add_argument('--ceiling-candidates', type=int, nargs='+', default=optimize_formants.ceilings)
+    parser.add_argument('--onset-engine', choices=['praat', 'numpy'], default='praat')
+    parser.add_argument('--formant-engine', choices=['praat', 'numpy'], default='praat')
+    parser.add_argument('--resample', action='store_true')
+    parser.add_argument('--render', choices=['standard', 'fast'], default='standard')
+    parser.add_argument('--report', action='store_true',
+                        help="Write per-stage timings and counters to <base-dir>/pipeline_profile_*.json.")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    with instrument.stage('total'):
+        run(args)
+    if args.report:
+        instrument.write_report(args.base_dir, 'pipeline', {'args': vars(args)})
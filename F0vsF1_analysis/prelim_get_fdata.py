@@ -1,91 +1,372 @@
 import os
+import shutil
+import warnings
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import pandas as pd
-from scipy.io import loadmat, savemat
+from scipy.io import savemat
 import parselmouth
+import instrument
+from frame_tracks import intensity_frames, formant_frames
+from fast_onset import onset_tracks
+from fast_formants import prepare_signal, formant_tracks
+from front_end import pitch_rate, pitch_signal, formant_spectrum, formant_sound
+from signal_store import load_signal, prefetch
+from manifest import (activate, list_subjects, experiment_data, experiment_trials, trial_exists, trial_pattern,
+                      read_experiment_data, read_experiment_trials)
+from track_cache import TrackCache, cached
+from shared_buffers import allocate, attach, share, release
+from trial_store import TrialStore
+from track_tables import pack_tracks, save_tracks, load_tracks, remove_tracks, TrackSet
+from track_stats import compute_stats, compute_diff, stats_from_tables, RunningStats
+from optimize_formants import ceilings, trial_state_from_signal, evaluate_ceiling, evaluate_ceilings
 
 # Base directory and subjects
 base_dir = "/Users/minkyu/experiments/F0vsF1"
-subject_ids = [d for d in os.listdir(base_dir) if os.path.isdir(os.path.join(base_dir, d))]
 subject_ids = ["110"]
 time_step = 0.002
 max_samples = 150
-
-# Load optimal ceiling values from the CSV file
-ceiling_file = os.path.join(base_dir, 'optimal_ceilings.csv')
-optimal_ceiling_df = pd.read_csv(ceiling_file)
-optimal_ceiling = dict(zip(optimal_ceiling_df['Subject ID'].astype(str), optimal_ceiling_df['Optimal Ceiling']))
-
-def detect_onset(signal, srate, gender):
-    """Detect the onset time based on intensity and pitch."""
-    snd = parselmouth.Sound(signal, srate)
-
-    # Intensity threshold: highest - 10 dB
-    intensity_obj = snd.to_intensity()
-    intensity_values = intensity_obj.values.flatten()
-    intensity_times = intensity_obj.xs()
-    intensity_threshold = np.max(intensity_values) - 10
-    intensity_onset_idx = np.argmax(intensity_values > intensity_threshold)
-    intensity_onset_time = intensity_times[intensity_onset_idx] if intensity_onset_idx < len(intensity_times) else np.inf
-
-    # Pitch onset
-    if gender.lower() == 'male':
-        pitch_floor, pitch_ceiling = 50, 250
-    else:
-        pitch_floor, pitch_ceiling = 100, 400
-
-    pitch_obj = snd.to_pitch(time_step=None, pitch_floor=pitch_floor, pitch_ceiling=pitch_ceiling)
-    pitch_values = pitch_obj.selected_array['frequency']
-    pitch_times = pitch_obj.xs()
-    pitch_onset_idx = np.argmax(pitch_values > 0)
-    pitch_onset_time = pitch_times[pitch_onset_idx] if pitch_onset_idx < len(pitch_times) else np.inf
-
-    # Onset is the later of the two
-    onset_time = max(intensity_onset_time, pitch_onset_time)
-    return onset_time
-
-def extract_formants(signal, srate, gender):
-    """Extract formants without masking for intensity or pitch."""
-    snd = parselmouth.Sound(signal, srate)
-
-    # Use the optimal ceiling from the CSV, defaulting to gender-based ceiling
+# Columns of F1 and F0 tracks, and the frames per trial reserved for them in a shared results array (8 s)
+track_columns = {'F1': ['time', 'F1', 'F2'], 'F0': ['time', 'pitch']}
+shared_track_frames = 4000
+
+def load_optimal_ceilings(base_dir):
+    """Load optimal ceiling values from the CSV file."""
+    ceiling_file = os.path.join(base_dir, 'optimal_ceilings.csv')
+    optimal_ceiling_df = pd.read_csv(ceiling_file)
+    return dict(zip(optimal_ceiling_df['Subject ID'].astype(str), optimal_ceiling_df['Optimal Ceiling']))
+
+def get_ceiling(optimal_ceiling, subj_id, gender):
+    """Use the optimal ceiling from the CSV, defaulting to gender-based ceiling."""
     default_ceiling = 5000 if gender.lower() == 'male' else 5500
-    ceiling = optimal_ceiling.get(subj_id, default_ceiling)
-
-    formant = snd.to_formant_burg(
-        time_step=time_step,
-        max_number_of_formants=4,
-        window_length=0.025,
-        pre_emphasis_from=50,
-        maximum_formant=ceiling
-    )
-
-    times = np.array([formant.get_time_from_frame_number(i) for i in range(1, formant.get_number_of_frames() + 1)])
-    f1 = np.array([formant.get_value_at_time(1, t) for t in times])
-    f2 = np.array([formant.get_value_at_time(2, t) for t in times])
-
-    return times, f1, f2
-
-def extract_pitch(signal, srate, gender):
-    """Extract pitch without masking for intensity."""
-    snd = parselmouth.Sound(signal, srate)
+    return optimal_ceiling.get(subj_id, default_ceiling)
 
-    # Pitch params
+def get_pitch_range(gender):
+    """Pitch floor and ceiling (Hz) by gender."""
     if gender.lower() == 'male':
-        pitch_floor, pitch_ceiling = 50, 250
-    else:
-        pitch_floor, pitch_ceiling = 100, 400
-
-    pitch_obj = snd.to_pitch(
-        time_step=time_step,
-        pitch_floor=pitch_floor,
-        pitch_ceiling=pitch_ceiling
-    )
-    times = pitch_obj.xs()
-    pitch_values = pitch_obj.selected_array['frequency']
-    return times, pitch_values
-
-def process_trials_with_onset(subj_dir, i, expt_type, gender, f1_data, f0_data, trial_usage):
+        return 50, 250
+    return 100, 400
+
+class TrialAnalysis:
+    """Per-trial analysis context.
+
+    The Sound, intensity contour and one full-resolution (time_step) pitch
+    track are computed once; onset, the usability window and the saved pitch
+    contour are all slices of that track. The arrays can be round-tripped
+    through the TrackCache with to_tracks()/from_tracks(). batch_from_numpy()
+    builds the same context from the vectorized NumPy onset engine instead.
+    n_samples and srate always describe the trial as recorded, even when the
+    tracks were computed from a resampled copy.
+    """
+
+    fields = ('n_samples', 'srate', 'intensity_times', 'intensity_values', 'pitch_times', 'pitch_values')
+
+    def __init__(self, n_samples, srate, intensity_times, intensity_values, pitch_times, pitch_values):
+        self.n_samples = n_samples
+        self.srate = srate
+        self.intensity_times = intensity_times
+        self.intensity_values = intensity_values
+        self.pitch_times = pitch_times
+        self.pitch_values = pitch_values
+
+    @classmethod
+    def from_signal(cls, signal, srate, gender, resample=False):
+        n_samples, original_srate = len(signal), srate
+        if resample:
+            signal, srate = pitch_signal(signal, srate)
+        snd = parselmouth.Sound(signal, srate)
+        with instrument.stage('to_intensity'):
+            intensity_times, intensity_values = intensity_frames(snd.to_intensity())
+
+        pitch_floor, pitch_ceiling = get_pitch_range(gender)
+        with instrument.stage('to_pitch'):
+            pitch_obj = snd.to_pitch(time_step=time_step, pitch_floor=pitch_floor, pitch_ceiling=pitch_ceiling)
+        instrument.count('praat_calls', 2)
+        instrument.count('intensity_frames', len(intensity_times))
+        instrument.count('pitch_frames', pitch_obj.n_frames)
+        return cls(n_samples, original_srate, intensity_times, intensity_values,
+                   pitch_obj.xs(), pitch_obj.selected_array['frequency'])
+
+    @classmethod
+    def batch_from_numpy(cls, signals, srate, gender):
+        """One analysis per signal (all at srate) from fast_onset's intensity and voicing tracks.
+
+        Voicing is only evaluated up to the end of the usability window, so
+        these analyses serve onset_time() and check_trial() but not the saved
+        F0 contour.
+        """
+        pitch_floor, pitch_ceiling = get_pitch_range(gender)
+        with instrument.stage('numpy_onset'):
+            tracks = onset_tracks(signals, srate, pitch_floor, pitch_ceiling, time_step,
+                                  horizon=max_samples * time_step)
+        return [cls(len(signal), srate, **t) for signal, t in zip(signals, tracks)]
+
+    @classmethod
+    def from_tracks(cls, tracks):
+        return cls(int(tracks['n_samples']), tracks['srate'][()],
+                   *(tracks[name] for name in cls.fields[2:]))
+
+    def to_tracks(self):
+        return {name: getattr(self, name) for name in self.fields}
+
+    def onset_time(self):
+        """Detect the onset time based on intensity and pitch."""
+        # Intensity threshold: highest - 10 dB
+        intensity_threshold = np.max(self.intensity_values) - 10
+        intensity_onset_idx = np.argmax(self.intensity_values > intensity_threshold)
+        intensity_onset_time = self.intensity_times[intensity_onset_idx] if intensity_onset_idx < len(self.intensity_times) else np.inf
+
+        # Pitch onset
+        pitch_onset_idx = np.argmax(self.pitch_values > 0)
+        pitch_onset_time = self.pitch_times[pitch_onset_idx] if pitch_onset_idx < len(self.pitch_times) else np.inf
+
+        # Onset is the later of the two
+        return max(intensity_onset_time, pitch_onset_time)
+
+    def pitch_contour(self, start_time, duration=None):
+        """Pitch frames from start_time (for duration seconds), with times relative to start_time."""
+        keep = self.pitch_times >= start_time
+        if duration is not None:
+            keep &= self.pitch_times < start_time + duration
+        return self.pitch_times[keep] - start_time, self.pitch_values[keep]
+
+def extract_formant_tracks(signal, srate, ceiling, engine='praat', prepared=None):
+    """Extract F1-F4 tracks as a (4 x frames) matrix, with Praat or the NumPy Burg engine.
+
+    prepared is the signal's spectrum from the resampling front end; Praat
+    then analyses a Sound cut from it at twice the ceiling.
+    """
+    if engine == 'numpy':
+        with instrument.stage('numpy_burg'):
+            times, values = formant_tracks([prepare_signal(signal, srate) if prepared is None else prepared],
+                                           ceiling, time_step, n_formants=4, window_length=0.025)[0]
+        instrument.count('formant_frames', len(times))
+        return times, values
+
+    snd = parselmouth.Sound(signal, srate) if prepared is None else formant_sound(prepared, ceiling)
+
+    with instrument.stage('to_formant_burg'):
+        formant = snd.to_formant_burg(
+            time_step=time_step,
+            max_number_of_formants=4,
+            window_length=0.025,
+            pre_emphasis_from=50,
+            maximum_formant=ceiling
+        )
+    instrument.count('praat_calls')
+    instrument.count('formant_frames', formant.n_frames)
+
+    return formant_frames(formant, n_formants=4)
+
+class LazyTrial:
+    """A trial file whose signal is only decoded on first use.
+
+    With resample, its analyses go through the resampling front end: pitch
+    and intensity run on a copy decimated to pitch_rate, and the spectrum of
+    the onset-trimmed signal is computed once and shared by every formant
+    ceiling (spectrum()).
+    """
+
+    def __init__(self, trial_file, resample=False):
+        self.trial_file = trial_file
+        self.resample = resample
+        self._signal = None
+        self._spectra = {}
+
+    def load(self):
+        if self._signal is None:
+            signal, srate, _ = load_signal(self.trial_file)
+            self._signal = (signal, srate)
+        return self._signal
+
+    def spectrum(self, start):
+        """Front-end spectrum of the signal from sample start on, computed once per start."""
+        if start not in self._spectra:
+            signal, srate = self.load()
+            self._spectra[start] = formant_spectrum(signal[start:], srate)
+        return self._spectra[start]
+
+def numpy_analyses(trials, gender):
+    """NumPy-engine TrialAnalysis for each LazyTrial, batching the trials that share a sampling rate."""
+    loaded = [trial.load() for trial in trials]
+    analyses = [None] * len(trials)
+    for srate in sorted({srate for _, srate in loaded}):
+        rows = [row for row, (_, sr) in enumerate(loaded) if sr == srate]
+        batch = TrialAnalysis.batch_from_numpy([loaded[row][0] for row in rows], srate, gender)
+        for row, analysis in zip(rows, batch):
+            analyses[row] = analysis
+    return analyses
+
+def praat_analysis(trial, gender, cache=None):
+    """Praat Sound, intensity and one pitch track, shared by onset, usability and F0 extraction."""
+    pitch_floor, pitch_ceiling = get_pitch_range(gender)
+
+    def compute_analysis():
+        signal, srate = trial.load()
+        return TrialAnalysis.from_signal(signal, srate, gender, trial.resample).to_tracks()
+    rate_params = {'pitch_rate': pitch_rate} if trial.resample else {}
+    return TrialAnalysis.from_tracks(cached(cache, trial.trial_file, 'trial_analysis', compute_analysis,
+                                            pitch_floor=pitch_floor, pitch_ceiling=pitch_ceiling,
+                                            time_step=time_step, **rate_params))
+
+def check_trial(trial, gender, cache=None, analysis=None):
+    """Onset detection and usability check.
+
+    Returns (analysis, onset_time, onset_idx, reason); reason is None for a
+    usable trial and otherwise says why it is excluded. A precomputed
+    analysis (e.g. from the NumPy onset engine) replaces the Praat one.
+    """
+    if analysis is None:
+        analysis = praat_analysis(trial, gender, cache)
+
+    # Detect onset
+    onset_time = analysis.onset_time()
+    desired_samples = int(max_samples * analysis.srate * time_step)
+    onset_idx = int(onset_time * analysis.srate)
+    if onset_idx + desired_samples > analysis.n_samples:
+        return analysis, onset_time, onset_idx, "Onset too late."
+
+    # Check for NaNs in the pitch values over the max_samples window
+    _, pitch_values = analysis.pitch_contour(onset_time, max_samples * time_step)
+    zero_count = np.sum(pitch_values == 0)
+    if zero_count > 0:
+        zero_ratio = zero_count / len(pitch_values)
+        return analysis, onset_time, onset_idx, f"Zeros in pitch data ({zero_count}/{len(pitch_values)} = {zero_ratio:.2%})."
+
+    return analysis, onset_time, onset_idx, None
+
+def process_trial(trial_file, label, expt_type, gender, ceiling, cache=None, analysis=None, formant_engine='praat',
+                  resample=False):
+    """Onset detection, usability check and track extraction for a single trial.
+
+    Returns (usable, track, message); track is None for excluded trials and the
+    exclusion message is returned rather than printed so that parallel runs
+    report in trial order. With a TrackCache, each analysis step is looked up
+    first and the trial audio is only decoded on a miss. With an analysis from
+    the NumPy onset engine, onset and usability come from it and the Praat
+    pitch track is only computed for the saved F0 contour. formant_engine
+    selects Praat or the NumPy Burg tracker for F1 trials, and resample routes
+    the trial through the resampling front end (see LazyTrial).
+    """
+    if not trial_exists(trial_file):
+        return False, None, None
+
+    wall, cpu, bytes_read = time.perf_counter(), time.process_time(), instrument.counter('trial_bytes_read')
+    with instrument.stage('trial'):
+        result = _process_existing_trial(trial_file, label, expt_type, gender, ceiling, cache, analysis, formant_engine,
+                                         resample)
+    instrument.record_trial(subject=os.path.basename(os.path.dirname(trial_file)), file=os.path.basename(trial_file),
+                            type=expt_type, ceiling=ceiling, usable=result[0],
+                            wall=time.perf_counter() - wall, cpu=time.process_time() - cpu,
+                            bytes_read=instrument.counter('trial_bytes_read') - bytes_read)
+    return result
+
+def _process_existing_trial(trial_file, label, expt_type, gender, ceiling, cache=None, analysis=None, formant_engine='praat',
+                            resample=False):
+    trial = LazyTrial(trial_file, resample)
+    numpy_engine = analysis is not None
+    analysis, onset_time, onset_idx, reason = check_trial(trial, gender, cache, analysis)
+    if reason is not None:
+        return False, None, f"{label}: Excluded - {reason}"
+
+    # Extract data
+    if expt_type == 'F1':
+        def compute_formants():
+            signal, srate = trial.load()
+            t, values = extract_formant_tracks(signal[onset_idx:], srate, ceiling, formant_engine,
+                                               trial.spectrum(onset_idx) if resample else None)
+            return {'time': t, 'F1': values[0], 'F2': values[1], 'F3': values[2], 'F4': values[3]}
+        engine_params = variant_params(formant_engine, resample)
+        tracks = cached(cache, trial_file, 'extract_formants', compute_formants,
+                        start=onset_idx, ceiling=ceiling, time_step=time_step, window_length=0.025, **engine_params)
+        return True, {'time': tracks['time'], 'F1': tracks['F1'], 'F2': tracks['F2']}, None
+    elif expt_type == 'F0':
+        if numpy_engine:
+            analysis = praat_analysis(trial, gender, cache)
+        t, pitch_vals = analysis.pitch_contour(onset_time)
+        return True, {'time': t, 'pitch': pitch_vals}, None
+    return True, None, None
+
+def _process_trial_args(args):
+    return process_trial(*args)
+
+def _collect_shared_trial_args(args):
+    """process_trial in a worker, writing the track into its row of the block's shared results array.
+
+    Only the track's length travels back; tracks longer than the array's
+    frames are returned whole instead.
+    """
+    *trial_args, results_ref, row = args
+    (usable, track, message), snap = instrument.collect(process_trial, *trial_args)
+    if track is not None and len(track['time']) <= results_ref[2][1]:
+        results = attach(results_ref)
+        for c, column in enumerate(track_columns[trial_args[2]]):
+            results[row, :len(track[column]), c] = track[column]
+        track = len(track['time'])
+    return (usable, track, message), snap
+
+def iter_trial_results(subj_dir, subj_id, i, expt_type, listWords, listConds, gender, ceiling, executor=None, cache=None, skip=(),
+                       onset_engine='praat', formant_engine='praat', resample=False, prefetch_depth=0):
+    """Yield (trial_num, word, cond, usable, track, message) as each trial completes.
+
+    Trials are yielded in trial order; with an executor they are fanned out to
+    worker processes. Trial numbers in skip (already checkpointed) are not run.
+    ceiling is either one ceiling for every trial or a dict of per-(experiment,
+    trial) ceilings from select_adaptive_ceilings. With the 'numpy' onset
+    engine, onsets of the whole block are computed in one batch up front.
+    With prefetch_depth, the trials this process loads are read that many
+    trials ahead in a background thread (signal_store.prefetch). Workers
+    return tracks through a shared results array (shared_buffers) that the
+    yielded tracks are views of.
+    """
+    trials = [(trial_num, word, cond)
+              for trial_num, (word, cond) in enumerate(zip(listWords, listConds), start=1)
+              if trial_num not in skip]
+    tasks = [(os.path.join(subj_dir, f"trial_{i}_{trial_num}.mat"),
+              f"Subject {subj_id}, Experiment {i} {expt_type}, Trial {trial_num}",
+              expt_type, gender,
+              ceiling.get((i, trial_num)) if isinstance(ceiling, dict) else ceiling,
+              cache, None, formant_engine, resample)
+             for trial_num, _, _ in trials]
+    existing = [row for row, task in enumerate(tasks) if trial_exists(task[0])]
+    sequence = [tasks[row][0] for row in existing] if onset_engine == 'numpy' else []
+    if executor is None:
+        sequence += [tasks[row][0] for row in existing]
+
+    with prefetch(sequence, prefetch_depth):
+        if onset_engine == 'numpy':
+            analyses = numpy_analyses([LazyTrial(tasks[row][0]) for row in existing], gender) if existing else []
+            for row, analysis in zip(existing, analyses):
+                tasks[row] = tasks[row][:6] + (analysis,) + tasks[row][7:]
+        if executor is None:
+            for (trial_num, word, cond), (usable, track, message) in zip(trials, map(_process_trial_args, tasks)):
+                yield trial_num, word, cond, usable, track, message
+            return
+
+        # Workers write tracks straight into one shared (trial, frame, column) array of the block
+        results, results_ref = allocate((max(len(tasks), 1), shared_track_frames, 3))
+        results = np.asarray(results)
+        try:
+            shared_tasks = [task + (results_ref, row) for row, task in enumerate(tasks)]
+            outcomes = map(instrument.merged, executor.map(_collect_shared_trial_args, shared_tasks, chunksize=4))
+            for row, ((trial_num, word, cond), (usable, track, message)) in enumerate(zip(trials, outcomes)):
+                if isinstance(track, int):
+                    track = {column: results[row, :track, c] for c, column in enumerate(track_columns[expt_type])}
+                yield trial_num, word, cond, usable, track, message
+        finally:
+            release(results_ref)
+
+def new_tracks():
+    """Empty F1 and F0 TrackSets for one subject."""
+    return TrackSet(track_columns['F1'][1:], time_step), TrackSet(track_columns['F0'][1:], time_step)
+
+def add_track(f1_data, f0_data, expt_type, word, cond, track):
+    (f1_data if expt_type == 'F1' else f0_data).add(word, cond, track)
+
+def process_trials_with_onset(subj_dir, subj_id, i, expt_type, gender, ceiling, f1_data, f0_data, trial_usage, executor=None, cache=None,
+                              onset_engine='praat', formant_engine='praat', resample=False, prefetch_depth=0):
     """Process trials with onset detection and usability check."""
     listWords, listConds = load_experiment_trials(subj_dir, i, expt_type)
     if listWords is None or listConds is None:
@@ -93,217 +374,119 @@ def process_trials_with_onset(subj_dir, i, expt_type, gender, f1_data, f0_data,
 
     trial_usage[expt_type] = []
 
-    for trial_idx, (word, cond) in enumerate(zip(listWords, listConds)):
-        trial_file = os.path.join(subj_dir, f"trial_{i}_{trial_idx+1}.mat")
-        if not os.path.exists(trial_file):
-            trial_usage[expt_type].append(False)
-            continue
+    for _, word, cond, usable, track, message in iter_trial_results(
+            subj_dir, subj_id, i, expt_type, listWords, listConds, gender, ceiling, executor, cache,
+            onset_engine=onset_engine, formant_engine=formant_engine, resample=resample, prefetch_depth=prefetch_depth):
+        if message is not None:
+            print(message)
+        trial_usage[expt_type].append(usable)
+        if usable and track is not None:
+            add_track(f1_data, f0_data, expt_type, word, cond, track)
+
+def stream_trials_to_store(store, subj_dir, subj_id, i, expt_type, gender, ceiling, executor=None, cache=None,
+                          onset_engine='praat', formant_engine='praat', resample=False, prefetch_depth=0):
+    """Checkpoint each trial to the store as it completes, resuming after trials already stored.
+
+    During extraction only one trial's tracks are held in memory at a time
+    (the final save still rebuilds them all; see load_tracks_from_store).
+    Returns the trial usage list for the experiment, or None if its expt
+    file is missing.
+    """
+    listWords, listConds = load_experiment_trials(subj_dir, i, expt_type)
+    if listWords is None or listConds is None:
+        return None
 
-        trial_data = loadmat(trial_file, squeeze_me=True, struct_as_record=False)['data']
-        signal = trial_data.signalIn
-        srate = trial_data.params.sRate
-
-        # Detect onset
-        onset_time = detect_onset(signal, srate, gender)
-        desired_samples = int(max_samples * srate * time_step)
-        onset_idx = int(onset_time * srate)
-        if onset_idx + desired_samples > len(signal):
-            print(f"Subject {subj_id}, Experiment {i} {expt_type}, Trial {trial_idx + 1}: Excluded - Onset too late.")
-            trial_usage[expt_type].append(False)
-            continue
+    done = store.completed(i)
+    if done:
+        print(f"Subject {subj_id}, Experiment {i} {expt_type}: resuming after {len(done)} checkpointed trials.")
 
-        # Check for NaNs in the pitch values
-        end_idx = onset_idx + desired_samples
-        limited_signal = signal[onset_idx:end_idx]
-        _, pitch_values = extract_pitch(limited_signal, srate, gender)
-        zero_count = np.sum(pitch_values == 0)
-        if zero_count > 0:
-            zero_ratio = zero_count / len(pitch_values)
-            print(f"Subject {subj_id}, Experiment {i} {expt_type}, Trial {trial_idx + 1}: Excluded - Zeros in pitch data ({zero_count}/{len(pitch_values)} = {zero_ratio:.2%}).")
-            trial_usage[expt_type].append(False)
-            continue
+    for trial_num, word, cond, usable, track, message in iter_trial_results(
+            subj_dir, subj_id, i, expt_type, listWords, listConds, gender, ceiling, executor, cache, skip=done,
+            onset_engine=onset_engine, formant_engine=formant_engine, resample=resample, prefetch_depth=prefetch_depth):
+        if message is not None:
+            print(message)
+        store.append(i, expt_type, trial_num, word, cond, usable, track, message)
 
-        # Mark trial as usable
-        trial_usage[expt_type].append(True)
-
-        # Extract data
-        signal = signal[onset_idx:]
-        if expt_type == 'F1':
-            t, f1_vals, f2_vals = extract_formants(signal, srate, gender)
-            if word not in f1_data:
-                f1_data[word] = {}
-            if cond not in f1_data[word]:
-                f1_data[word][cond] = []
-            f1_data[word][cond].append({'time': t, 'F1': f1_vals, 'F2': f2_vals})
-        elif expt_type == 'F0':
-            t, pitch_vals = extract_pitch(signal, srate, gender)
-            if word not in f0_data:
-                f0_data[word] = {}
-            if cond not in f0_data[word]:
-                f0_data[word][cond] = []
-            f0_data[word][cond].append({'time': t, 'pitch': pitch_vals})
+    records = sorted((r for r in store.records() if r['expt'] == i), key=lambda r: r['trial'])
+    return [r['usable'] for r in records]
 
+def load_tracks_from_store(store, f1_data, f0_data):
+    """Rebuild f1_data/f0_data from the checkpointed trials, in experiment and trial order.
 
-def load_experiment_data(subj_dir):
-    expt_path = os.path.join(subj_dir, 'expt.mat')
-    expt_data = loadmat(expt_path, squeeze_me=True, struct_as_record=False)['expt']
-    gender = expt_data.gender
-    exptOrder = expt_data.exptOrder
-    return gender, exptOrder
+    This holds every usable track of the subject at once (as compact float32
+    TrackRecords): {subj}_f*_data.mat is written in one savemat call and the
+    stats are the two-pass means of compute_stats, so memory at this step
+    still grows with session length; only the extraction before it is bounded
+    by one trial.
+    """
+    for record in sorted(store.records(), key=lambda r: (r['expt'], r['trial'])):
+        if record['usable'] and record['has_track']:
+            add_track(f1_data, f0_data, record['type'], record['word'], record['cond'], store.load_track(record))
 
-def load_experiment_trials(subj_dir, i, expt_type):
-    expt_file = os.path.join(subj_dir, f"expt_{i}_{expt_type}.mat")
-    if not os.path.exists(expt_file):
-        return None, None
-    curr_expt = loadmat(expt_file, squeeze_me=True, struct_as_record=False)['currExpt']
-    listWords = curr_expt.listWords
-    listConds = curr_expt.listConds
-    if isinstance(listWords, str):
-        listWords = [listWords]
-    if isinstance(listConds, str):
-        listConds = [listConds]
-    return listWords, listConds
-
-def process_trials(subj_dir, i, expt_type, gender, f1_data, f0_data):
-    listWords, listConds = load_experiment_trials(subj_dir, i, expt_type)
-    if listWords is None or listConds is None:
-        return
 
-    for trial_idx, (word, cond) in enumerate(zip(listWords, listConds)):
-        trial_file = os.path.join(subj_dir, f"trial_{i}_{trial_idx+1}.mat")
-        if not os.path.exists(trial_file):
-            continue
-        trial_data = loadmat(trial_file, squeeze_me=True, struct_as_record=False)['data']
-        signal = trial_data.signalIn
-        srate = trial_data.params.sRate
+def load_experiment_data(subj_dir):
+    return experiment_data(subj_dir)
 
-        if expt_type == 'F1':
-            t, f1_vals, f2_vals = extract_formants(signal, srate, gender)
-            if t is None:
-                continue
-            if word not in f1_data:
-                f1_data[word] = {}
-            if cond not in f1_data[word]:
-                f1_data[word][cond] = []
-            f1_data[word][cond].append({
-                'time': t,
-                'F1': f1_vals,
-                'F2': f2_vals
-            })
-
-        elif expt_type == 'F0':
-            t, pitch_vals = extract_pitch(signal, srate, gender)
-            if t is None:
-                continue
-            if word not in f0_data:
-                f0_data[word] = {}
-            if cond not in f0_data[word]:
-                f0_data[word][cond] = []
-            f0_data[word][cond].append({
-                'time': t,
-                'pitch': pitch_vals
-            })
+def load_experiment_trials(subj_dir, i, expt_type):
+    return experiment_trials(subj_dir, i, expt_type)
 
 def compute_stats_f1(f1_data, max_samples):
-    f1_stats = {}
-    for word, cond_dict in f1_data.items():
-        f1_stats[word] = {}
-        for cond, trials in cond_dict.items():
-            F1_list, F2_list = [], []
-            for tr in trials:
-                F1_trial = tr['F1']
-                F2_trial = tr['F2']
-
-                # Pad or truncate F1
-                F1_padded = np.full(max_samples, np.nan)
-                F1_len = min(len(F1_trial), max_samples)
-                F1_padded[:F1_len] = F1_trial[:F1_len]
-
-                # Pad or truncate F2
-                F2_padded = np.full(max_samples, np.nan)
-                F2_len = min(len(F2_trial), max_samples)
-                F2_padded[:F2_len] = F2_trial[:F2_len]
-
-                F1_list.append(F1_padded)
-                F2_list.append(F2_padded)
-
-            if len(F1_list) > 0:
-                F1_array = np.vstack(F1_list)
-                F2_array = np.vstack(F2_list)
-                f1_stats[word][cond] = {
-                    'F1_mean': np.nanmean(F1_array, axis=0),
-                    'F1_std': np.nanstd(F1_array, axis=0),
-                    'F2_mean': np.nanmean(F2_array, axis=0),
-                    'F2_std': np.nanstd(F2_array, axis=0)
-                }
-    return f1_stats
+    return compute_stats(f1_data, ['F1', 'F2'], max_samples)
 
 def compute_stats_f0(f0_data, max_samples):
-    f0_stats = {}
-    for word, cond_dict in f0_data.items():
-        f0_stats[word] = {}
-        for cond, trials in cond_dict.items():
-            pitch_list = []
-            for tr in trials:
-                pitch_trial = tr['pitch']
-
-                # Pad or truncate pitch
-                pitch_padded = np.full(max_samples, np.nan)
-                p_len = min(len(pitch_trial), max_samples)
-                pitch_padded[:p_len] = pitch_trial[:p_len]
-
-                pitch_list.append(pitch_padded)
-
-            if len(pitch_list) > 0:
-                pitch_array = np.vstack(pitch_list)
-                f0_stats[word][cond] = {
-                    'pitch_mean': np.nanmean(pitch_array, axis=0),
-                    'pitch_std': np.nanstd(pitch_array, axis=0)
-                }
-    return f0_stats
+    return compute_stats(f0_data, ['pitch'], max_samples)
 
 def compute_diff_f1(f1_stats):
-    f1_diff = {}
-    for word, cond_dict in f1_stats.items():
-        f1_diff[word] = {}
-        if 'noShift' in cond_dict:
-            noShift_f1_mean = cond_dict['noShift']['F1_mean']
-            noShift_f1_std  = cond_dict['noShift']['F1_std']
-            noShift_f2_mean = cond_dict['noShift']['F2_mean']
-            noShift_f2_std  = cond_dict['noShift']['F2_std']
-
-            for cond in ['shiftUp', 'shiftDown']:
-                if cond in cond_dict:
-                    f1_diff[word][cond] = {
-                        'F1_mean_diff': cond_dict[cond]['F1_mean'] - noShift_f1_mean,
-                        'F1_std_diff': np.sqrt(cond_dict[cond]['F1_std']**2 + noShift_f1_std**2),
-                        'F2_mean_diff': cond_dict[cond]['F2_mean'] - noShift_f2_mean,
-                        'F2_std_diff': np.sqrt(cond_dict[cond]['F2_std']**2 + noShift_f2_std**2)
-                    }
-    return f1_diff
+    return compute_diff(f1_stats, ['F1', 'F2'])
 
 def compute_diff_f0(f0_stats):
-    f0_diff = {}
-    for word, cond_dict in f0_stats.items():
-        f0_diff[word] = {}
-        if 'noShift' in cond_dict:
-            noShift_pitch_mean = cond_dict['noShift']['pitch_mean']
-            noShift_pitch_std  = cond_dict['noShift']['pitch_std']
-
-            for cond in ['shiftUp', 'shiftDown']:
-                if cond in cond_dict:
-                    f0_diff[word][cond] = {
-                        'pitch_mean_diff': cond_dict[cond]['pitch_mean'] - noShift_pitch_mean,
-                        'pitch_std_diff': np.sqrt(cond_dict[cond]['pitch_std']**2 + noShift_pitch_std**2)
-                    }
-    return f0_diff
-
-def save_results(subj_id, f1_data, f0_data, f1_stats, f0_stats, f1_diff, f0_diff):
-    # Save data
-    if len(f1_data) > 0:
-        savemat(os.path.join(base_dir, f"{subj_id}_f1_data.mat"), {'f1_data': f1_data})
-    if len(f0_data) > 0:
-        savemat(os.path.join(base_dir, f"{subj_id}_f0_data.mat"), {'f0_data': f0_data})
+    return compute_diff(f0_stats, ['pitch'])
+
+def save_grand_average(base_dir, subject_ids):
+    """Pool every trial of the subjects' {subj}_tracks stores into grand-average stats and diffs."""
+    for prefix, measures in [('f1', ['F1', 'F2']), ('f0', ['pitch'])]:
+        tables = []
+        for subj_id in subject_ids:
+            tracks_dir = os.path.join(base_dir, f"{subj_id}_tracks")
+            if os.path.isdir(tracks_dir):
+                tables.append(load_tracks(tracks_dir, prefix))
+        stats = stats_from_tables(tables, measures, max_samples)
+        if len(stats) > 0:
+            savemat(os.path.join(base_dir, f"grand_{prefix}_stats.mat"), {f'{prefix}_stats': stats})
+            savemat(os.path.join(base_dir, f"grand_{prefix}_diff.mat"), {f'{prefix}_diff': compute_diff(stats, measures)})
+    print(f"Grand average of {len(subject_ids)} subjects complete!")
+
+def save_results(base_dir, subj_id, f1_data, f0_data, f1_stats, f0_stats, f1_diff, f0_diff, output='both',
+                 data_layout='trials'):
+    with instrument.stage('save_results'):
+        _save_results(base_dir, subj_id, f1_data, f0_data, f1_stats, f0_stats, f1_diff, f0_diff, output, data_layout)
+
+def mat_tracks(name, tracks, data_layout):
+    """savemat variables of a TrackSet in the given layout.
+
+    'trials' is the original struct of per-trial float64 time/measure tracks;
+    'compact' stores each condition as float32 trials x frames matrices with
+    per-trial start times and lengths, plus the shared time_step.
+    """
+    if data_layout == 'compact':
+        return {name: tracks.compact(), 'time_step': tracks.time_step}
+    return {name: tracks.nested()}
+
+def _save_results(base_dir, subj_id, f1_data, f0_data, f1_stats, f0_stats, f1_diff, f0_diff, output, data_layout):
+    # Save data as nested MATLAB structs and/or dense columnar .npy tracks. Raw tracks not written
+    # in a form this run are removed, so a {subj}_tracks store or *_data.mat left by an earlier run
+    # with other options is never read back in place of these results.
+    tracks_dir = os.path.join(base_dir, f"{subj_id}_tracks")
+    for prefix, tracks, measures in [('f1', f1_data, ['F1', 'F2']), ('f0', f0_data, ['pitch'])]:
+        mat_file = os.path.join(base_dir, f"{subj_id}_{prefix}_data.mat")
+        if output in ('mat', 'both') and len(tracks) > 0:
+            savemat(mat_file, mat_tracks(f'{prefix}_data', tracks, data_layout))
+        elif os.path.exists(mat_file):
+            os.remove(mat_file)
+        if output in ('npy', 'both') and len(tracks) > 0:
+            save_tracks(tracks_dir, prefix, pack_tracks(tracks, measures))
+        else:
+            remove_tracks(tracks_dir, prefix)
 
     # Save stats
     if len(f1_stats) > 0:
@@ -317,31 +500,460 @@ def save_results(subj_id, f1_data, f0_data, f1_stats, f0_stats, f1_diff, f0_diff
     if len(f0_diff) > 0:
         savemat(os.path.join(base_dir, f"{subj_id}_f0_diff.mat"), {'f0_diff': f0_diff})
 
-# ---------------- MAIN SCRIPT ----------------
-for subj_id in sorted(subject_ids):
+def variant_params(formant_engine, resample):
+    """Extra cache parameters of formant results computed other than by plain Praat."""
+    params = {'engine': formant_engine} if formant_engine != 'praat' else {}
+    if resample:
+        params['resample'] = True
+    return params
+
+def _score_ceiling(args):
+    signal, srate, ceiling, prepared = args
+    return evaluate_ceiling([trial_state_from_signal(signal, srate, prepared)], ceiling)[:4]
+
+def _score_shared_ceiling(args):
+    """_score_ceiling of a signal (and spectrum) passed as shared_buffers references."""
+    signal_ref, srate, ceiling, prepared = args
+    if prepared is not None:
+        prepared = dict(prepared, spectrum=np.asarray(attach(prepared['spectrum'])))
+    return _score_ceiling((np.asarray(attach(signal_ref)), srate, ceiling, prepared))
+
+def _collect_score_shared_ceiling(args):
+    return instrument.collect(_score_shared_ceiling, args)
+
+def ceiling_deviations(trial, onset_idx, candidates, executor=None, cache=None, formant_engine='praat'):
+    """(candidates x 4) F1-F4 deviations of the onset-trimmed trial, one Burg pass per candidate.
+
+    Candidates are scored concurrently when an executor is given, with the
+    trimmed signal (and spectrum) placed in shared memory once rather than
+    pickled to every task; the matrix is cached per trial so that reruns are
+    free. The NumPy engine scores every
+    candidate in-process from one shared spectrum of the trial; with a
+    resampling LazyTrial, Praat's passes share that spectrum as well.
+    """
+    def compute():
+        signal, srate = trial.load()
+        prepared = trial.spectrum(onset_idx) if trial.resample else None
+        if formant_engine == 'numpy':
+            state = trial_state_from_signal(signal[onset_idx:], srate, prepared)
+            evaluations = evaluate_ceilings([state], candidates, 'numpy')
+            return {'deviations': np.array([evaluations[c][:4] for c in candidates])}
+        if executor is None:
+            scores = map(_score_ceiling, [(signal[onset_idx:], srate, c, prepared) for c in candidates])
+            return {'deviations': np.array(list(scores))}
+        refs = [share(signal[onset_idx:])]
+        if prepared is not None:
+            prepared = dict(prepared, spectrum=share(prepared['spectrum']))
+            refs.append(prepared['spectrum'])
+        try:
+            tasks = [(refs[0], srate, c, prepared) for c in candidates]
+            scores = list(map(instrument.merged, executor.map(_collect_score_shared_ceiling, tasks)))
+        finally:
+            for ref in refs:
+                release(ref)
+        return {'deviations': np.array(scores)}
+    engine_params = variant_params(formant_engine, trial.resample)
+    return cached(cache, trial.trial_file, 'ceiling_deviations', compute,
+                  start=onset_idx, candidates=list(candidates), **engine_params)['deviations']
+
+def best_ceiling(deviations, candidates):
+    """Ceiling minimizing the summed per-formant mean deviation over (trials x candidates x 4) deviations."""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        mean_devs = np.nanmean(deviations, axis=0)
+    sums = np.nansum(mean_devs, axis=1)
+    sums[np.all(np.isnan(mean_devs), axis=1)] = np.inf
+    if np.all(np.isinf(sums)):
+        return None
+    return candidates[int(np.argmin(sums))]
+
+def select_adaptive_ceilings(subj_dir, exptOrder, gender, mode, candidates, default_ceiling, executor=None, cache=None,
+                             onset_engine='praat', formant_engine='praat', resample=False):
+    """Pick a formant ceiling per usable F1 trial ('trial') or per word ('word').
+
+    Returns {(experiment, trial): ceiling} and the rows of the winners table.
+    Trials without any valid candidate fall back to default_ceiling.
+    """
+    trial_devs = {}
+    for i, expt_type in enumerate(exptOrder, start=1):
+        if expt_type != 'F1':
+            continue
+        listWords, listConds = load_experiment_trials(subj_dir, i, expt_type)
+        if listWords is None:
+            continue
+        block = [(trial_num, word, LazyTrial(os.path.join(subj_dir, f"trial_{i}_{trial_num}.mat"), resample))
+                 for trial_num, word in enumerate(listWords, start=1)
+                 if trial_exists(os.path.join(subj_dir, f"trial_{i}_{trial_num}.mat"))]
+        if onset_engine == 'numpy' and block:
+            analyses = numpy_analyses([trial for _, _, trial in block], gender)
+        else:
+            analyses = [None] * len(block)
+        for (trial_num, word, trial), analysis in zip(block, analyses):
+            _, _, onset_idx, reason = check_trial(trial, gender, cache, analysis)
+            if reason is None:
+                trial_devs[(i, trial_num)] = (word, ceiling_deviations(trial, onset_idx, candidates, executor, cache,
+                                                                              formant_engine))
+
+    if mode == 'word':
+        word_ceilings = {}
+        for word in {word for word, _ in trial_devs.values()}:
+            devs = np.stack([d for w, d in trial_devs.values() if w == word])
+            word_ceilings[word] = best_ceiling(devs, candidates)
+        chosen = {key: word_ceilings[word] for key, (word, _) in trial_devs.items()}
+    else:
+        chosen = {key: best_ceiling(devs[None], candidates) for key, (_, devs) in trial_devs.items()}
+
+    ceilings = {key: default_ceiling if c is None else c for key, c in chosen.items()}
+    rows = [{"Experiment": i, "Trial": trial_num, "Word": trial_devs[(i, trial_num)][0], "Ceiling": c}
+            for (i, trial_num), c in sorted(ceilings.items())]
+    return ceilings, rows
+
+def process_subject(subj_id, base_dir, optimal_ceiling, executor=None, cache=None, resume=False, output='both',
+                    ceiling_mode='subject', ceiling_candidates=None, onset_engine='praat', formant_engine='praat',
+                    resample=False, prefetch_depth=0, data_layout='trials'):
+    """Extract, summarize and save one subject.
+
+    With resume, every trial is checkpointed under <base_dir>/.progress/<subj_id>
+    as it completes and a rerun continues from the last completed trial; the
+    tracks are read back from there for the final save (load_tracks_from_store).
+    With ceiling_mode 'word' or 'trial', F1 formants use adaptively selected
+    ceilings (saved to {subj}_adaptive_ceilings.csv) instead of the subject's
+    optimal ceiling. onset_engine 'numpy' detects onsets and screens trials
+    with the vectorized fast_onset engine instead of Praat; formant_engine
+    'numpy' tracks formants with the batched fast_formants Burg engine. With
+    resample, trials go through the resampling front end (see LazyTrial).
+    prefetch_depth reads trials ahead of their analysis (see iter_trial_results).
+    data_layout selects the layout of {subj}_f*_data.mat (see mat_tracks).
+    """
     subj_dir = os.path.join(base_dir, subj_id)
     gender, exptOrder = load_experiment_data(subj_dir)
+    ceiling = get_ceiling(optimal_ceiling, subj_id, gender)
+    ceiling_key = ceiling
 
-    f1_data = {}
-    f0_data = {}
+    if ceiling_mode != 'subject':
+        candidates = list(ceiling_candidates or ceilings)
+        ceiling, rows = select_adaptive_ceilings(subj_dir, exptOrder, gender, ceiling_mode, candidates,
+                                                 ceiling, executor, cache, onset_engine, formant_engine, resample)
+        pd.DataFrame(rows).to_csv(os.path.join(base_dir, f"{subj_id}_adaptive_ceilings.csv"), index=False)
+        ceiling_key = f"{ceiling_mode}:{candidates}"
+
+    f1_data, f0_data = new_tracks()
     trial_usage = {}
 
+    store = None
+    if resume:
+        params = {'gender': gender, 'ceiling': ceiling_key, 'time_step': time_step, 'max_samples': max_samples}
+        if onset_engine != 'praat':
+            params['onset_engine'] = onset_engine
+        if formant_engine != 'praat':
+            params['formant_engine'] = formant_engine
+        if resample:
+            params['resample'] = True
+        store = TrialStore(os.path.join(base_dir, '.progress', subj_id), params)
+
     # Process each experiment in exptOrder
     for i, expt_type in enumerate(exptOrder, start=1):
-        process_trials_with_onset(subj_dir, i, expt_type, gender, f1_data, f0_data, trial_usage)
+        if store is None:
+            process_trials_with_onset(subj_dir, subj_id, i, expt_type, gender, ceiling, f1_data, f0_data, trial_usage, executor, cache,
+                                      onset_engine, formant_engine, resample, prefetch_depth)
+        else:
+            usage = stream_trials_to_store(store, subj_dir, subj_id, i, expt_type, gender, ceiling, executor, cache,
+                                           onset_engine, formant_engine, resample, prefetch_depth)
+            if usage is not None:
+                trial_usage[expt_type] = usage
 
         # Save trial usage information
-        usage_file = os.path.join(subj_dir, f"expt_{i}_{expt_type}_data.mat")
-        savemat(usage_file, {'trial_usage': trial_usage[expt_type]})
+        if expt_type in trial_usage:
+            usage_file = os.path.join(subj_dir, f"expt_{i}_{expt_type}_data.mat")
+            savemat(usage_file, {'trial_usage': trial_usage[expt_type]})
 
-    # Compute stats
-    f1_stats = compute_stats_f1(f1_data, max_samples)
-    f0_stats = compute_stats_f0(f0_data, max_samples)
+    if store is not None:
+        load_tracks_from_store(store, f1_data, f0_data)
 
-    # Compute differences
-    f1_diff = compute_diff_f1(f1_stats)
-    f0_diff = compute_diff_f0(f0_stats)
+    with instrument.stage('stats'):
+        # Compute stats
+        f1_stats = compute_stats_f1(f1_data, max_samples)
+        f0_stats = compute_stats_f0(f0_data, max_samples)
+
+        # Compute differences
+        f1_diff = compute_diff_f1(f1_stats)
+        f0_diff = compute_diff_f0(f0_stats)
 
     # Save all results
-    save_results(subj_id, f1_data, f0_data, f1_stats, f0_stats, f1_diff, f0_diff)
+    save_results(base_dir, subj_id, f1_data, f0_data, f1_stats, f0_stats, f1_diff, f0_diff, output, data_layout)
     print(f"Subject {subj_id} complete!")
+    return subj_id
+
+def validate_onsets(base_dir, subject_ids, cache=None):
+    """Run both onset engines on every trial and save their disagreement to onset_validation.csv."""
+    rows = []
+    for subj_id in subject_ids:
+        subj_dir = os.path.join(base_dir, subj_id)
+        gender, exptOrder = load_experiment_data(subj_dir)
+        for i, expt_type in enumerate(exptOrder, start=1):
+            listWords, _ = load_experiment_trials(subj_dir, i, expt_type)
+            if listWords is None:
+                continue
+            block = [(trial_num, LazyTrial(os.path.join(subj_dir, f"trial_{i}_{trial_num}.mat")))
+                     for trial_num in range(1, len(listWords) + 1)
+                     if trial_exists(os.path.join(subj_dir, f"trial_{i}_{trial_num}.mat"))]
+            if not block:
+                continue
+            with instrument.stage('onset_numpy'):
+                analyses = numpy_analyses([trial for _, trial in block], gender)
+            for (trial_num, trial), analysis in zip(block, analyses):
+                with instrument.stage('onset_praat'):
+                    _, praat_onset, _, praat_reason = check_trial(trial, gender, cache)
+                _, numpy_onset, _, numpy_reason = check_trial(trial, gender, analysis=analysis)
+                rows.append({"Subject ID": subj_id, "Experiment": i, "Type": expt_type, "Trial": trial_num,
+                             "Praat onset": praat_onset, "NumPy onset": numpy_onset,
+                             "Difference (ms)": 1000 * (numpy_onset - praat_onset),
+                             "Praat usable": praat_reason is None, "NumPy usable": numpy_reason is None})
+
+    df = pd.DataFrame(rows)
+    out_file = os.path.join(base_dir, 'onset_validation.csv')
+    df.to_csv(out_file, index=False)
+    if len(df) > 0:
+        diff = df['Difference (ms)'].abs()
+        print(f"Onset validation over {len(df)} trials: median |difference| {diff.median():.1f} ms, "
+              f"95th percentile {diff.quantile(0.95):.1f} ms, {(diff <= 10).mean():.1%} within 10 ms, "
+              f"usability agreement {(df['Praat usable'] == df['NumPy usable']).mean():.1%}")
+    print(f"Saving onset validation to {out_file}")
+    return df
+
+def live_summary(running, word, cond, measure):
+    """Trial count, frame-averaged running mean and shift - noShift difference of one word/condition."""
+    m = running.measures.index(measure)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        mean = np.nanmean(running.mean(word, cond)[:, m])
+        text = f"{word}/{cond} n={running.n_trials(word, cond)}, mean {measure} {mean:.1f} Hz"
+        if cond != 'noShift' and running.n_trials(word, 'noShift') > 0:
+            diff = np.nanmean(running.mean(word, cond)[:, m] - running.mean(word, 'noShift')[:, m])
+            text += f", {cond} - noShift {diff:+.1f} Hz"
+    return text
+
+def watch_subject(subj_id, base_dir, optimal_ceiling, cache=None, poll_interval=1.0, output='both',
+                  onset_engine='praat', formant_engine='praat', resample=False, data_layout='trials', idle_timeout=None):
+    """Analyze a subject's trials while the experiment is still writing them.
+
+    The subject directory is polled every poll_interval seconds; a new
+    trial_{i}_{n}.mat is processed once its size and mtime are unchanged
+    between two polls, so it is picked up within about two intervals of being
+    written. Each trial updates that experiment's trial_usage file and the
+    running per-condition means (RunningStats, O(frames) per trial), whose
+    stats and diffs are saved after every usable trial. Stops when every
+    trial of every experiment in exptOrder is processed, on Ctrl-C, or once
+    no trial file has appeared or changed for idle_timeout seconds (an
+    aborted session), and then saves the full results of the trials
+    received as process_subject does.
+    """
+    subj_dir = os.path.join(base_dir, subj_id)
+    print(f"Watching {subj_dir} (Ctrl-C to stop)...")
+    last_activity = time.monotonic()
+    while not os.path.exists(os.path.join(subj_dir, 'expt.mat')):
+        if idle_timeout is not None and time.monotonic() - last_activity > idle_timeout:
+            print(f"No expt.mat after {idle_timeout:g} s; stopped watching.")
+            return None
+        time.sleep(poll_interval)
+    gender, exptOrder = read_experiment_data(subj_dir)
+    ceiling = get_ceiling(optimal_ceiling, subj_id, gender)
+
+    f1_data, f0_data = new_tracks()
+    running = {'F1': RunningStats(['F1', 'F2'], max_samples), 'F0': RunningStats(['pitch'], max_samples)}
+    trial_lists = {}
+    usage = {i: {} for i in range(1, len(exptOrder) + 1)}
+    seen, failed = {}, {}
+    try:
+        while True:
+            for i, expt_type in enumerate(exptOrder, start=1):
+                if i not in trial_lists:
+                    listWords, listConds = read_experiment_trials(subj_dir, i, expt_type)
+                    if listWords is not None and listConds is not None:
+                        trial_lists[i] = list(zip(listWords, listConds))
+            if trial_lists and all(len(usage[i]) == len(trials) for i, trials in trial_lists.items()) \
+                    and len(trial_lists) == len(exptOrder):
+                break
+
+            ready = []
+            for entry in os.scandir(subj_dir):
+                match = trial_pattern.fullmatch(entry.name)
+                if match is None:
+                    continue
+                i, trial_num = map(int, match.groups())
+                if i not in trial_lists or trial_num > len(trial_lists[i]) or trial_num in usage[i]:
+                    continue
+                stat = entry.stat()
+                key = (stat.st_size, stat.st_mtime_ns)
+                if seen.get(entry.name) == key and failed.get(entry.name) != key:
+                    ready.append((i, trial_num, entry.path))
+                if seen.get(entry.name) != key:
+                    last_activity = time.monotonic()
+                seen[entry.name] = key
+            if not ready and idle_timeout is not None and time.monotonic() - last_activity > idle_timeout:
+                print(f"No new trial for {idle_timeout:g} s; stopped watching.")
+                break
+
+            for i, trial_num, trial_file in sorted(ready):
+                expt_type = exptOrder[i - 1]
+                word, cond = trial_lists[i][trial_num - 1]
+                label = f"Subject {subj_id}, Experiment {i} {expt_type}, Trial {trial_num}"
+                try:
+                    analysis = numpy_analyses([LazyTrial(trial_file)], gender)[0] if onset_engine == 'numpy' else None
+                    usable, track, message = process_trial(trial_file, label, expt_type, gender, ceiling, cache, analysis,
+                                                           formant_engine, resample)
+                except Exception as e:
+                    failed[os.path.basename(trial_file)] = seen[os.path.basename(trial_file)]
+                    print(f"{label}: could not be read yet ({e}); retrying when the file changes.")
+                    continue
+
+                usage[i][trial_num] = usable
+                savemat(os.path.join(subj_dir, f"expt_{i}_{expt_type}_data.mat"),
+                        {'trial_usage': [usage[i].get(n, False) for n in range(1, max(usage[i]) + 1)]})
+                if not usable or track is None:
+                    print(message if message is not None else f"{label}: no track.")
+                    continue
+                add_track(f1_data, f0_data, expt_type, word, cond, track)
+                stats = running[expt_type]
+                stats.add(word, cond, track)
+                prefix = expt_type.lower()
+                f_stats = stats.stats()
+                savemat(os.path.join(base_dir, f"{subj_id}_{prefix}_stats.mat"), {f'{prefix}_stats': f_stats})
+                savemat(os.path.join(base_dir, f"{subj_id}_{prefix}_diff.mat"),
+                        {f'{prefix}_diff': compute_diff(f_stats, stats.measures)})
+                print(f"{label}: {live_summary(stats, word, cond, stats.measures[0])}")
+            if ready:
+                last_activity = time.monotonic()
+            time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        print("Stopped watching.")
+
+    f1_stats = compute_stats_f1(f1_data, max_samples)
+    f0_stats = compute_stats_f0(f0_data, max_samples)
+    save_results(base_dir, subj_id, f1_data, f0_data, f1_stats, f0_stats,
+                 compute_diff_f1(f1_stats), compute_diff_f0(f0_stats), output, data_layout)
+    n_trials = sum(len(trials) for trials in usage.values())
+    n_usable = sum(sum(trials.values()) for trials in usage.values())
+    print(f"Subject {subj_id}: {n_usable}/{n_trials} trials usable. Subject {subj_id} complete!")
+    return subj_id
+
+def _process_subject_args(args):
+    return instrument.collect(process_subject, *args)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Extract F0/F1 tracks for F0vsF1 subjects.")
+    parser.add_argument('--base-dir', default=base_dir)
+    parser.add_argument('--subjects', nargs='+', default=subject_ids,
+                        help="Subject IDs to process, or 'all' for every subject directory.")
+    parser.add_argument('--jobs', type=int, default=1,
+                        help="Number of worker processes (1 runs serially).")
+    parser.add_argument('--granularity', choices=['trial', 'subject'], default='trial',
+                        help="Fan out individual trials or whole subjects to the workers.")
+    parser.add_argument('--cache', action='store_true',
+                        help="Reuse onset, pitch and formant tracks from the on-disk track cache.")
+    parser.add_argument('--cache-dir', default=None,
+                        help="Track cache location (default: <base-dir>/.track_cache).")
+    parser.add_argument('--cache-max-mb', type=float, default=2048,
+                        help="Evict least recently used cache entries beyond this size.")
+    parser.add_argument('--resume', action='store_true',
+                        help="Checkpoint each trial under <base-dir>/.progress and resume from there on rerun.")
+    parser.add_argument('--restart', action='store_true',
+                        help="Discard existing checkpoints before a --resume run.")
+    parser.add_argument('--output', choices=['mat', 'npy', 'both'], default='both',
+                        help="Write raw tracks as nested {subj}_f*_data.mat, dense {subj}_tracks/*.npy, or both.")
+    parser.add_argument('--data-layout', choices=['trials', 'compact'], default='trials',
+                        help="Layout of {subj}_f*_data.mat: a struct of per-trial float64 tracks, or per-condition float32 matrices with one time step.")
+    parser.add_argument('--ceiling-mode', choices=['subject', 'word', 'trial'], default='subject',
+                        help="Use the subject's optimal ceiling, or select one per word or per trial.")
+    parser.add_argument('--ceiling-candidates', type=int, nargs='+', default=ceilings,
+                        help="Candidate ceilings (Hz) for --ceiling-mode word/trial.")
+    parser.add_argument('--grand-average', action='store_true',
+                        help="Also save grand_f*_{stats,diff}.mat pooling all trials of the processed subjects (needs npy output).")
+    parser.add_argument('--onset-engine', choices=['praat', 'numpy'], default='praat',
+                        help="Detect onsets and screen trials with Praat, or with the vectorized NumPy engine (fast_onset).")
+    parser.add_argument('--formant-engine', choices=['praat', 'numpy'], default='praat',
+                        help="Track F1 formants with Praat, or with the batched NumPy Burg engine (fast_formants).")
+    parser.add_argument('--resample', action='store_true',
+                        help="Run pitch at no more than 16 kHz and cut every formant ceiling's input from one spectrum per trial.")
+    parser.add_argument('--prefetch', type=int, default=0, metavar='K',
+                        help="Read the next K trial files in a background thread while the current trial is analyzed (0: off).")
+    parser.add_argument('--manifest', action='store_true',
+                        help="Look up subjects, experiment lists and trial files in <base-dir>/manifest.sqlite (built on first use; rescan with manifest.py).")
+    parser.add_argument('--validate-onsets', action='store_true',
+                        help="Only run both onset engines on every trial and save their disagreement to <base-dir>/onset_validation.csv.")
+    parser.add_argument('--watch', action='store_true',
+                        help="Analyze one subject live: process each trial file as the experiment writes it and keep running per-condition means (not with --manifest).")
+    parser.add_argument('--poll-interval', type=float, default=1.0,
+                        help="Seconds between directory polls in --watch mode.")
+    parser.add_argument('--watch-timeout', type=float, default=None,
+                        help="In --watch mode, stop and save the trials received once no trial file has appeared or changed for this many seconds (default: wait until every trial is in).")
+    parser.add_argument('--report', action='store_true',
+                        help="Write per-stage timings, counters and per-trial timings to <base-dir>/prelim_get_fdata_profile_*.json/_trials_*.csv.")
+    parser.add_argument('--profile', choices=['cprofile', 'pyinstrument'], default=None,
+                        help="Also run under a profiler and save its output to <base-dir>.")
+    return parser.parse_args()
+
+def run(args):
+    """Run the extraction for the parsed command-line arguments."""
+    # A watch reads trial and expt files as they are written, which a manifest indexed at startup never lists
+    if args.watch and args.manifest:
+        raise SystemExit("--watch reads the subject directory directly and cannot be used with --manifest.")
+    if args.manifest:
+        activate(args.base_dir)
+    if args.subjects == ['all']:
+        args.subjects = list_subjects(args.base_dir)
+
+    cache = None
+    if args.cache or args.cache_dir:
+        cache_dir = args.cache_dir or os.path.join(args.base_dir, '.track_cache')
+        cache = TrackCache(cache_dir, max_bytes=int(args.cache_max_mb * 1024**2))
+
+    if args.validate_onsets:
+        validate_onsets(args.base_dir, sorted(args.subjects), cache)
+        return
+    optimal_ceiling = load_optimal_ceilings(args.base_dir)
+
+    if args.watch:
+        if len(args.subjects) != 1 or args.ceiling_mode != 'subject' or args.resume:
+            raise SystemExit("--watch takes a single subject and the subject ceiling mode, without --resume.")
+        watch_subject(args.subjects[0], args.base_dir, optimal_ceiling, cache, args.poll_interval, args.output,
+                      args.onset_engine, args.formant_engine, args.resample, args.data_layout, args.watch_timeout)
+        return
+
+    if args.restart:
+        for subj_id in args.subjects:
+            shutil.rmtree(os.path.join(args.base_dir, '.progress', subj_id), ignore_errors=True)
+
+    if args.jobs <= 1:
+        for subj_id in sorted(args.subjects):
+            process_subject(subj_id, args.base_dir, optimal_ceiling, cache=cache, resume=args.resume, output=args.output,
+                            ceiling_mode=args.ceiling_mode, ceiling_candidates=args.ceiling_candidates,
+                            onset_engine=args.onset_engine, formant_engine=args.formant_engine, resample=args.resample,
+                            prefetch_depth=args.prefetch, data_layout=args.data_layout)
+    elif args.granularity == 'subject':
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            tasks = [(subj_id, args.base_dir, optimal_ceiling, None, cache, args.resume, args.output,
+                      args.ceiling_mode, args.ceiling_candidates, args.onset_engine, args.formant_engine,
+                      args.resample, args.prefetch, args.data_layout) for subj_id in sorted(args.subjects)]
+            list(map(instrument.merged, executor.map(_process_subject_args, tasks)))
+    else:
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            for subj_id in sorted(args.subjects):
+                process_subject(subj_id, args.base_dir, optimal_ceiling, executor, cache, args.resume, args.output,
+                                args.ceiling_mode, args.ceiling_candidates, args.onset_engine, args.formant_engine,
+                                args.resample, args.prefetch, args.data_layout)
+
+    if args.grand_average:
+        save_grand_average(args.base_dir, sorted(args.subjects))
+
+    if cache is not None:
+        cache.evict()
+
+# ---------------- MAIN SCRIPT ----------------
+if __name__ == '__main__':
+    args = parse_args()
+    with instrument.profiling(args.profile, args.base_dir, 'prelim_get_fdata'):
+        with instrument.stage('total'):
+            run(args)
+    if args.report:
+        instrument.write_report(args.base_dir, 'prelim_get_fdata', {'args': vars(args)})
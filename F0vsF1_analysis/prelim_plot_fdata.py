@@ -1,31 +1,15 @@
 import os
+import argparse
 import numpy as np
-import scipy.io as sio
+import matplotlib
 import matplotlib.pyplot as plt
-from scipy.io.matlab import mat_struct
-
-
-def mat_struct_to_dict(mat_obj):
-    if isinstance(mat_obj, mat_struct):
-        d = {}
-        for f in mat_obj._fieldnames:
-            d[f] = mat_struct_to_dict(mat_obj.__dict__[f])
-        return d
-    elif isinstance(mat_obj, np.ndarray):
-        if mat_obj.dtype.names is not None:
-            # It's a structured array
-            d = {}
-            for n in mat_obj.dtype.names:
-                d[n] = mat_struct_to_dict(mat_obj[n])
-            return d
-        else:
-            # It's a normal numpy array.
-            if mat_obj.size == 1:
-                return mat_struct_to_dict(mat_obj[0])
-            else:
-                return [mat_struct_to_dict(elem) for elem in mat_obj]
-    else:
-        return mat_obj
+from matplotlib.figure import Figure
+from matplotlib.collections import LineCollection
+from concurrent.futures import ProcessPoolExecutor
+from subject_results import SubjectResults
+import instrument
+from manifest import list_subjects
+
 
 def plot_mean_data(ax, time, stats_dict, word, measure_key, title, xlim, ylim, color_map, x_label="Time (s)", y_label="Frequency (Hz)"):
     """Plot mean data (F1, F2, or Pitch) for a given word with different conditions."""
@@ -44,7 +28,8 @@ def plot_mean_data(ax, time, stats_dict, word, measure_key, title, xlim, ylim, c
     ax.set_ylabel(y_label)
     ax.legend()
 
-def plot_all_trials(ax, time, data_dict, stats_dict, word, measure_key, title, xlim, ylim, color_map, max_samples, x_label="Time (s)", y_label="Frequency (Hz)"):
+def plot_all_trials(ax, time, data_dict, stats_dict, word, measure_key, title, xlim, ylim, color_map, max_samples, x_label="Time (s)", y_label="Frequency (Hz)", bundle=False):
+    # With bundle, each condition's trials are drawn as one LineCollection instead of one line per trial
     # Map raw data measure keys to stats measure keys
     stats_key_map = {
         'F1': 'F1_mean',
@@ -55,6 +40,11 @@ def plot_all_trials(ax, time, data_dict, stats_dict, word, measure_key, title, x
     if word in data_dict:
         for cond, trial_list in data_dict[word].items():
             c = color_map.get(cond, 'gray')
+            if bundle:
+                segments = [np.column_stack((time, tr[measure_key][:max_samples]))
+                            for tr in trial_list if len(tr[measure_key]) >= max_samples]
+                ax.add_collection(LineCollection(segments, colors=c, linewidths=0.5, alpha=0.3), autolim=False)
+                continue
             for tr in trial_list:
                 if len(tr[measure_key]) >= max_samples:
                     ax.plot(time, tr[measure_key][:max_samples], color=c, linewidth=0.5, alpha=0.3)
@@ -107,7 +97,6 @@ def plot_diff_data(ax, time, diff_dict, word, measure_key, title, xlim, ylim, co
 
 
 base_dir = "/Users/minkyu/experiments/F0vsF1"
-subject_ids = [d for d in os.listdir(base_dir) if os.path.isdir(os.path.join(base_dir, d))]
 subject_ids = ["101", "103", "104", "105", "108", "109", "111", "112", "117", "118", "122", "123"]
 subject_ids = ["110"]
 time_step = 0.002
@@ -133,45 +122,36 @@ pitch_condition_colors = {
     'shiftDown': '#0072BD'
 }
 
-for subject_id in sorted(subject_ids):
-    f1_data_path = os.path.join(base_dir, f"{subject_id}_f1_data.mat")
-    f0_data_path = os.path.join(base_dir, f"{subject_id}_f0_data.mat")
-    f1_stats_path = os.path.join(base_dir, f"{subject_id}_f1_stats.mat")
-    f0_stats_path = os.path.join(base_dir, f"{subject_id}_f0_stats.mat")
-    f1_diff_path = os.path.join(base_dir, f"{subject_id}_f1_diff.mat")
-    f0_diff_path = os.path.join(base_dir, f"{subject_id}_f0_diff.mat")
-
-    f1_data = {}
-    f0_data = {}
-    f1_stats = {}
-    f0_stats = {}
-    f1_diff = {}
-    f0_diff = {}
-
-    if os.path.exists(f1_data_path):
-        f1_data_raw = sio.loadmat(f1_data_path, squeeze_me=True, struct_as_record=False)['f1_data']
-        f1_data = mat_struct_to_dict(f1_data_raw)
-
-    if os.path.exists(f0_data_path):
-        f0_data_raw = sio.loadmat(f0_data_path, squeeze_me=True, struct_as_record=False)['f0_data']
-        f0_data = mat_struct_to_dict(f0_data_raw)
-        
-    if os.path.exists(f1_stats_path):
-        f1_stats_raw = sio.loadmat(f1_stats_path, squeeze_me=True, struct_as_record=False)['f1_stats']
-        f1_stats = mat_struct_to_dict(f1_stats_raw)
-
-    if os.path.exists(f0_stats_path):
-        f0_stats_raw = sio.loadmat(f0_stats_path, squeeze_me=True, struct_as_record=False)['f0_stats']
-        f0_stats = mat_struct_to_dict(f0_stats_raw)
-
-    if os.path.exists(f1_diff_path):
-        f1_diff_raw = sio.loadmat(f1_diff_path, squeeze_me=True, struct_as_record=False)['f1_diff']
-        f1_diff = mat_struct_to_dict(f1_diff_raw)
-
-    if os.path.exists(f0_diff_path):
-        f0_diff_raw = sio.loadmat(f0_diff_path, squeeze_me=True, struct_as_record=False)['f0_diff']
-        f0_diff = mat_struct_to_dict(f0_diff_raw)
+# Figures of the fast renderer by (kind, number of words), reused across the subjects a process plots
+_templates = {}
+
+def plot_subject(subject_id, base_dir, render='standard'):
+    """Load one subject's results and save its avg, diff and all-trials figures."""
+    with instrument.stage('load_results'):
+        results = load_results(subject_id, base_dir)
+    with instrument.stage('plot'):
+        if render == 'fast':
+            render_subject_fast(subject_id, base_dir, *results)
+        else:
+            render_subject(subject_id, base_dir, *results)
+    print(f"Plot: Subject {subject_id} complete!")
+
+def use_agg():
+    """Worker initializer: figures are only saved to PNG, so render with Agg whatever backend the environment picks."""
+    matplotlib.use('Agg')
 
+def _plot_subject_args(args):
+    return instrument.collect(plot_subject, *args)
+
+def load_results(subject_id, base_dir):
+    """Raw tracks, stats and diffs of one subject as lazy {word: {cond: ...}} views (see subject_results).
+
+    Files are opened when a figure first reads them, so the avg and diff
+    figures never decode the raw *_data.mat tracks.
+    """
+    return SubjectResults(subject_id, base_dir).as_tuple()
+
+def render_subject(subject_id, base_dir, f1_data, f0_data, f1_stats, f0_stats, f1_diff, f0_diff):
     all_words_f1 = sorted(f1_stats.keys()) if f1_stats else []
     all_words_f0 = sorted(f0_stats.keys()) if f0_stats else []
     all_words = sorted(set(all_words_f1).union(all_words_f0))
@@ -190,7 +170,8 @@ for subject_id in sorted(subject_ids):
         plot_mean_data(axs[row, 2], time, f0_stats, word, 'pitch_mean', f"{word} - Pitch", t_xlim, pitch_ylim, pitch_condition_colors)
 
     plt.tight_layout()
-    plt.savefig(os.path.join(base_dir, f"plot_avg_{subject_id}.png"))
+    with instrument.stage('savefig'):
+        plt.savefig(os.path.join(base_dir, f"plot_avg_{subject_id}.png"))
     plt.close(fig)
 
 
@@ -208,7 +189,8 @@ for subject_id in sorted(subject_ids):
         plot_diff_data(axs_diff[row, 2], time, f0_diff, word, 'pitch_mean_diff', f"{word} - Pitch diff", t_xlim, (-50, 50), pitch_condition_colors)
 
     plt.tight_layout()
-    plt.savefig(os.path.join(base_dir, f"plot_diff_{subject_id}.png"))
+    with instrument.stage('savefig'):
+        plt.savefig(os.path.join(base_dir, f"plot_diff_{subject_id}.png"))
     plt.close(fig_diff)
 
 
@@ -226,7 +208,94 @@ for subject_id in sorted(subject_ids):
         plot_all_trials(axs_all[row, 2], time, f0_data, f0_stats, word, 'pitch', f"{word} - Pitch All Trials", t_xlim, pitch_ylim, pitch_condition_colors, max_samples)
 
     plt.tight_layout()
-    plt.savefig(os.path.join(base_dir, f"plot_all_{subject_id}.png"))
+    with instrument.stage('savefig'):
+        plt.savefig(os.path.join(base_dir, f"plot_all_{subject_id}.png"))
     plt.close(fig_all)
-    
-    print(f"Plot: Subject {subject_id} complete!")
\ No newline at end of file
+
+def figure_template(kind, n_words):
+    """An Agg figure with an n_words x 3 grid of axes, laid out once and emptied for every reuse.
+
+    The first use runs tight_layout; later subjects keep its subplot
+    parameters, so only the data artists are redrawn.
+    """
+    key = (kind, n_words)
+    if key not in _templates:
+        fig = Figure(figsize=(15, 5*n_words))
+        _templates[key] = [fig, fig.subplots(n_words, 3, squeeze=False), False]
+    fig, axs, laid_out = _templates[key]
+    for ax in axs.flat:
+        for artist in ax.lines[:] + ax.collections[:]:
+            artist.remove()
+    return fig, axs, laid_out
+
+def save_template(kind, n_words, path):
+    fig, _, laid_out = _templates[(kind, n_words)]
+    if not laid_out:
+        fig.tight_layout()
+        _templates[(kind, n_words)][2] = True
+    with instrument.stage('savefig'):
+        fig.savefig(path)
+
+def render_subject_fast(subject_id, base_dir, f1_data, f0_data, f1_stats, f0_stats, f1_diff, f0_diff):
+    """Same figures as render_subject, drawn on reused Agg templates with trial bundles as LineCollections."""
+    all_words_f1 = sorted(f1_stats.keys()) if f1_stats else []
+    all_words_f0 = sorted(f0_stats.keys()) if f0_stats else []
+    all_words = sorted(set(all_words_f1).union(all_words_f0))
+    if not all_words:
+        # An empty grid cannot be laid out; the standard renderer handles it
+        render_subject(subject_id, base_dir, f1_data, f0_data, f1_stats, f0_stats, f1_diff, f0_diff)
+        return
+    n_words = len(all_words)
+
+    _, axs, _ = figure_template('avg', n_words)
+    for row, word in enumerate(all_words):
+        plot_mean_data(axs[row, 0], time, f1_stats, word, 'F1_mean', f"{word} - F1", t_xlim, f1_ylim, condition_colors)
+        plot_mean_data(axs[row, 1], time, f1_stats, word, 'F2_mean', f"{word} - F2", t_xlim, f2_ylim, condition_colors)
+        plot_mean_data(axs[row, 2], time, f0_stats, word, 'pitch_mean', f"{word} - Pitch", t_xlim, pitch_ylim, pitch_condition_colors)
+    save_template('avg', n_words, os.path.join(base_dir, f"plot_avg_{subject_id}.png"))
+
+    _, axs, _ = figure_template('diff', n_words)
+    for row, word in enumerate(all_words):
+        plot_diff_data(axs[row, 0], time, f1_diff, word, 'F1_mean_diff', f"{word} - F1 diff", t_xlim, (-200, 200), condition_colors)
+        plot_diff_data(axs[row, 1], time, f1_diff, word, 'F2_mean_diff', f"{word} - F2 diff", t_xlim, (-200, 200), condition_colors)
+        plot_diff_data(axs[row, 2], time, f0_diff, word, 'pitch_mean_diff', f"{word} - Pitch diff", t_xlim, (-50, 50), pitch_condition_colors)
+    save_template('diff', n_words, os.path.join(base_dir, f"plot_diff_{subject_id}.png"))
+
+    _, axs, _ = figure_template('all', n_words)
+    for row, word in enumerate(all_words):
+        plot_all_trials(axs[row, 0], time, f1_data, f1_stats, word, 'F1', f"{word} - F1 All Trials", t_xlim, f1_ylim, condition_colors, max_samples, bundle=True)
+        plot_all_trials(axs[row, 1], time, f1_data, f1_stats, word, 'F2', f"{word} - F2 All Trials", t_xlim, f2_ylim, condition_colors, max_samples, bundle=True)
+        plot_all_trials(axs[row, 2], time, f0_data, f0_stats, word, 'pitch', f"{word} - Pitch All Trials", t_xlim, pitch_ylim, pitch_condition_colors, max_samples, bundle=True)
+    save_template('all', n_words, os.path.join(base_dir, f"plot_all_{subject_id}.png"))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Plot F0/F1 results for F0vsF1 subjects.")
+    parser.add_argument('--base-dir', default=base_dir)
+    parser.add_argument('--subjects', nargs='+', default=subject_ids,
+                        help="Subject IDs to plot, or 'all' for every subject directory.")
+    parser.add_argument('--render', choices=['standard', 'fast'], default='standard',
+                        help="'fast' draws trial bundles as LineCollections on figure templates reused across subjects.")
+    parser.add_argument('--jobs', type=int, default=1,
+                        help="Number of worker processes plotting subjects in parallel.")
+    parser.add_argument('--report', action='store_true',
+                        help="Write per-stage timings to <base-dir>/prelim_plot_fdata_profile_*.json.")
+    parser.add_argument('--profile', choices=['cprofile', 'pyinstrument'], default=None,
+                        help="Also run under a profiler and save its output to <base-dir>.")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.subjects == ['all']:
+        args.subjects = list_subjects(args.base_dir)
+    with instrument.profiling(args.profile, args.base_dir, 'prelim_plot_fdata'):
+        with instrument.stage('total'):
+            if args.jobs <= 1:
+                for subject_id in sorted(args.subjects):
+                    plot_subject(subject_id, args.base_dir, args.render)
+            else:
+                with ProcessPoolExecutor(max_workers=args.jobs, initializer=use_agg) as executor:
+                    tasks = [(subject_id, args.base_dir, args.render) for subject_id in sorted(args.subjects)]
+                    list(map(instrument.merged, executor.map(_plot_subject_args, tasks)))
+    if args.report:
+        instrument.write_report(args.base_dir, 'prelim_plot_fdata', {'args': vars(args)})
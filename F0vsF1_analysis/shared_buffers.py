@@ -0,0 +1,65 @@
+import os
+import tempfile
+import numpy as np
+
+# Shared buffers are files mapped by every process that uses them; /dev/shm keeps them in RAM
+shared_dir = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+# Buffers this process has attached, by path, oldest first; long-lived workers keep only the last few
+_attached = {}
+max_attached = 8
+
+
+def allocate(shape, dtype=np.float64):
+    """New zero-filled shared array and the (path, dtype, shape) reference that workers attach() it by.
+
+    The array is a memmap of a file under shared_dir, so the parent and every
+    worker that attaches it see the same pages: tasks carry only the
+    reference, and what workers write into it needs no pickling back.
+    """
+    fd, path = tempfile.mkstemp(prefix='f0vsf1_', suffix='.buf', dir=shared_dir)
+    os.close(fd)
+    shape = tuple(int(n) for n in np.atleast_1d(shape))
+    array = np.memmap(path, dtype=dtype, mode='w+', shape=shape)
+    return array, (path, np.dtype(dtype).str, shape)
+
+def share(values):
+    """Copy an array into a new shared buffer once; returns its reference."""
+    array, ref = allocate(np.shape(values), np.asarray(values).dtype)
+    array[...] = values
+    return ref
+
+def share_signals(signals, dtype=np.float32):
+    """Pack several 1-D signals back to back into one shared buffer.
+
+    Returns the buffer's reference and the (offset, length) span of each signal.
+    """
+    spans, offset = [], 0
+    for signal in signals:
+        spans.append((offset, len(signal)))
+        offset += len(signal)
+    array, ref = allocate(max(offset, 1), dtype)
+    for signal, (offset, length) in zip(signals, spans):
+        array[offset:offset + length] = signal
+    return ref, spans
+
+def attach(ref):
+    """The shared array behind a reference, mapped once per process."""
+    path, dtype, shape = ref
+    if path not in _attached:
+        if len(_attached) >= max_attached:
+            del _attached[next(iter(_attached))]
+        _attached[path] = np.memmap(path, dtype=dtype, mode='r+', shape=shape)
+    return _attached[path]
+
+def signal_at(ref, span):
+    """Zero-copy view of one signal packed by share_signals()."""
+    offset, length = span
+    return np.asarray(attach(ref)[offset:offset + length])
+
+def release(ref):
+    """Remove a buffer's file once no worker will attach it again; arrays and views already mapped stay valid."""
+    _attached.pop(ref[0], None)
+    try:
+        os.remove(ref[0])
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,238 @@
+import os
+import re
+import glob
+import argparse
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import instrument
+from trial_io import read_trial, decode_trial
+
+signals_name = 'signals.f32'
+index_name = 'signals_index.csv'
+
+# Open stores by subject directory (None: the subject has no store), shared by everything in the process
+_stores = {}
+# Prefetcher installed by prefetch(), consulted by load_signal
+_prefetcher = None
+
+
+class SignalStore:
+    """Every signalIn of one subject, packed into a single float32 file and opened as one memmap.
+
+    signals.f32 holds the trials back to back; signals_index.csv has one row
+    per trial with its experiment, type, trial number, word, condition,
+    sampling rate, the offset and length of its samples, and the size and
+    mtime its trial file had when it was ingested. signal() returns
+    a zero-copy slice of the memmap, so worker processes forked after the
+    store is opened share its pages instead of receiving copies.
+    """
+
+    def __init__(self, subj_dir):
+        self.subj_dir = subj_dir
+        self.index = pd.read_csv(os.path.join(subj_dir, index_name), keep_default_na=False)
+        if self.index['Length'].sum() > 0:
+            self.samples = np.memmap(os.path.join(subj_dir, signals_name), dtype=np.float32, mode='r')
+        else:
+            self.samples = np.empty(0, dtype=np.float32)
+        self._rows = {name: (offset, length, srate) for name, offset, length, srate in
+                      zip(self.index['File'], self.index['Offset'], self.index['Length'], self.index['sRate'].tolist())}
+        # Stores ingested before file identities were recorded have none, and are never trusted
+        self._identity = {}
+        if 'Size' in self.index and 'Mtime' in self.index:
+            self._identity = {name: (int(size), int(mtime)) for name, size, mtime in
+                              zip(self.index['File'], self.index['Size'], self.index['Mtime'])}
+
+    def __contains__(self, file_name):
+        return file_name in self._rows
+
+    def fresh(self, trial_file):
+        """Whether the store holds trial_file as it is on disk now (same size and mtime as when ingested)."""
+        name = os.path.basename(trial_file)
+        if name not in self._identity:
+            return False
+        try:
+            stat = os.stat(trial_file)
+        except FileNotFoundError:
+            return False
+        return (stat.st_size, stat.st_mtime_ns) == self._identity[name]
+
+    def signal(self, file_name):
+        """(signalIn as a float32 memmap slice, sRate) of a trial file name such as trial_1_3.mat."""
+        instrument.count('store_reads')
+        return self._slice(file_name)
+
+    def _slice(self, file_name):
+        offset, length, srate = self._rows[file_name]
+        return np.asarray(self.samples[offset:offset + length]), srate
+
+def open_store(subj_dir):
+    """The subject's SignalStore, or None if it has not been ingested; each store is opened once per process."""
+    subj_dir = os.path.abspath(subj_dir)
+    if subj_dir not in _stores:
+        exists = os.path.exists(os.path.join(subj_dir, index_name))
+        _stores[subj_dir] = SignalStore(subj_dir) if exists else None
+    return _stores[subj_dir]
+
+def load_signal(trial_file):
+    """(signal, srate, bytes read) of a trial: a slice of the subject's signal store if it is fresh, else read_trial().
+
+    A trial file replaced or touched since the ingest is read from the file itself.
+
+    Inside prefetch(), trials read ahead by the background thread are taken from its queue.
+    """
+    if _prefetcher is not None:
+        result = _prefetcher.take(trial_file)
+        if result is not None:
+            return result
+    store = open_store(os.path.dirname(trial_file))
+    if store is None or not store.fresh(trial_file):
+        return read_trial(trial_file)
+    signal, srate = store.signal(os.path.basename(trial_file))
+    instrument.count('trial_bytes_read', signal.nbytes)
+    return signal, srate, signal.nbytes
+
+def _fetch(store, trial_file):
+    """Read one trial in the prefetch thread: a copy of its store slice (faulting its pages in) or decode_trial()."""
+    if store is not None and store.fresh(trial_file):
+        signal, srate = store._slice(os.path.basename(trial_file))
+        return np.array(signal), srate, signal.nbytes, True
+    return decode_trial(trial_file) + (False,)
+
+class Prefetcher:
+    """Reads the trials of a known sequence ahead of their use in one background thread.
+
+    At most depth trials are read and waiting at any time, so memory stays
+    bounded; each take() tops it up again, and queued trials ahead of the one
+    taken (skipped by the caller) are dropped. A take() of a trial not read
+    yet drops everything before it, so reading ahead resumes after it. File reads and zlib inflation
+    release the GIL, so they overlap with the analysis of the trial before.
+    Counters are updated by take() in the caller's thread, as if the trial
+    had been read there.
+    """
+
+    def __init__(self, trial_files, depth):
+        self.pending = deque(trial_files)
+        self.depth = depth
+        self.queue = deque()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='prefetch')
+        self._fill()
+
+    def _fill(self):
+        while self.pending and len(self.queue) < self.depth:
+            trial_file = self.pending.popleft()
+            store = open_store(os.path.dirname(trial_file))
+            self.queue.append((trial_file, self.executor.submit(_fetch, store, trial_file)))
+
+    def take(self, trial_file):
+        """(signal, srate, bytes read) of trial_file if it was read ahead, else None."""
+        for k, (queued_file, future) in enumerate(self.queue):
+            if queued_file == trial_file:
+                break
+        else:
+            if trial_file in self.pending:
+                # Every queued trial was skipped (e.g. served from the track cache): restart after this one
+                for _, future in self.queue:
+                    future.cancel()
+                self.queue.clear()
+                while self.pending.popleft() != trial_file:
+                    pass
+                self._fill()
+            return None
+        for _ in range(k):
+            self.queue.popleft()[1].cancel()
+        _, future = self.queue.popleft()
+        with instrument.stage('prefetch_wait'):
+            signal, srate, bytes_read, from_store = future.result()
+        self._fill()
+        instrument.count('prefetched_trials')
+        instrument.count('store_reads' if from_store else 'trials_read')
+        instrument.count('trial_bytes_read', bytes_read)
+        return signal, srate, bytes_read
+
+    def close(self):
+        for _, future in self.queue:
+            future.cancel()
+        self.executor.shutdown(wait=True)
+
+@contextmanager
+def prefetch(trial_files, depth):
+    """Within the block, load_signal() serves trial_files (in that order) from a Prefetcher reading depth trials ahead.
+
+    A depth of 0 does nothing. trial_files may repeat a file that is loaded
+    twice; a file loaded out of sequence is read directly.
+    """
+    global _prefetcher
+    if depth <= 0:
+        yield
+        return
+    previous, _prefetcher = _prefetcher, Prefetcher(trial_files, depth)
+    try:
+        yield
+    finally:
+        _prefetcher.close()
+        _prefetcher = previous
+
+def ingest_subject(subj_dir, trial_info=None):
+    """Pack every trial_{i}_{n}.mat of a subject into signals.f32 and signals_index.csv.
+
+    trial_info maps (experiment, trial) to (type, word, condition) for the
+    index. Both files are written next to the trial files and replaced
+    atomically. Each trial's file size and mtime are recorded, so trials
+    changed after the ingest are read from their files until it is rerun.
+    Returns the index.
+    """
+    trial_info = trial_info or {}
+    pattern = re.compile(r'trial_(\d+)_(\d+)\.mat$')
+    trial_files = sorted((tuple(map(int, pattern.search(f).groups())), f)
+                         for f in glob.glob(os.path.join(subj_dir, 'trial_*_*.mat')) if pattern.search(f))
+
+    rows, offset = [], 0
+    signals_path = os.path.join(subj_dir, signals_name)
+    with open(signals_path + '.tmp', 'wb') as f:
+        for (expt_num, trial_num), trial_file in trial_files:
+            stat = os.stat(trial_file)
+            signal, srate, _ = read_trial(trial_file)
+            signal.astype(np.float32, copy=False).tofile(f)
+            expt_type, word, cond = trial_info.get((expt_num, trial_num), ('', '', ''))
+            rows.append({'File': os.path.basename(trial_file), 'Experiment': expt_num, 'Type': expt_type,
+                         'Trial': trial_num, 'Word': word, 'Condition': cond, 'sRate': srate,
+                         'Offset': offset, 'Length': len(signal), 'Size': stat.st_size, 'Mtime': stat.st_mtime_ns})
+            offset += len(signal)
+    index = pd.DataFrame(rows, columns=['File', 'Experiment', 'Type', 'Trial', 'Word', 'Condition',
+                                        'sRate', 'Offset', 'Length', 'Size', 'Mtime'])
+    index_path = os.path.join(subj_dir, index_name)
+    index.to_csv(index_path + '.tmp', index=False)
+    os.replace(signals_path + '.tmp', signals_path)
+    os.replace(index_path + '.tmp', index_path)
+    _stores.pop(os.path.abspath(subj_dir), None)
+    return index
+
+
+if __name__ == '__main__':
+    from prelim_get_fdata import base_dir, subject_ids
+    from manifest import list_subjects, experiment_data, experiment_trials
+
+    parser = argparse.ArgumentParser(description="Pack each subject's trial signals into one memory-mapped store.")
+    parser.add_argument('--base-dir', default=base_dir)
+    parser.add_argument('--subjects', nargs='+', default=subject_ids,
+                        help="Subject IDs to ingest, or 'all' for every subject directory.")
+    args = parser.parse_args()
+    if args.subjects == ['all']:
+        args.subjects = list_subjects(args.base_dir)
+
+    for subj_id in sorted(args.subjects):
+        subj_dir = os.path.join(args.base_dir, subj_id)
+        _, exptOrder = experiment_data(subj_dir)
+        trial_info = {}
+        for i, expt_type in enumerate(exptOrder, start=1):
+            listWords, listConds = experiment_trials(subj_dir, i, expt_type)
+            if listWords is None or listConds is None:
+                continue
+            for trial_num, (word, cond) in enumerate(zip(listWords, listConds), start=1):
+                trial_info[(i, trial_num)] = (expt_type, word, cond)
+        index = ingest_subject(subj_dir, trial_info)
+        size_mb = index['Length'].sum() * 4 / 1024**2
+        print(f"Subject {subj_id}: {len(index)} trials ({size_mb:.1f} MB) packed into {os.path.join(subj_dir, signals_name)}")
@@ -0,0 +1,258 @@
+import os
+from collections import OrderedDict
+import numpy as np
+from scipy.io import loadmat
+from track_tables import TrackRecord, TrackSet, load_tracks, is_compact
+
+# Decoded files and word/condition pieces kept per process, least recently used dropped first
+max_cache_bytes = 256 * 2**20
+measures = {'f1': ['F1', 'F2'], 'f0': ['pitch']}
+
+
+def nbytes(value):
+    """Approximate memory held by a decoded piece (arrays, records and the dicts/lists around them)."""
+    if isinstance(value, np.ndarray):
+        return value.nbytes if value.dtype != object else sum(nbytes(item) for item in value.flat)
+    if isinstance(value, TrackRecord):
+        return value.values.nbytes
+    if isinstance(value, dict):
+        return sum(nbytes(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(nbytes(item) for item in value)
+    return 0
+
+class ResultCache:
+    """Memoizes decoded pieces by key, evicting the least recently used beyond max_bytes."""
+
+    def __init__(self, max_bytes=max_cache_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total = 0
+
+    def get(self, key, decode, size=None):
+        """Cached value of key, else decode() it; size defaults to nbytes() of the value."""
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key][0]
+        value = decode()
+        size = nbytes(value) if size is None else size
+        self.entries[key] = (value, size)
+        self.total += size
+        while self.total > self.max_bytes and len(self.entries) > 1:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.total -= evicted
+        return value
+
+    def clear(self):
+        self.entries.clear()
+        self.total = 0
+
+_cache = ResultCache()
+
+
+def _file_key(path):
+    stat = os.stat(path)
+    return path, stat.st_size, stat.st_mtime_ns
+
+def _names(value):
+    """Field names of a loaded struct; none for the [[None]] (or empty) array savemat writes for an empty dict."""
+    return list(value.dtype.names or []) if value.size > 0 else []
+
+def _fields(record):
+    """{field: 1-D array} of one MATLAB struct loaded as a record."""
+    return {name: np.ravel(record[name]) for name in record.dtype.names}
+
+
+class MatSource:
+    """A {subj}_f*_{data,stats,diff}.mat struct, loaded on first access.
+
+    The first access reads and decodes the whole file with loadmat, which
+    keeps the nested structs as record arrays. Only the conversion of those
+    records into arrays (stats and diffs) or a list of per-trial tracks (raw
+    data) is done per requested word/condition.
+    """
+
+    def __init__(self, path, name, kind, cache):
+        self.path, self.name, self.kind, self.cache = path, name, kind, cache
+
+    def contents(self):
+        """The loaded file, counted in the cache at its size on disk."""
+        key = _file_key(self.path)
+        return self.cache.get(key, lambda: loadmat(self.path, squeeze_me=False), size=key[1])
+
+    def root(self):
+        return self.contents()[self.name][0, 0]
+
+    def words(self):
+        return _names(self.contents()[self.name])
+
+    def conds(self, word):
+        return _names(self.root()[word])
+
+    def piece(self, word, cond):
+        def decode():
+            group = self.root()[word][0, 0][cond]
+            if self.kind != 'data':
+                return _fields(group[0, 0])
+            return [_fields(cell[0, 0]) for cell in group.ravel()]
+        return self.cache.get(_file_key(self.path) + (word, cond), decode)
+
+class CompactSource(MatSource):
+    """A compact-layout {subj}_f*_data.mat: one trials x frames matrix per measure and condition."""
+
+    def __init__(self, path, name, measures, cache):
+        super().__init__(path, name, 'data', cache)
+        self.measures = measures
+
+    def piece(self, word, cond):
+        def decode():
+            group = _fields(self.root()[word][0, 0][cond][0, 0])
+            time_step = float(self.contents()['time_step'][0, 0])
+            return TrackSet.from_compact({word: {cond: group}}, self.measures, time_step)[word][cond]
+        return self.cache.get(_file_key(self.path) + (word, cond), decode)
+
+class TrackStoreSource:
+    """The memory-mapped {subj}_tracks/<prefix>_*.npy columns; a word/condition slices only its own rows.
+
+    The store is identified by the size and mtime of its length column,
+    which save_tracks rewrites with the others; when it changes the columns
+    are mapped again and earlier pieces are no longer served.
+    """
+
+    def __init__(self, tracks_dir, prefix, measures, cache):
+        self.tracks_dir, self.prefix, self.measures, self.cache = tracks_dir, prefix, measures, cache
+        self.table = self.identity = None
+        self.word_labels = self.cond_labels = None
+
+    def labels(self):
+        identity = _file_key(os.path.join(self.tracks_dir, f"{self.prefix}_length.npy"))
+        if self.table is None or identity != self.identity:
+            self.table, self.identity = load_tracks(self.tracks_dir, self.prefix), identity
+            self.word_labels, self.cond_labels = self.table['word'].astype(str), self.table['cond'].astype(str)
+        return self.word_labels, self.cond_labels
+
+    def words(self):
+        return list(dict.fromkeys(self.labels()[0]))
+
+    def conds(self, word):
+        words, conds = self.labels()
+        return list(dict.fromkeys(conds[words == word]))
+
+    def piece(self, word, cond):
+        def decode():
+            words, conds = self.labels()
+            rows = np.flatnonzero((words == word) & (conds == cond))
+            return [{column: self.table[column][row, :self.table['length'][row]] for column in ['time'] + self.measures}
+                    for row in rows]
+        self.labels()
+        return self.cache.get(self.identity + (word, cond), decode)
+
+
+class LazyWord:
+    """{cond: piece} of one word; pieces are decoded when indexed."""
+
+    def __init__(self, source, word):
+        self.source, self.word = source, word
+
+    def keys(self):
+        return self.source.conds(self.word)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __contains__(self, cond):
+        return cond in self.keys()
+
+    def __getitem__(self, cond):
+        if cond not in self:
+            raise KeyError(cond)
+        return self.source.piece(self.word, cond)
+
+    def items(self):
+        return [(cond, self[cond]) for cond in self.keys()]
+
+class LazyResult:
+    """{word: {cond: ...}} view of one results file that is located and opened only when first read.
+
+    open_source() returns the file's source, or None when there is no file;
+    that reads as an empty dict, like load_results always returned.
+    """
+
+    def __init__(self, open_source):
+        self.open_source = open_source
+        self.opened = False
+        self._source = None
+
+    @property
+    def source(self):
+        if not self.opened:
+            self._source, self.opened = self.open_source(), True
+        return self._source
+
+    def keys(self):
+        return self.source.words() if self.source is not None else []
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __contains__(self, word):
+        return word in self.keys()
+
+    def __getitem__(self, word):
+        if word not in self:
+            raise KeyError(word)
+        return LazyWord(self.source, word)
+
+    def items(self):
+        return [(word, self[word]) for word in self.keys()]
+
+
+class SubjectResults:
+    """Lazy access to a subject's saved results: f1_data, f0_data, f1_stats, f0_stats, f1_diff, f0_diff.
+
+    Nothing is read when it is created. Raw tracks come from the
+    {subj}_tracks store or {subj}_f*_data.mat (in either layout), whichever
+    was written last, so drawing the avg and diff figures never decodes a
+    raw track.
+    """
+
+    def __init__(self, subject_id, base_dir, cache=None):
+        self.subject_id, self.base_dir = subject_id, base_dir
+        self.cache = _cache if cache is None else cache
+        for prefix in ('f1', 'f0'):
+            setattr(self, f'{prefix}_data', self.data(prefix))
+            for kind in ('stats', 'diff'):
+                setattr(self, f'{prefix}_{kind}', self.summary(prefix, kind))
+
+    def path(self, name):
+        return os.path.join(self.base_dir, f"{self.subject_id}_{name}")
+
+    def summary(self, prefix, kind):
+        path = self.path(f"{prefix}_{kind}.mat")
+        return LazyResult(lambda: MatSource(path, f'{prefix}_{kind}', kind, self.cache) if os.path.exists(path) else None)
+
+    def data(self, prefix):
+        return LazyResult(lambda: self.data_source(prefix))
+
+    def data_source(self, prefix):
+        """Where raw tracks are read from: the track store or the .mat file (in its layout), whichever is newer."""
+        tracks_dir = self.path('tracks')
+        length_file = os.path.join(tracks_dir, f"{prefix}_length.npy")
+        path = self.path(f"{prefix}_data.mat")
+        if os.path.exists(length_file) and (not os.path.exists(path) or
+                                            os.stat(length_file).st_mtime_ns >= os.stat(path).st_mtime_ns):
+            return TrackStoreSource(tracks_dir, prefix, measures[prefix], self.cache)
+        if not os.path.exists(path):
+            return None
+        if is_compact(path):
+            return CompactSource(path, f'{prefix}_data', measures[prefix], self.cache)
+        return MatSource(path, f'{prefix}_data', 'data', self.cache)
+
+    def as_tuple(self):
+        return self.f1_data, self.f0_data, self.f1_stats, self.f0_stats, self.f1_diff, self.f0_diff
@@ -0,0 +1,117 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from scipy.io import savemat
+from scipy.signal import lfilter
+
+# Same words, conditions and block layout as run_F0vsF1_expt.m
+words = ['head', 'dead', 'bed']
+conds = ['noShift', 'shiftDown', 'shiftUp']
+shift_dirs = {'noShift': 0, 'shiftDown': -1, 'shiftUp': 1}
+
+# Ground-truth vowel formants (F1-F4, Hz) and bandwidths
+word_formants = {
+    'head': (580, 1800, 2600, 3500),
+    'dead': (560, 1750, 2550, 3450),
+    'bed': (620, 1850, 2650, 3550),
+}
+formant_bandwidths = (80, 100, 140, 180)
+gender_f0 = {'male': 110.0, 'female': 200.0}
+
+def synth_vowel(f0, formants, srate, lead, duration, tail, rng):
+    """Source-filter vowel: glottal pulse train through a cascade of formant resonators.
+
+    The vowel starts after `lead` seconds of low-level noise and lasts
+    `duration` seconds, with 20 ms on/off ramps and a `tail` of noise.
+    """
+    n_lead, n_vowel, n_tail = int(lead * srate), int(duration * srate), int(tail * srate)
+
+    # Glottal source: impulse train at f0 smoothed by a -12 dB/octave glottal filter
+    source = np.zeros(n_vowel)
+    source[(np.arange(0, duration, 1.0 / f0) * srate).astype(int)] = 1.0
+    pole = np.exp(-2 * np.pi * 100 / srate)
+    source = lfilter([1.0], [1.0, -2 * pole, pole**2], source)
+
+    # Vocal tract: second-order resonator per formant, then lip radiation
+    vowel = source
+    for freq, bw in zip(formants, formant_bandwidths):
+        r = np.exp(-np.pi * bw / srate)
+        theta = 2 * np.pi * freq / srate
+        vowel = lfilter([1 - r], [1.0, -2 * r * np.cos(theta), r**2], vowel)
+    vowel = np.diff(vowel, prepend=0.0)
+
+    ramp = np.ones(n_vowel)
+    n_ramp = int(0.02 * srate)
+    ramp[:n_ramp] = np.linspace(0, 1, n_ramp)
+    ramp[-n_ramp:] = np.linspace(1, 0, n_ramp)
+    vowel = 0.3 * vowel * ramp / np.max(np.abs(vowel))
+
+    signal = np.concatenate([np.zeros(n_lead), vowel, np.zeros(n_tail)])
+    return signal + rng.normal(0, 1e-4, len(signal))
+
+def make_subject(subj_dir, subj_id, gender, n_blocks, n_trials, srate, rng, f1_shift=0.1, f0_shift=0.05):
+    """Write expt.mat, expt_{i}_{type}.mat and trial_{i}_{n}.mat for one synthetic subject.
+
+    Blocks alternate F1/F0 (starting by subject parity, as in the experiment).
+    Shifted conditions scale the produced F1 (F1 blocks) or F0 (F0 blocks) by
+    1 +/- the shift. Returns the ground-truth rows.
+    """
+    os.makedirs(subj_dir, exist_ok=True)
+    first, second = ('F0', 'F1') if int(subj_id) % 2 == 0 else ('F1', 'F0')
+    exptOrder = [first if b % 2 == 0 else second for b in range(n_blocks)]
+    savemat(os.path.join(subj_dir, 'expt.mat'),
+            {'expt': {'gender': gender, 'exptOrder': np.array(exptOrder, dtype=object)}})
+
+    truth = []
+    for i, expt_type in enumerate(exptOrder, start=1):
+        listWords = [words[k % len(words)] for k in rng.permutation(n_trials)]
+        listConds = [conds[k % len(conds)] for k in rng.permutation(n_trials)]
+        savemat(os.path.join(subj_dir, f"expt_{i}_{expt_type}.mat"),
+                {'currExpt': {'listWords': np.array(listWords, dtype=object),
+                              'listConds': np.array(listConds, dtype=object)}})
+
+        for trial_num, (word, cond) in enumerate(zip(listWords, listConds), start=1):
+            direction = shift_dirs[cond]
+            f0 = gender_f0[gender] * (1 + f0_shift * direction if expt_type == 'F0' else 1)
+            formants = list(word_formants[word])
+            if expt_type == 'F1':
+                formants[0] *= 1 + f1_shift * direction
+            lead = rng.uniform(0.1, 0.25)
+            signal = synth_vowel(f0, formants, srate, lead, 0.45, 0.1, rng)
+            savemat(os.path.join(subj_dir, f"trial_{i}_{trial_num}.mat"),
+                    {'data': {'signalIn': signal, 'params': {'sRate': srate}}})
+            truth.append({'Subject ID': subj_id, 'Experiment': i, 'Type': expt_type, 'Trial': trial_num,
+                          'Word': word, 'Condition': cond, 'Onset': lead, 'F0': f0,
+                          'F1': formants[0], 'F2': formants[1], 'F3': formants[2], 'F4': formants[3]})
+    return truth
+
+def make_session(base_dir, n_subjects=2, n_blocks=2, n_trials=30, srate=16000, seed=0):
+    """Create n_subjects synthetic subject directories (IDs 901, 902, ...) under base_dir.
+
+    Ground truth for every trial is written to <base_dir>/synth_truth.csv and
+    returned as a DataFrame.
+    """
+    if n_blocks < 2:
+        raise ValueError("n_blocks must be at least 2 (one F1 and one F0 block)")
+    rng = np.random.default_rng(seed)
+    truth = []
+    for s in range(n_subjects):
+        subj_id = str(901 + s)
+        gender = 'male' if s % 2 == 0 else 'female'
+        truth += make_subject(os.path.join(base_dir, subj_id), subj_id, gender, n_blocks, n_trials, srate, rng)
+    truth = pd.DataFrame(truth)
+    truth.to_csv(os.path.join(base_dir, 'synth_truth.csv'), index=False)
+    return truth
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate a synthetic F0vsF1 session with known F0/F1/F2.")
+    parser.add_argument('base_dir')
+    parser.add_argument('--subjects', type=int, default=2)
+    parser.add_argument('--blocks', type=int, default=2)
+    parser.add_argument('--trials', type=int, default=30)
+    parser.add_argument('--srate', type=int, default=16000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    truth = make_session(args.base_dir, args.subjects, args.blocks, args.trials, args.srate, args.seed)
+    print(f"Wrote {len(truth)} trials for {args.subjects} subjects to {args.base_dir}")
@@ -0,0 +1,16 @@
+import numpy as np
+from scipy.io import savemat
+from subject_results import SubjectResults, ResultCache
+
+
+def test_word_without_conditions_reads_as_empty(tmp_path):
+    # savemat writes the {} of a word without noShift or shift conditions as [[None]]
+    diff = {'bed': {}, 'head': {'shiftUp': {'pitch_mean_diff': np.arange(3.0), 'pitch_std_diff': np.ones(3)}}}
+    savemat(tmp_path / '1_f0_diff.mat', {'f0_diff': diff})
+    results = SubjectResults('1', str(tmp_path), ResultCache())
+
+    assert sorted(results.f0_diff) == ['bed', 'head']
+    assert list(results.f0_diff['bed']) == []
+    assert 'shiftUp' not in results.f0_diff['bed']
+    np.testing.assert_array_equal(results.f0_diff['head']['shiftUp']['pitch_mean_diff'], np.arange(3.0))
+    assert len(results.f1_diff) == 0
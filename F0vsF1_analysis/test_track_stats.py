@@ -0,0 +1,17 @@
+import numpy as np
+from track_tables import pack_tracks
+from track_stats import compute_stats, compute_diff, stats_from_tables
+
+
+def test_no_trials_gives_empty_stats():
+    assert compute_stats({}, ['pitch'], 150) == {}
+    assert compute_stats({'bed': {'noShift': []}}, ['F1', 'F2'], 150) == {}
+    assert compute_diff({}, ['pitch']) == {}
+
+def test_empty_tables_are_skipped():
+    track = {'time': np.arange(3) * 0.01, 'pitch': np.array([100.0, 110.0, np.nan])}
+    empty = pack_tracks({}, ['pitch'], dtype=np.float64)
+    full = pack_tracks({'bed': {'noShift': [track]}}, ['pitch'], dtype=np.float64)
+    stats = stats_from_tables([empty, full], ['pitch'], 4)
+    np.testing.assert_array_equal(stats['bed']['noShift']['pitch_mean'], [100.0, 110.0, np.nan, np.nan])
+    assert stats_from_tables([empty, empty], ['pitch'], 4) == {}
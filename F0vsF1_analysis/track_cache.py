@@ -0,0 +1,110 @@
+import os
+import json
+import hashlib
+import argparse
+import numpy as np
+import instrument
+
+
+class TrackCache:
+    """Persistent on-disk cache of per-trial acoustic tracks.
+
+    Entries are keyed by the trial file's identity (path, size, mtime) plus the
+    analysis function and its parameters, so editing a trial file or changing
+    a parameter simply misses. Each entry is one uncompressed .npz holding one
+    named array per track column. Least recently used entries are evicted once
+    the cache grows past max_bytes.
+    """
+
+    def __init__(self, cache_dir, max_bytes=2 * 1024**3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, trial_file, analysis, **params):
+        stat = os.stat(trial_file)
+        ident = [os.path.abspath(trial_file), stat.st_size, stat.st_mtime_ns, analysis, sorted(params.items())]
+        return hashlib.sha1(json.dumps(ident, default=float).encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + '.npz')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with np.load(path) as entry:
+                tracks = {name: entry[name] for name in entry.files}
+        except (OSError, ValueError):
+            return None
+        # Touch the entry so that eviction is least-recently-used
+        os.utime(path)
+        return tracks
+
+    def put(self, key, **tracks):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **tracks)
+        os.replace(tmp_path, path)
+
+    def entries(self):
+        """List (path, size, last access) for every entry, oldest first."""
+        found = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith('.npz'):
+                    path = os.path.join(root, name)
+                    stat = os.stat(path)
+                    found.append((path, stat.st_size, stat.st_mtime))
+        return sorted(found, key=lambda e: e[2])
+
+    def evict(self, max_bytes=None):
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for path, size, _ in entries:
+            if total <= max_bytes:
+                break
+            os.remove(path)
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self):
+        return self.evict(max_bytes=0)
+
+
+def cached(cache, trial_file, analysis, compute, **params):
+    """Return cached tracks for (trial, analysis, params), computing and storing them on a miss."""
+    if cache is None:
+        return {name: np.asarray(value) for name, value in compute().items()}
+    key = cache.key(trial_file, analysis, **params)
+    tracks = cache.get(key)
+    if tracks is None:
+        instrument.count('cache_misses')
+        tracks = {name: np.asarray(value) for name, value in compute().items()}
+        cache.put(key, **tracks)
+    else:
+        instrument.count('cache_hits')
+    return tracks
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Inspect, prune or invalidate the per-trial track cache.")
+    parser.add_argument('command', choices=['info', 'prune', 'clear'])
+    parser.add_argument('cache_dir')
+    parser.add_argument('--max-mb', type=float, default=2048, help="Size bound used by 'prune'.")
+    args = parser.parse_args()
+
+    cache = TrackCache(args.cache_dir, max_bytes=int(args.max_mb * 1024**2))
+    if args.command == 'info':
+        entries = cache.entries()
+        total = sum(size for _, size, _ in entries)
+        print(f"{len(entries)} entries, {total / 1024**2:.1f} MB in {args.cache_dir}")
+    elif args.command == 'prune':
+        print(f"Evicted {cache.evict()} entries.")
+    else:
+        print(f"Removed {cache.clear()} entries.")
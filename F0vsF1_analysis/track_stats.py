@@ -0,0 +1,137 @@
+import numpy as np
+from track_tables import pack_tracks
+
+diff_conds = ['shiftUp', 'shiftDown']
+
+
+def track_tensor(table, measures, max_samples):
+    """Stack the measure columns of a packed table into a (trial, frame, measure) float64 array.
+
+    Tracks are NaN-padded or truncated to max_samples frames.
+    """
+    tensor = np.full((len(table['word']), max_samples, len(measures)), np.nan)
+    for m, measure in enumerate(measures):
+        values = table[measure][:, :max_samples]
+        tensor[:, :values.shape[1], m] = values
+    return tensor
+
+def grouped_stats(tensor, words, conds):
+    """NaN-aware mean and std over trials for every (word, cond) group.
+
+    Groups are reduced together with a single one-hot matrix product over the
+    flattened frames x measures axis. Returns the groups in first-seen order
+    and (group, frame, measure) mean and std arrays.
+    """
+    labels = list(zip(words, conds))
+    groups = list(dict.fromkeys(labels))
+    group_index = {group: g for g, group in enumerate(groups)}
+    onehot = np.zeros((len(groups), len(labels)))
+    onehot[[group_index[label] for label in labels], np.arange(len(labels))] = 1.0
+
+    flat = tensor.reshape(len(labels), -1)
+    valid = ~np.isnan(flat)
+    counts = onehot @ valid
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = (onehot @ np.where(valid, flat, 0.0)) / counts
+        centered = np.where(valid, flat - (onehot.T @ np.nan_to_num(mean)), 0.0)
+        std = np.sqrt((onehot @ centered**2) / counts)
+    shape = (len(groups),) + tensor.shape[1:]
+    return groups, mean.reshape(shape), std.reshape(shape)
+
+def stats_from_tables(tables, measures, max_samples):
+    """{word: {cond: {'<measure>_mean': ..., '<measure>_std': ...}}} pooling every trial of the packed tables.
+
+    With several subjects' tables this is the trial-weighted grand average.
+    Tables without rows are skipped, and no rows at all gives {}.
+    """
+    tables = [table for table in tables if table and len(table['word']) > 0]
+    if not tables:
+        return {}
+    words = np.concatenate([table['word'] for table in tables])
+    conds = np.concatenate([table['cond'] for table in tables])
+    tensor = np.concatenate([track_tensor(table, measures, max_samples) for table in tables])
+    groups, mean, std = grouped_stats(tensor, words, conds)
+
+    stats = {}
+    for g, (word, cond) in enumerate(groups):
+        stats.setdefault(str(word), {})[str(cond)] = {}
+        for m, measure in enumerate(measures):
+            stats[str(word)][str(cond)][f'{measure}_mean'] = mean[g, :, m]
+            stats[str(word)][str(cond)][f'{measure}_std'] = std[g, :, m]
+    return stats
+
+def compute_stats(data, measures, max_samples):
+    """Per word/condition mean and std tracks of nested {word: {cond: [track, ...]}} data."""
+    return stats_from_tables([pack_tracks(data, measures, dtype=np.float64)], measures, max_samples)
+
+def compute_diff(stats, measures):
+    """shiftUp/shiftDown - noShift mean differences, with the two stds combined in quadrature."""
+    diff = {}
+    for word, cond_dict in stats.items():
+        diff[word] = {}
+        if 'noShift' not in cond_dict:
+            continue
+        conds = [cond for cond in diff_conds if cond in cond_dict]
+        if not conds:
+            continue
+        keys = [f'{measure}_{kind}' for measure in measures for kind in ('mean', 'std')]
+        base = np.stack([cond_dict['noShift'][key] for key in keys])
+        shifted = np.stack([[cond_dict[cond][key] for key in keys] for cond in conds])
+        mean_diff = shifted[:, 0::2] - base[0::2]
+        std_diff = np.sqrt(shifted[:, 1::2]**2 + base[1::2]**2)
+        for c, cond in enumerate(conds):
+            diff[word][cond] = {}
+            for m, measure in enumerate(measures):
+                diff[word][cond][f'{measure}_mean_diff'] = mean_diff[c, m]
+                diff[word][cond][f'{measure}_std_diff'] = std_diff[c, m]
+    return diff
+
+class RunningStats:
+    """Per word/condition mean and std tracks updated one trial at a time.
+
+    Each group keeps a per-frame count, mean and sum of squared deviations
+    (Welford's update), so add() costs O(max_samples x measures) however many
+    trials came before. NaN frames are skipped per frame as in compute_stats,
+    and stats() returns the same nested dict.
+    """
+
+    def __init__(self, measures, max_samples):
+        self.measures = list(measures)
+        self.max_samples = max_samples
+        self.groups = {}
+
+    def add(self, word, cond, track):
+        values = np.full((self.max_samples, len(self.measures)), np.nan)
+        for m, measure in enumerate(self.measures):
+            column = np.asarray(track[measure], dtype=np.float64)[:self.max_samples]
+            values[:len(column), m] = column
+        if (word, cond) not in self.groups:
+            self.groups[(word, cond)] = [0, np.zeros(values.shape), np.zeros(values.shape), np.zeros(values.shape)]
+        group = self.groups[(word, cond)]
+        group[0] += 1
+        _, count, mean, m2 = group
+        valid = ~np.isnan(values)
+        count += valid
+        delta = np.where(valid, values - mean, 0.0)
+        mean += delta / np.maximum(count, 1)
+        m2 += delta * np.where(valid, values - mean, 0.0)
+
+    def n_trials(self, word, cond):
+        return self.groups[(word, cond)][0] if (word, cond) in self.groups else 0
+
+    def mean(self, word, cond):
+        """(frame, measure) mean of a group, NaN where no trial has a value."""
+        _, count, mean, _ = self.groups[(word, cond)]
+        return np.where(count > 0, mean, np.nan)
+
+    def stats(self):
+        stats = {}
+        for (word, cond), (_, count, mean, m2) in self.groups.items():
+            with np.errstate(invalid='ignore', divide='ignore'):
+                std = np.sqrt(m2 / count)
+            mean = np.where(count > 0, mean, np.nan)
+            stats.setdefault(str(word), {})[str(cond)] = {}
+            for m, measure in enumerate(self.measures):
+                stats[str(word)][str(cond)][f'{measure}_mean'] = mean[:, m]
+                stats[str(word)][str(cond)][f'{measure}_std'] = std[:, m]
+        return stats
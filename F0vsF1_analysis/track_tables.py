@@ -0,0 +1,170 @@
+import os
+import numpy as np
+from scipy.io import whosmat
+
+
+def pack_tracks(data, measures, dtype=np.float32):
+    """Flatten {word: {cond: [track, ...]}} into dense trials x frames columns.
+
+    Tracks are NaN-padded to the longest trial and stored as float32 by default. Each row
+    carries its word, condition, position within that word/condition list and
+    its unpadded length.
+    """
+    rows = [(word, cond, index, track)
+            for word, cond_dict in data.items()
+            for cond, trials in cond_dict.items()
+            for index, track in enumerate(trials)]
+    n_frames = max((len(track['time']) for *_, track in rows), default=0)
+
+    table = {
+        'word': np.array([word for word, *_ in rows], dtype=str),
+        'cond': np.array([cond for _, cond, *_ in rows], dtype=str),
+        'index': np.array([index for _, _, index, _ in rows], dtype=np.int32),
+        'length': np.array([len(track['time']) for *_, track in rows], dtype=np.int32),
+    }
+    for column in ['time'] + list(measures):
+        values = np.full((len(rows), n_frames), np.nan, dtype=dtype)
+        for row, (*_, track) in enumerate(rows):
+            values[row, :len(track[column])] = track[column]
+        table[column] = values
+    return table
+
+def save_tracks(out_dir, prefix, table):
+    """Write each column to <out_dir>/<prefix>_<column>.npy."""
+    os.makedirs(out_dir, exist_ok=True)
+    for column, values in table.items():
+        np.save(os.path.join(out_dir, f"{prefix}_{column}.npy"), values)
+
+def remove_tracks(out_dir, prefix):
+    """Delete the <prefix>_*.npy columns of out_dir, and out_dir itself once it is empty."""
+    if not os.path.isdir(out_dir):
+        return
+    for name in os.listdir(out_dir):
+        if name.startswith(prefix + '_') and name.endswith('.npy'):
+            os.remove(os.path.join(out_dir, name))
+    if not os.listdir(out_dir):
+        os.rmdir(out_dir)
+
+def load_tracks(out_dir, prefix, mmap=True):
+    """Load the columns saved by save_tracks, memory-mapped unless mmap is False."""
+    table = {}
+    suffix = '.npy'
+    for name in sorted(os.listdir(out_dir)):
+        if name.startswith(prefix + '_') and name.endswith(suffix):
+            column = name[len(prefix) + 1:-len(suffix)]
+            table[column] = np.load(os.path.join(out_dir, name), mmap_mode='r' if mmap else None)
+    return table
+
+
+class TrackRecord:
+    """One trial's track: its start time and a float32 (measures x frames) array.
+
+    Frames are step seconds apart, so record['time'] is rebuilt from the
+    start time rather than stored; record[measure] is a row of the array.
+    """
+
+    __slots__ = ('start', 'step', 'values', 'columns')
+
+    def __init__(self, start, step, values, columns):
+        self.start = start
+        self.step = step
+        self.values = values
+        self.columns = columns
+
+    def __len__(self):
+        return self.values.shape[1]
+
+    def __getitem__(self, column):
+        if column == 'time':
+            return self.start + np.arange(self.values.shape[1]) * self.step
+        return self.values[self.columns[column]]
+
+    def keys(self):
+        return ['time'] + list(self.columns)
+
+    def as_dict(self, dtype=np.float64):
+        return {column: np.asarray(self[column], dtype=dtype) for column in self.keys()}
+
+class TrackSet:
+    """A subject's F1 or F0 tracks, {word: {cond: [TrackRecord, ...]}}.
+
+    It iterates, indexes and len()s like the nested dicts of track dicts it
+    replaces, so pack_tracks, the stats and the plots read it unchanged.
+    Every record shares the set's time_step and measures, and keeps its
+    values as float32, a third of the float64 time/F1/F2 dict for an F1
+    track.
+    """
+
+    def __init__(self, measures, time_step):
+        self.measures = list(measures)
+        self.time_step = time_step
+        self.columns = {measure: m for m, measure in enumerate(self.measures)}
+        self.groups = {}
+
+    def add(self, word, cond, track):
+        """Append a {'time': ..., <measure>: ...} track (or a TrackRecord) to its word/condition."""
+        times = track['time']
+        start = float(times[0]) if len(times) > 0 else 0.0
+        values = np.array([track[measure] for measure in self.measures], dtype=np.float32).reshape(len(self.measures), -1)
+        self.groups.setdefault(word, {}).setdefault(cond, []).append(TrackRecord(start, self.time_step, values, self.columns))
+
+    def __len__(self):
+        return len(self.groups)
+
+    def __iter__(self):
+        return iter(self.groups)
+
+    def __contains__(self, word):
+        return word in self.groups
+
+    def __getitem__(self, word):
+        return self.groups[word]
+
+    def keys(self):
+        return self.groups.keys()
+
+    def values(self):
+        return self.groups.values()
+
+    def items(self):
+        return self.groups.items()
+
+    def nested(self):
+        """Nested dicts of float64 track dicts, the layout {subj}_f*_data.mat has always had."""
+        return {word: {cond: [record.as_dict() for record in records] for cond, records in cond_dict.items()}
+                for word, cond_dict in self.groups.items()}
+
+    def compact(self):
+        """{word: {cond: {'start', 'length', <measure>: float32 trials x frames, NaN-padded}}} for savemat."""
+        data = {}
+        for word, cond_dict in self.groups.items():
+            data[word] = {}
+            for cond, records in cond_dict.items():
+                n_frames = max(len(record) for record in records)
+                group = {'start': np.array([record.start for record in records]),
+                         'length': np.array([len(record) for record in records], dtype=np.int32)}
+                for measure, m in self.columns.items():
+                    values = np.full((len(records), n_frames), np.nan, dtype=np.float32)
+                    for row, record in enumerate(records):
+                        values[row, :len(record)] = record.values[m]
+                    group[measure] = values
+                data[word][cond] = group
+        return data
+
+    @classmethod
+    def from_compact(cls, data, measures, time_step):
+        """Rebuild a TrackSet from compact() output, also as squeezed or 2-D arrays loaded back from a .mat file."""
+        tracks = cls(measures, time_step)
+        for word, cond_dict in data.items():
+            for cond, group in cond_dict.items():
+                starts, lengths = np.ravel(group['start']), np.ravel(group['length'])
+                values = {measure: np.reshape(group[measure], (len(starts), -1)) for measure in measures}
+                for row, (start, length) in enumerate(zip(starts, lengths)):
+                    record = np.array([values[measure][row, :int(length)] for measure in measures], dtype=np.float32)
+                    tracks.groups.setdefault(word, {}).setdefault(cond, []).append(
+                        TrackRecord(float(start), time_step, record, tracks.columns))
+        return tracks
+
+def is_compact(mat_file):
+    """Whether a {subj}_f*_data.mat file was saved in the compact layout (it then holds a time_step variable)."""
+    return any(name == 'time_step' for name, _, _ in whosmat(mat_file))
@@ -0,0 +1,276 @@
+import os
+import zlib
+import struct
+import argparse
+import numpy as np
+from scipy.io import loadmat
+import instrument
+
+# MAT-file v5 data element types (miINT8 ... miUINT64) and array classes (mxDOUBLE_CLASS ... mxUINT64_CLASS)
+mi_dtypes = {1: 'i1', 2: 'u1', 3: 'i2', 4: 'u2', 5: 'i4', 6: 'u4', 7: 'f4', 9: 'f8', 12: 'i8', 13: 'u8'}
+mx_dtypes = {6: 'f8', 7: 'f4', 8: 'i1', 9: 'u1', 10: 'i2', 11: 'u2', 12: 'i4', 13: 'u4', 14: 'i8', 15: 'u8'}
+mi_matrix, mi_compressed = 14, 15
+mx_struct = 2
+complex_flag = 0x800
+chunk_size = 64 * 1024
+
+
+class UnsupportedLayout(Exception):
+    """The trial file is laid out in a way read_trial does not decode itself."""
+
+
+class _FileSource:
+    """Sequential reads from an uncompressed region of the file; skipped bytes are seeked over."""
+
+    def __init__(self, f, order):
+        self.f = f
+        self.order = order
+        self.bytes_read = 0
+
+    def tell(self):
+        return self.f.tell()
+
+    def read(self, n):
+        data = self.f.read(n)
+        if len(data) < n:
+            raise UnsupportedLayout("truncated file")
+        self.bytes_read += n
+        return data
+
+    def skip(self, n):
+        self.f.seek(n, os.SEEK_CUR)
+
+    def read_array(self, n, dtype):
+        values = np.fromfile(self.f, dtype=np.dtype(dtype).newbyteorder(self.order), count=n // np.dtype(dtype).itemsize)
+        self.bytes_read += n
+        return values
+
+
+class _ZlibSource:
+    """Sequential reads from a compressed variable, inflating only as far as the reads go."""
+
+    def __init__(self, f, order, n_compressed):
+        self.f = f
+        self.order = order
+        self.remaining = n_compressed
+        self.inflate = zlib.decompressobj()
+        self.buffer = b''
+        self.bytes_read = 0
+        self.position = 0
+
+    def tell(self):
+        return self.position
+
+    def _more(self):
+        if self.inflate.unconsumed_tail:
+            data = self.inflate.decompress(self.inflate.unconsumed_tail, chunk_size)
+        elif self.remaining > 0:
+            raw = self.f.read(min(chunk_size, self.remaining))
+            self.remaining -= len(raw)
+            self.bytes_read += len(raw)
+            data = self.inflate.decompress(raw, chunk_size)
+        else:
+            raise UnsupportedLayout("truncated compressed variable")
+        self.buffer += data
+
+    def read(self, n):
+        while len(self.buffer) < n:
+            self._more()
+        data, self.buffer = self.buffer[:n], self.buffer[n:]
+        self.position += n
+        return data
+
+    def skip(self, n):
+        self.position += n
+        while n > len(self.buffer):
+            n -= len(self.buffer)
+            self.buffer = b''
+            self._more()
+        self.buffer = self.buffer[n:]
+
+    def read_array(self, n, dtype):
+        return np.frombuffer(self.read(n), dtype=np.dtype(dtype).newbyteorder(self.order))
+
+
+def _tag(src):
+    """(type, nbytes, data) of the next data element tag; data is only set for small (packed) elements."""
+    head = src.read(8)
+    mtype, nbytes = struct.unpack(src.order + 'II', head)
+    if mtype >> 16:
+        return mtype & 0xffff, mtype >> 16, head[4:4 + (mtype >> 16)]
+    return mtype, nbytes, None
+
+def _element(src):
+    """(type, raw bytes) of the next (small) data element."""
+    mtype, nbytes, data = _tag(src)
+    if data is None:
+        data = src.read(nbytes)
+        src.skip(-nbytes % 8)
+    return mtype, data
+
+def _matrix_header(src):
+    """Class, complexity and dimensions of a miMATRIX element whose tag was just read (its name is skipped)."""
+    _, flags = _element(src)
+    flags = struct.unpack(src.order + 'I', flags[:4])[0]
+    _, dims = _element(src)
+    _element(src)
+    return flags & 0xff, bool(flags & complex_flag), struct.unpack(f"{src.order}{len(dims) // 4}i", dims)
+
+def _numeric(src, mx_class, is_complex, dims):
+    """Values of a real numeric matrix as a flat array of its class."""
+    if mx_class not in mx_dtypes or is_complex:
+        raise UnsupportedLayout(f"array class {mx_class}")
+    mtype, nbytes, data = _tag(src)
+    if mtype not in mi_dtypes:
+        raise UnsupportedLayout(f"data type {mtype}")
+    if data is not None:
+        values = np.frombuffer(data, dtype=np.dtype(mi_dtypes[mtype]).newbyteorder(src.order))
+    else:
+        values = src.read_array(nbytes, mi_dtypes[mtype])
+        src.skip(-nbytes % 8)
+    if len(values) != np.prod(dims):
+        raise UnsupportedLayout("array size does not match its dimensions")
+    return values
+
+def _struct_fields(src, wanted):
+    """Decode the wanted fields of a 1x1 struct whose header was just read, skipping the rest.
+
+    wanted maps field names to a callable(src, mx_class, is_complex, dims);
+    reading stops as soon as every wanted field has been decoded.
+    """
+    _, name_length = _element(src)
+    name_length = struct.unpack(src.order + 'i', name_length)[0]
+    _, names = _element(src)
+    names = [names[k:k + name_length].split(b'\0')[0].decode('latin1') for k in range(0, len(names), name_length)]
+
+    found = {}
+    for name in names:
+        mtype, nbytes, _ = _tag(src)
+        if mtype != mi_matrix:
+            raise UnsupportedLayout(f"field {name} is not a matrix")
+        if name not in wanted or nbytes == 0:
+            src.skip(nbytes)
+            continue
+        end = src.tell() + nbytes
+        found[name] = wanted[name](src, *_matrix_header(src))
+        if len(found) == len(wanted):
+            break
+        src.skip(end - src.tell())
+    return found
+
+def _signal(src, mx_class, is_complex, dims):
+    if sum(d > 1 for d in dims) > 1:
+        raise UnsupportedLayout("signalIn is not a vector")
+    return _numeric(src, mx_class, is_complex, dims).astype(np.float32, copy=False)
+
+def _params(src, mx_class, is_complex, dims):
+    if mx_class != mx_struct or np.prod(dims) != 1:
+        raise UnsupportedLayout("params is not a 1x1 struct")
+    return _struct_fields(src, {'sRate': lambda *args: _numeric(*args).astype(mx_dtypes[args[1]])[0].item()})
+
+def _data_variable(src):
+    """(signalIn, sRate) of the variable starting at src, or None if it is not the 1x1 'data' struct."""
+    mtype, _, _ = _tag(src)
+    if mtype != mi_matrix:
+        return None
+    _, flags = _element(src)
+    flags = struct.unpack(src.order + 'I', flags[:4])[0]
+    _, dims = _element(src)
+    _, name = _element(src)
+    if name.rstrip(b'\0') != b'data':
+        return None
+    if flags & 0xff != mx_struct or np.prod(struct.unpack(f"{src.order}{len(dims) // 4}i", dims)) != 1:
+        raise UnsupportedLayout("data is not a 1x1 struct")
+    fields = _struct_fields(src, {'signalIn': _signal, 'params': _params})
+    if 'signalIn' not in fields or 'sRate' not in fields.get('params', {}):
+        raise UnsupportedLayout("data.signalIn or data.params.sRate is missing")
+    return fields['signalIn'], fields['params']['sRate']
+
+def _read_v5(f, header):
+    """Walk the top-level variables of a v5 file until 'data' is found; only its two fields are decoded."""
+    order = '<' if header[126:128] == b'IM' else '>'
+    bytes_read = len(header)
+    while True:
+        start = f.tell()
+        head = f.read(8)
+        if len(head) < 8:
+            raise UnsupportedLayout("no 'data' variable")
+        bytes_read += 8
+        mtype, nbytes = struct.unpack(order + 'II', head)
+        if mtype == mi_compressed:
+            src = _ZlibSource(f, order, nbytes)
+            end = start + 8 + nbytes
+        else:
+            f.seek(start)
+            bytes_read -= 8
+            src = _FileSource(f, order)
+            end = start + 8 + nbytes + (-nbytes % 8)
+        result = _data_variable(src)
+        bytes_read += src.bytes_read
+        if result is not None:
+            return result + (bytes_read,)
+        f.seek(end)
+
+def _read_v73(trial_file):
+    """signalIn and sRate of a MATLAB v7.3 (HDF5) trial file, read directly from their datasets."""
+    try:
+        import h5py
+    except ImportError:
+        raise ImportError(f"{trial_file} is a MATLAB v7.3 file; reading it needs h5py (pip install h5py)")
+    with h5py.File(trial_file, 'r') as f:
+        dataset = f['data/signalIn']
+        signal = np.empty(dataset.shape, dtype=np.float32)
+        dataset.read_direct(signal)
+        srate = f['data/params/sRate'][()].ravel()[0].item()
+        bytes_read = dataset.id.get_storage_size() + f['data/params/sRate'].id.get_storage_size()
+    return signal.ravel(), srate, bytes_read
+
+def _read_loadmat(trial_file):
+    """Fallback: decode the whole data struct with scipy."""
+    data = loadmat(trial_file, squeeze_me=True, struct_as_record=False, variable_names=['data'])['data']
+    return np.asarray(data.signalIn, dtype=np.float32).ravel(), data.params.sRate, os.path.getsize(trial_file)
+
+def decode_trial(trial_file):
+    """(signalIn as float32, params.sRate, bytes read) of an Audapter trial file, without instrumentation.
+
+    Only data.signalIn and data.params.sRate are decoded: v5 files are walked
+    element by element, skipping every other field (compressed variables are
+    inflated only up to the last field needed), and v7.3 files are read
+    through h5py. Files laid out any other way fall back to loadmat.
+    """
+    with open(trial_file, 'rb') as f:
+        header = f.read(128)
+        version = int.from_bytes(header[124:126], 'little' if header[126:128] == b'IM' else 'big')
+        try:
+            if version == 0x0200:
+                result = None
+            else:
+                result = _read_v5(f, header)
+        except (UnsupportedLayout, zlib.error):
+            result = _read_loadmat(trial_file)
+    if result is None:
+        result = _read_v73(trial_file)
+    return result
+
+def read_trial(trial_file):
+    """decode_trial() timed under the 'read_trial' stage and counted in trials_read and trial_bytes_read."""
+    with instrument.stage('read_trial'):
+        result = decode_trial(trial_file)
+    instrument.count('trials_read')
+    instrument.count('trial_bytes_read', result[2])
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Report how much of each trial file read_trial decodes.")
+    parser.add_argument('trial_files', nargs='+')
+    args = parser.parse_args()
+
+    total_read = total_size = 0
+    for trial_file in args.trial_files:
+        signal, srate, bytes_read = read_trial(trial_file)
+        size = os.path.getsize(trial_file)
+        total_read += bytes_read
+        total_size += size
+        print(f"{trial_file}: {len(signal)} samples at {srate} Hz, {bytes_read}/{size} bytes read")
+    print(f"{len(args.trial_files)} trials, {total_read}/{total_size} bytes read ({total_read / max(total_size, 1):.1%})")
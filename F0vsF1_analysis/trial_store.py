@@ -0,0 +1,90 @@
+import os
+import json
+import shutil
+import numpy as np
+
+
+class TrialStore:
+    """Append-only on-disk checkpoint of a subject's per-trial results.
+
+    Each finished trial appends one JSON line to progress.jsonl (experiment,
+    trial, word, condition, usability, exclusion message); usable trials also
+    write their tracks to an .npz next to it before the line is appended, so
+    a line on disk always means the trial is complete. A partial last line
+    left by a crash mid-write is cut off when the store is opened, so later
+    appends start on a line of their own. The parameters the results depend
+    on are kept in params.json; opening a store with different parameters
+    discards the old checkpoints.
+    """
+
+    def __init__(self, store_dir, params):
+        self.store_dir = store_dir
+        self.log_path = os.path.join(store_dir, 'progress.jsonl')
+        params_path = os.path.join(store_dir, 'params.json')
+        params = json.loads(json.dumps(params, default=float))
+
+        if os.path.exists(params_path):
+            with open(params_path) as f:
+                if json.load(f) != params:
+                    print(f"Parameters changed since last checkpoint; discarding {store_dir}")
+                    self.clear()
+        os.makedirs(store_dir, exist_ok=True)
+        with open(params_path, 'w') as f:
+            json.dump(params, f)
+        self._truncate_partial_line()
+
+    def clear(self):
+        shutil.rmtree(self.store_dir, ignore_errors=True)
+
+    def _truncate_partial_line(self):
+        """Cut progress.jsonl back to its last complete (newline-terminated) line."""
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, 'rb+') as f:
+            content = f.read()
+            end = content.rfind(b'\n') + 1
+            if end < len(content):
+                print(f"Discarding a partially written checkpoint in {self.log_path}")
+                f.truncate(end)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _track_path(self, expt_num, trial_num):
+        return os.path.join(self.store_dir, f"trial_{expt_num}_{trial_num}.npz")
+
+    def records(self):
+        """Completed trial records in the order they were appended."""
+        if not os.path.exists(self.log_path):
+            return []
+        records = []
+        with open(self.log_path) as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A line that is not a complete record never counts as a checkpoint
+                    continue
+        return records
+
+    def completed(self, expt_num):
+        """Trial numbers already checkpointed for an experiment."""
+        return {r['trial'] for r in self.records() if r['expt'] == expt_num}
+
+    def append(self, expt_num, expt_type, trial_num, word, cond, usable, track, message):
+        if track is not None:
+            track_path = self._track_path(expt_num, trial_num)
+            with open(track_path + '.tmp', 'wb') as f:
+                np.savez(f, **track)
+            os.replace(track_path + '.tmp', track_path)
+
+        record = {'expt': expt_num, 'type': expt_type, 'trial': trial_num, 'word': word,
+                  'cond': cond, 'usable': bool(usable), 'has_track': track is not None,
+                  'message': message}
+        with open(self.log_path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def load_track(self, record):
+        with np.load(self._track_path(record['expt'], record['trial'])) as entry:
+            return {name: entry[name] for name in entry.files}